@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+import telemetria
+
+
+# --- NÚCLEO DE AGREGACIÓN SOBRE CÓDIGOS ENTEROS ---
+# Cada clave se lleva a códigos enteros (categorías, enteros desplazados o factorize), las claves
+# se combinan en un solo código por fila y cada medida se reduce con np.bincount (o ufunc.at).
+# Sin hashing de texto ni objetos por grupo: el costo es una pasada vectorizada por medida.
+
+FUNCIONES = ('sum', 'size', 'first', 'min', 'max')
+# Más combinaciones posibles que esto (× filas) y los códigos se compactan antes de reducir
+_MAX_GRUPOS_POR_FILA = 4
+
+
+def codificar(valores):
+    """(códigos int64 por fila, etiquetas de cada código) de una columna; NaN queda con código -1."""
+    if isinstance(valores, pd.Series):
+        valores = valores.array
+    if isinstance(valores, pd.Categorical):
+        return valores.codes.astype(np.int64), pd.Index(valores.categories)
+    arreglo = np.asarray(valores)
+    if np.issubdtype(arreglo.dtype, np.integer) and len(arreglo):
+        minimo, maximo = int(arreglo.min()), int(arreglo.max())
+        if maximo - minimo < _MAX_GRUPOS_POR_FILA * len(arreglo) + 1024:
+            # Enteros de rango acotado (AÑO, TIENDA_ID): el código es el valor desplazado
+            return arreglo.astype(np.int64) - minimo, pd.RangeIndex(minimo, maximo + 1)
+    codigos, etiquetas = pd.factorize(valores, sort=True)
+    return codigos.astype(np.int64), pd.Index(etiquetas)
+
+
+def agrupar(codigos, cardinalidades):
+    """Combina los códigos de varias claves en uno por fila (la primera clave es la más significativa).
+
+    Devuelve (grupo por fila, n_grupos, códigos de cada clave por grupo, filas válidas). Las filas
+    con algún código -1 no entran en ningún grupo: `validas` las marca (None si son todas válidas).
+    """
+    n_filas = len(codigos[0]) if codigos else 0
+    grupo = np.zeros(n_filas, dtype=np.int64)
+    for codigo, cardinalidad in zip(codigos, cardinalidades):
+        grupo *= cardinalidad
+        grupo += codigo
+    validas = None
+    if any(len(codigo) and codigo.min() < 0 for codigo in codigos):
+        validas = np.logical_and.reduce([codigo >= 0 for codigo in codigos])
+        grupo = grupo[validas]
+    total = int(np.prod(cardinalidades, dtype=np.float64)) if cardinalidades else 1
+    presentes = None
+    if total > _MAX_GRUPOS_POR_FILA * n_filas + 1024:
+        # Demasiadas combinaciones posibles: se numeran solo las que aparecen (ordenadas)
+        presentes, grupo = np.unique(grupo, return_inverse=True)
+
+    # Códigos de cada clave en cada grupo (se decodifica el código combinado)
+    n_grupos = total if presentes is None else len(presentes)
+    combinados = np.arange(n_grupos, dtype=np.int64) if presentes is None else presentes
+    por_clave = []
+    for cardinalidad in reversed(cardinalidades):
+        combinados, resto = np.divmod(combinados, cardinalidad)
+        por_clave.append(resto)
+    return grupo, n_grupos, por_clave[::-1], validas
+
+
+def reducir(grupo, n_grupos, valores, funcion):
+    """Reduce `valores` (uno por elemento de `grupo`) por grupo con `funcion`: sum, size, first, min o max.
+
+    Como pandas: las sumas ignoran NaN (un grupo sin datos suma 0) y first/min/max devuelven NaN si no hay dato.
+    """
+    if funcion == 'size':
+        return np.bincount(grupo, minlength=n_grupos)
+    valores = np.asarray(valores)
+    if funcion == 'sum':
+        if np.issubdtype(valores.dtype, np.integer) or valores.dtype == bool:
+            # bincount suma en float64: es exacto mientras toda suma parcial quede bajo 2**53
+            if not len(valores) or int(np.abs(valores).max()) * len(valores) < 2**53:
+                return np.rint(np.bincount(grupo, weights=valores, minlength=n_grupos)).astype(np.int64)
+            suma = np.zeros(n_grupos, dtype=np.int64)
+            np.add.at(suma, grupo, valores.astype(np.int64, copy=False))
+            return suma
+        suma = np.bincount(grupo, weights=valores, minlength=n_grupos)
+        if np.isnan(suma).any():
+            suma = np.bincount(grupo, weights=np.nan_to_num(valores, nan=0.0), minlength=n_grupos)
+        return suma
+    flotantes = valores.astype(np.float64, copy=False)
+    con_dato = ~np.isnan(flotantes)
+    if funcion == 'first':
+        primera = np.full(n_grupos, len(valores), dtype=np.int64)
+        np.minimum.at(primera, grupo[con_dato], np.flatnonzero(con_dato))
+        resultado = np.full(n_grupos, np.nan)
+        hay = primera < len(valores)
+        resultado[hay] = flotantes[primera[hay]]
+        return resultado
+    if funcion in ('min', 'max'):
+        ufunc, inicial = (np.minimum, np.inf) if funcion == 'min' else (np.maximum, -np.inf)
+        resultado = np.full(n_grupos, inicial)
+        ufunc.at(resultado, grupo[con_dato], flotantes[con_dato])
+        resultado[np.bincount(grupo[con_dato], minlength=n_grupos) == 0] = np.nan
+        return resultado
+    raise ValueError(f"Función de agregación no admitida: '{funcion}'")
+
+
+def agregar(claves, columnas, agregaciones, pesos=None):
+    """`groupby(claves, observed=True).agg(**agregaciones)` con el núcleo de códigos enteros.
+
+    `claves` = {nombre: valores por fila} y `columnas` = {nombre: valores por fila} de lo que se
+    agrega. Con `pesos`, las sumas de las columnas en `pesos` se ponderan por ese arreglo. El
+    resultado trae un grupo por combinación presente, ordenado por clave como `groupby`.
+    """
+    pesos = pesos or {}
+    codigos, etiquetas = zip(*(codificar(valores) for valores in claves.values())) if claves else ((), ())
+    grupo, n_grupos, por_clave, validas = agrupar(list(codigos), [len(e) for e in etiquetas])
+    observados = np.flatnonzero(np.bincount(grupo, minlength=n_grupos) > 0)
+    telemetria.grupos_agregados.observar(len(observados))
+
+    resultado = {}
+    for nombre, codigos_grupo, etiquetas_clave, valores in zip(claves, por_clave, etiquetas, claves.values()):
+        codigos_grupo = codigos_grupo[observados]
+        if isinstance(getattr(valores, 'dtype', None), pd.CategoricalDtype):
+            resultado[nombre] = pd.Categorical.from_codes(codigos_grupo, dtype=valores.dtype)
+        else:
+            resultado[nombre] = etiquetas_clave[codigos_grupo]
+    for nombre, (columna, funcion) in agregaciones.items():
+        valores = None if funcion == 'size' else np.asarray(columnas[columna])
+        if funcion == 'sum' and columna in pesos:
+            valores = valores.astype(np.result_type(valores.dtype, np.int64)) * pesos[columna]
+        if valores is not None and validas is not None:
+            valores = valores[validas]
+        resultado[nombre] = reducir(grupo, n_grupos, valores, funcion)[observados]
+    return pd.DataFrame(resultado)
@@ -0,0 +1,131 @@
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+# --- ALMACÉN COLUMNAR EN DISCO ---
+# Cada versión de los datos vive en su propia carpeta, nombrada por la huella de los archivos
+# fuente: un .npy por columna (texto como códigos enteros + categorías) y un meta.json.
+# Las lecturas pueden abrir los .npy mapeados en memoria, compartidos entre procesos.
+
+VERSION_FORMATO = 5  # Subirla si cambia la limpieza de datos: invalida todas las caches
+ARCHIVO_BLOQUEO = '.bloqueo'
+# flock solo existe en Unix (donde corre gunicorn); en Windows el bloqueo no hace nada
+FCNTL_DISPONIBLE = importlib.util.find_spec('fcntl') is not None
+if FCNTL_DISPONIBLE:
+    import fcntl
+
+
+def huella_archivos(rutas):
+    """Huella (tamaño, mtime y hash de contenido) de los archivos fuente; None si falta alguno."""
+    sha = hashlib.sha256(f"formato={VERSION_FORMATO}".encode())
+    for ruta in rutas:
+        if not os.path.isfile(ruta):
+            return None
+        estado = os.stat(ruta)
+        sha.update(f"{os.path.basename(ruta)}|{estado.st_size}|{estado.st_mtime_ns}|".encode())
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                sha.update(bloque)
+    return sha.hexdigest()[:32]
+
+
+def _tipo_codigos(n_categorias):
+    # El mismo tipo que elige pandas para los códigos de un Categorical: así no los copia al cargar
+    if n_categorias < np.iinfo(np.int8).max:
+        return np.int8
+    return np.int16 if n_categorias < np.iinfo(np.int16).max else np.int32
+
+
+def _guardar_tabla(carpeta, df):
+    columnas = []
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        archivo = f"c{i}.npy"
+        meta = {'nombre': col, 'archivo': archivo, 'dtype': str(serie.dtype)}
+        if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+            codigos, categorias = pd.factorize(serie, sort=True)
+            np.save(os.path.join(carpeta, archivo), codigos.astype(_tipo_codigos(len(categorias))))
+            meta['categorias'] = [str(c) for c in categorias]
+        else:
+            np.save(os.path.join(carpeta, archivo), serie.to_numpy())
+        columnas.append(meta)
+    return {'filas': len(df), 'columnas': columnas}
+
+
+def _cargar_tabla(carpeta, meta, mmap_mode):
+    datos = {}
+    for col in meta['columnas']:
+        arreglo = np.load(os.path.join(carpeta, col['archivo']), mmap_mode=mmap_mode)
+        if 'categorias' in col:
+            serie = pd.Categorical.from_codes(arreglo, col['categorias'])
+            # Mapeado en memoria el texto queda como categoría: convertirlo crearía una copia por proceso
+            conservar = col['dtype'] == 'category' or mmap_mode is not None
+            datos[col['nombre']] = serie if conservar else pd.Series(serie).astype(col['dtype'])
+        else:
+            datos[col['nombre']] = arreglo
+    return pd.DataFrame(datos, copy=False)
+
+
+def guardar_tablas(directorio, huella, tablas):
+    """Persiste {nombre: DataFrame} bajo `directorio/huella` de forma atómica y borra versiones viejas."""
+    destino = os.path.join(directorio, huella)
+    temporal = f"{destino}.tmp-{os.getpid()}"
+    os.makedirs(temporal, exist_ok=True)
+    manifiesto = {'huella': huella, 'version_formato': VERSION_FORMATO, 'tablas': {}}
+    for nombre, df in tablas.items():
+        os.makedirs(os.path.join(temporal, nombre), exist_ok=True)
+        manifiesto['tablas'][nombre] = _guardar_tabla(os.path.join(temporal, nombre), df)
+    with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+
+    try:
+        os.rename(temporal, destino)
+    except OSError:
+        # Otro proceso publicó la misma huella primero
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    for entrada in os.listdir(directorio):
+        if entrada not in (huella, ARCHIVO_BLOQUEO) and not entrada.startswith(f"{huella}.tmp-"):
+            shutil.rmtree(os.path.join(directorio, entrada), ignore_errors=True)
+
+
+@contextlib.contextmanager
+def bloqueo(directorio):
+    """Exclusión entre procesos sobre `directorio` (flock de su archivo `.bloqueo`); espera su turno."""
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, ARCHIVO_BLOQUEO), 'a') as archivo:
+        if FCNTL_DISPONIBLE:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if FCNTL_DISPONIBLE:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def existe_version(directorio, huella):
+    return os.path.isfile(os.path.join(directorio, huella, 'meta.json'))
+
+
+def cargar_tablas(directorio, huella, mmap_mode=None):
+    """Devuelve {nombre: DataFrame} guardado para `huella`, o None si no existe o está incompleto.
+
+    Con `mmap_mode='r'` las columnas quedan mapeadas en memoria, de solo lectura, y el texto como categoría.
+    """
+    carpeta = os.path.join(directorio, huella)
+    try:
+        with open(os.path.join(carpeta, 'meta.json'), encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if manifiesto.get('version_formato') != VERSION_FORMATO:
+            return None
+        return {nombre: _cargar_tabla(os.path.join(carpeta, nombre), meta, mmap_mode)
+                for nombre, meta in manifiesto['tablas'].items()}
+    except (OSError, ValueError, KeyError):
+        return None
@@ -1,13 +1,34 @@
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 import os
+import json
+import functools
+import importlib.util
+import threading
+import time
 import dash_auth
-
+import flask
+from urllib.parse import urlencode
+
+import telemetria
+import compresion
+import figuras_compactas
+import perfil_memoria
+from motor_filtros import MotorFiltros
+from cache_lru import CacheLRU
+from cache_figuras import CacheFiguras
+from almacen_columnar import huella_archivos
+from cubo_ventas import MEDIDAS, asignar_tiendas, construir_cubo_diario, agregar_cubo, sumar_atributo_tiendas, tiendas_presentes
+from memoria_datos import compactar_tipos
+from metricas import detalle_metrica, evaluar_metricas, evaluar_totales, formatear_valor, clasificar_cuadrantes, METRICAS
+from carga_datos import cargar_y_preparar_datos, preparar_datos, leer_archivo_ventas
+from version_datos import version_con_delta
+from exportacion import GRANOS, FORMATOS, PARQUET_DISPONIBLE, bloques_exportacion, csv_en_bloques, parquet_en_bloques
 
 
 # --- 1. DEFINICIÓN DE ESTILOS Y COORDENADAS ---
@@ -87,190 +108,362 @@ La aplicación requiere dos archivos Excel en la misma carpeta que el script de
 5.  Ejecuta el comando: `python tu_script_app.py`
 6.  Abre la dirección en tu navegador web.
 """
-# --- 2. FUNCIÓN DE CARGA Y PREPARACIÓN DE DATOS ---
-def cargar_y_preparar_datos():
-    try:
-        # Intenta cargar los archivos reales
-        df_ventas_full = pd.read_excel('VENTAS_ALL_BRANDS.xlsx')
-        df_arrendamientos_full = pd.read_excel('ARRENDAMIENTOS.xlsx')
-        print("✅ Archivos de datos reales cargados correctamente.")
-        
-        # Eliminar duplicados de los archivos reales
-        df_ventas_full.drop_duplicates(inplace=True)
-        df_arrendamientos_full.drop_duplicates(inplace=True)
+# --- 2. CARGA Y PREPARACIÓN DE DATOS (carga_datos.py) ---
+# Resultados de filtrado compartidos por todos los callbacks que dispara un mismo cambio de filtros
+cache_filtros = CacheLRU(
+    max_entradas=int(os.environ.get('DASHBOARD_CACHE_FILTROS_ENTRADAS', 64)),
+    max_bytes=int(os.environ.get('DASHBOARD_CACHE_FILTROS_MB', 256)) * 1024 * 1024
+)
 
-    except FileNotFoundError:
-        # Si los archivos no se encuentran, genera datos de ejemplo avanzados
-        print("ADVERTENCIA: Archivos Excel no encontrados. Generando datos de ejemplo para demostración pública.")
-        
-        np.random.seed(42) # Para que los datos aleatorios sean siempre los mismos
-
-        # --- Perfiles de Marcas para Segmentación ---
-        brand_profiles = [
-            {'MARCA': 'AURA', 'tipo': 'Lujo', 'precio_promedio': 250, 'factor_volumen': 0.6},
-            {'MARCA': 'LUMIN', 'tipo': 'Fast Fashion', 'precio_promedio': 40, 'factor_volumen': 1.8},
-            {'MARCA': 'ZIRCON', 'tipo': 'Equilibrado', 'precio_promedio': 90, 'factor_volumen': 1.1},
-            {'MARCA': 'ONYX', 'tipo': 'Bajo Rendimiento', 'precio_promedio': 35, 'factor_volumen': 0.5},
-            {'MARCA': 'SOLARA', 'tipo': 'Premium', 'precio_promedio': 180, 'factor_volumen': 0.8},
-            {'MARCA': 'NOCTIS', 'tipo': 'Alto Tráfico', 'precio_promedio': 50, 'factor_volumen': 1.5},
-        ]
-        marcas_ejemplo = [p['MARCA'] for p in brand_profiles]
-        
-        ubicaciones_por_ciudad = {
-            'CARACAS': ['SAMBIL LA CANDELARIA', 'TOLON', 'LIDER', 'SAMBIL CHACAO'],
-            'VALENCIA': ['SAMBIL VALENCIA'],
-            'MARACAIBO': ['SAMBIL MARACAIBO'],
-            'BARQUISIMETO': ['SAMBIL BARQUISIMETO'],
-        }
-
-        # --- Crear DataFrames Ficticios Basados en Perfiles ---
-        arrend_data = []
-        for ciudad, ubicaciones in ubicaciones_por_ciudad.items():
-            for ubicacion in ubicaciones:
-                # Asignar marcas aleatorias a cada ubicación
-                marcas_en_ubicacion = np.random.choice(marcas_ejemplo, size=np.random.randint(3, len(marcas_ejemplo)), replace=False)
-                for marca_nombre in marcas_en_ubicacion:
-                    arrend_data.append({
-                        'UBICACION': ubicacion, 'MARCA': marca_nombre, 'CIUDAD': ciudad,
-                        'Mt2': np.random.randint(80, 250),
-                        'CANON FIJO': np.random.randint(1500, 8000) * (1.5 if ciudad == 'CARACAS' else 1) # Canon más caro en Caracas
-                    })
-        df_arrendamientos_full = pd.DataFrame(arrend_data)
-
-        ventas_data = []
-        fechas_ejemplo = pd.to_datetime(pd.date_range(start='2023-01-01', end='2025-12-31', freq='D'))
-        
-        # Crear un mapa de perfiles para búsqueda rápida
-        perfiles_map = {p['MARCA']: p for p in brand_profiles}
-
-        for index, store in df_arrendamientos_full.iterrows():
-            perfil = perfiles_map[store['MARCA']]
-            for fecha in fechas_ejemplo:
-                if np.random.rand() > 0.3: # 70% de probabilidad de tener ventas
-                    
-                    # Generar tickets basados en el perfil de la marca
-                    base_tickets = np.random.randint(5, 50)
-                    tickets = max(1, int(base_tickets * perfil['factor_volumen']))
-
-                    # Generar unidades y ventas basados en los tickets y el precio promedio
-                    unidades = max(tickets, int(tickets * np.random.uniform(1.1, 2.5)))
-                    venta = unidades * perfil['precio_promedio'] * np.random.uniform(0.85, 1.15) # Pequeña variación de precio
-                    
-                    ventas_data.append({
-                        'FECHA': fecha, 'MARCA': store['MARCA'], 'UBICACION': store['UBICACION'],
-                        'CIUDAD': store['CIUDAD'], 'VENTA': venta, 'UNIDADES': unidades, 'TICKETS': tickets
-                    })
-        df_ventas_full = pd.DataFrame(ventas_data)
-
-
-    # --- Procesamiento de datos 
-    df_ventas = df_ventas_full.copy()
-    df_ventas.columns = [str(col).strip().upper() for col in df_ventas.columns]
-    df_ventas.rename(columns={'VENTA': 'VENTAS', 'UNIDADES': 'UNIDADES', 'TICKETS': 'TICKETS'}, inplace=True, errors='ignore')
-    if 'FECHA' in df_ventas.columns: df_ventas.rename(columns={'FECHA': 'FECHA_DATETIME'}, inplace=True)
-    
-    # ... 
-   
-    
-    df_ventas['MARCA'] = df_ventas['MARCA'].astype(str).str.strip() 
-    df_ventas['UBICACION'] = df_ventas['UBICACION'].astype(str).str.strip()
-    df_ventas['CIUDAD'] = df_ventas['CIUDAD'].astype(str).str.strip().str.upper()
-    for col in ['VENTAS', 'UNIDADES', 'TICKETS']: df_ventas[col] = pd.to_numeric(df_ventas[col], errors='coerce')
-    df_ventas.dropna(subset=['VENTAS', 'UNIDADES', 'TICKETS', 'FECHA_DATETIME', 'MARCA', 'UBICACION', 'CIUDAD'], inplace=True)
-    df_ventas['FECHA_DATETIME'] = pd.to_datetime(df_ventas['FECHA_DATETIME'], dayfirst=True, errors='coerce')
-    df_ventas.dropna(subset=['FECHA_DATETIME'], inplace=True)
-    df_ventas['AÑO'] = df_ventas['FECHA_DATETIME'].dt.year
-
-    df_arrendamientos = df_arrendamientos_full.copy()
-    df_arrendamientos.columns = [str(col).strip().lower().replace(" ", "_") for col in df_arrendamientos.columns]
-    arrend_rename_map = {'canon_fijo': 'Canon_Fijo', 'mt2': 'Metros_Cuadrados', 'marca': 'MARCA', 'ubicacion': 'UBICACION'}
-    df_arrendamientos.rename(columns=arrend_rename_map, inplace=True)
-    df_arrendamientos['MARCA'] = df_arrendamientos['MARCA'].astype(str).str.strip().str.upper()
-    df_arrendamientos['UBICACION'] = df_arrendamientos['UBICACION'].astype(str).str.strip().str.upper()
-    if 'Metros_Cuadrados' in df_arrendamientos.columns: df_arrendamientos['Metros_Cuadrados'] = pd.to_numeric(df_arrendamientos['Metros_Cuadrados'], errors='coerce')
-    if 'Canon_Fijo' in df_arrendamientos.columns: df_arrendamientos['Canon_Fijo'] = pd.to_numeric(df_arrendamientos['Canon_Fijo'], errors='coerce')
-    df_arrendamientos.dropna(subset=['UBICACION', 'MARCA', 'Metros_Cuadrados', 'Canon_Fijo'], inplace=True)
-    df_arrendamientos_unicos = df_arrendamientos.drop_duplicates(subset=['UBICACION', 'MARCA'], keep='first')
-
-    df_completo = pd.merge(df_ventas, df_arrendamientos_unicos, on=['UBICACION', 'MARCA'], how='left')
-    
-    return df_completo
+# Figuras ya construidas, en disco y compartidas por todos los workers (0 MB la desactiva)
+MB_CACHE_FIGURAS = int(os.environ.get('DASHBOARD_CACHE_FIGURAS_MB', 256))
+cache_figuras = CacheFiguras(
+    os.path.join(os.environ.get('DASHBOARD_CACHE_FIGURAS_DIR', '.cache_figuras'), 'figuras.sqlite'),
+    max_bytes=MB_CACHE_FIGURAS * 1024 * 1024
+) if MB_CACHE_FIGURAS > 0 else None
+def metricas_caches():
+    """Aciertos, fallos, expulsiones y ocupación de las caches, para /metrics."""
+    caches = {'filtros': cache_filtros.estadisticas()}
+    if cache_figuras is not None:
+        caches['figuras'] = cache_figuras.estadisticas()
+    return [
+        ('dashboard_cache_aciertos_total', 'counter', 'Consultas respondidas desde la cache.', [({'cache': c}, e['aciertos']) for c, e in caches.items()]),
+        ('dashboard_cache_fallos_total', 'counter', 'Consultas que hubo que calcular.', [({'cache': c}, e['fallos']) for c, e in caches.items()]),
+        ('dashboard_cache_expulsiones_total', 'counter', 'Entradas expulsadas por los topes de la cache.', [({'cache': c}, e['expulsiones']) for c, e in caches.items()]),
+        ('dashboard_cache_entradas', 'gauge', 'Entradas guardadas en la cache.', [({'cache': c}, e['entradas']) for c, e in caches.items()]),
+        ('dashboard_cache_bytes', 'gauge', 'Bytes ocupados por la cache.', [({'cache': c}, e['bytes']) for c, e in caches.items()]),
+    ]
 
-df_global_completo = cargar_y_preparar_datos()
+telemetria.registrar_colector(metricas_caches)
+
+# Cambiar el código de los gráficos también invalida las figuras guardadas
+_DIR_APP = os.path.dirname(os.path.abspath(__file__))
+VERSION_CODIGO = huella_archivos([os.path.join(_DIR_APP, archivo) for archivo in ('app.py', 'metricas.py', 'cubo_ventas.py', 'figuras_compactas.py')]) or 'dev'
+
+def publicar_datos(datos):
+    """Publica una nueva versión de los datos para los callbacks (reemplazo atómico de la referencia).
+
+    Los TIENDA_ID nunca cambian entre versiones (las tiendas nuevas se agregan al final), así que la
+    dimensión `datos_actuales.tiendas` sirve también para cubos filtrados de una versión anterior.
+    """
+    global datos_actuales, df_global_completo
+    datos_actuales = datos
+    df_global_completo = datos.cubo_diario
+    cache_filtros.limpiar()
+
+# Los datos se cargan en segundo plano (sección 6) desde que el proceso que sirve la app llama a
+# `iniciar_carga`: el servidor abre su puerto enseguida y, mientras tanto, responde /healthz y una
+# página de carga en lugar del dashboard. Importar el módulo no carga nada.
+# `datos_cargados` se marca al terminar la carga, haya salido bien o no (`error_carga`).
+datos_actuales = None
+df_global_completo = None
+datos_cargados = threading.Event()
+error_carga = None
+inicio_carga = time.time()
+
+def limites_fechas(datos):
+    """(primera, última) fecha con ventas como `date`, o (None, None) si no hay datos."""
+    if datos is None or datos.vacio:
+        return None, None
+    return datos.fecha_min.date(), datos.fecha_max.date()
+
+# --- 2b. DELTAS DE VENTAS (días nuevos o correcciones sin reiniciar) ---
+# Cada archivo .xlsx/.csv de DIR_DELTAS (mismas columnas que VENTAS_ALL_BRANDS.xlsx) se aplica
+# como upsert por UBICACION × MARCA × FECHA. Cada proceso revisa la carpeta periódicamente, así
+# todos los workers terminan con los mismos datos. Reaplicar un delta no cambia el resultado.
+DIR_DELTAS = os.environ.get('DASHBOARD_DIR_DELTAS', 'deltas_ventas')
+INTERVALO_DELTAS_SEG = float(os.environ.get('DASHBOARD_DELTAS_INTERVALO_SEG', 60))
+_lock_deltas = threading.Lock()
+_deltas_aplicados = {}  # nombre de archivo -> (mtime_ns, tamaño) ya aplicado
+
+def aplicar_delta(df_delta, etiqueta):
+    """Aplica un delta de ventas (ya limpio, de `leer_archivo_ventas`) sobre la versión publicada y publica el resultado."""
+    with _lock_deltas:
+        datos = datos_actuales
+        ids_tiendas, tiendas = asignar_tiendas(df_delta, datos.tiendas)
+        cubo_delta = compactar_tipos(construir_cubo_diario(df_delta[['FECHA_DATETIME'] + MEDIDAS + ['AÑO']].assign(TIENDA_ID=ids_tiendas)))
+        if cubo_delta.empty:
+            return datos
+        inicio = time.perf_counter()
+        nueva = datos.con_delta(cubo_delta, version=version_con_delta(datos.version, cubo_delta, etiqueta), tiendas=compactar_tipos(tiendas))
+        publicar_datos(nueva)
+        print(f"Delta '{etiqueta}' aplicado: {len(cubo_delta):,} filas en {time.perf_counter() - inicio:.2f}s (versión {nueva.version}).")
+        return nueva
+
+def revisar_deltas():
+    """Aplica, en orden de nombre, los archivos de DIR_DELTAS nuevos o modificados."""
+    if not os.path.isdir(DIR_DELTAS):
+        return
+    for nombre in sorted(os.listdir(DIR_DELTAS)):
+        ruta = os.path.join(DIR_DELTAS, nombre)
+        if not nombre.lower().endswith(('.xlsx', '.csv')) or not os.path.isfile(ruta):
+            continue
+        estado = os.stat(ruta)
+        firma = (estado.st_mtime_ns, estado.st_size)
+        if _deltas_aplicados.get(nombre) == firma:
+            continue
+        try:
+            # Mismo lector y limpieza que los archivos de ventas de la carga (carga_datos.py)
+            aplicar_delta(leer_archivo_ventas(ruta), os.path.splitext(nombre)[0])
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo aplicar el delta '{nombre}': {e}")
+        _deltas_aplicados[nombre] = firma  # No reintentar hasta que el archivo cambie
+
+def _vigilar_deltas():
+    while True:
+        time.sleep(INTERVALO_DELTAS_SEG)
+        revisar_deltas()
 
 # --- 3. Inicialización de la App Dash ---
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY, dbc.icons.BOOTSTRAP]) # <-- AÑADIR dbc.icons.BOOTSTRAP
+# Los callbacks de la pestaña comparativa (dos filtrados completos cada uno) corren como trabajos en
+# segundo plano, en procesos aparte, para no retener los hilos del servidor. El administrador de
+# trabajos guarda estado y resultados en disco (pip install "dash[diskcache]"); sin él, o con
+# DASHBOARD_TRABAJOS_EN_SEGUNDO_PLANO=0, esos callbacks se ejecutan como los demás.
+TRABAJOS_DISPONIBLES = all(importlib.util.find_spec(modulo) is not None for modulo in ('diskcache', 'multiprocess', 'psutil'))
+if TRABAJOS_DISPONIBLES and os.environ.get('DASHBOARD_TRABAJOS_EN_SEGUNDO_PLANO', '1') == '1':
+    import diskcache
+    administrador_trabajos = dash.DiskcacheManager(diskcache.Cache(os.environ.get('DASHBOARD_TRABAJOS_DIR', '.cache_trabajos')))
+else:
+    administrador_trabajos = None
+# Cada cuánto el navegador consulta si terminó un trabajo (también es la latencia mínima de su respuesta)
+INTERVALO_TRABAJOS_MS = int(os.environ.get('DASHBOARD_TRABAJOS_INTERVALO_MS', 300))
+
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY, dbc.icons.BOOTSTRAP], # <-- AÑADIR dbc.icons.BOOTSTRAP
+                background_callback_manager=administrador_trabajos)
 server = app.server
 
-opciones_ubicacion = [{'label': i, 'value': i} for i in sorted(df_global_completo['UBICACION'].unique())] if not df_global_completo.empty else []
-opciones_marca = [{'label': i, 'value': i} for i in sorted(df_global_completo['MARCA'].unique())] if not df_global_completo.empty else []
+# --- Telemetría de los callbacks (telemetria.py, expuesta en /metrics) ---
+# Cada petición a /_dash-update-component es un callback: se mide su tiempo de pared y el tamaño
+# de su respuesta, y los filtrados y agregaciones que dispare quedan con su nombre como etiqueta.
+# Con DASHBOARD_LOG_LENTOS_MS > 0, cada callback más lento que eso se informa junto con los
+# filtros que lo dispararon. Las métricas son de cada proceso (con gunicorn, de cada worker).
+LOG_LENTOS_MS = float(os.environ.get('DASHBOARD_LOG_LENTOS_MS', 0))
+
+def _valores_entradas(entradas):
+    # {id.propiedad: valor}; los callbacks con comodines (ALL, MATCH) traen listas de entradas
+    valores = {}
+    for entrada in entradas or []:
+        for item in entrada if isinstance(entrada, list) else [entrada]:
+            valores[f"{item.get('id')}.{item.get('property')}"] = item.get('value')
+    return valores
+
+# Registrada antes que registrar_medicion_callback para correr después (Flask invierte el orden
+# de los after_request): la telemetría mide el JSON de la respuesta y esta, lo que se envía
+@server.after_request
+def comprimir_respuesta(respuesta):
+    enviados = compresion.comprimir_respuesta(respuesta, flask.request.accept_encodings)
+    if 'callback' in flask.g:
+        telemetria.bytes_enviados.observar(enviados or 0, flask.g.callback)
+    return respuesta
+
+@server.before_request
+def iniciar_medicion_callback():
+    if not flask.request.path.endswith('/_dash-update-component'):
+        return
+    cuerpo = flask.request.get_json(silent=True) or {}
+    flask.g.callback = cuerpo.get('output', '?')
+    # Perfil de memoria (perfil_memoria.py) si está activo o lo pide un admin; no en las consultas
+    # por trabajos en segundo plano, cuyo cálculo corre en otro proceso
+    if not flask.request.args.get('cacheKey') and perfil_memoria.solicitado(flask.request.headers, flask.request.cookies):
+        flask.g.perfil_memoria = perfil_memoria.Medicion()
+    flask.g.inicio_callback = time.perf_counter()
+    flask.g.contexto_callback = telemetria.callback_actual.set(flask.g.callback)
+
+@server.after_request
+def registrar_medicion_callback(respuesta):
+    if 'inicio_callback' not in flask.g:
+        return respuesta
+    nombre, segundos = flask.g.callback, time.perf_counter() - flask.g.inicio_callback
+    telemetria.callback_actual.reset(flask.g.contexto_callback)
+    medicion = flask.g.pop('perfil_memoria', None)
+    if medicion is not None:
+        cuerpo = flask.request.get_json(silent=True) or {}
+        medicion.terminar(nombre, {'disparado_por': cuerpo.get('changedPropIds', []), 'entradas': _valores_entradas(cuerpo.get('inputs'))})
+    if respuesta.status_code >= 400:
+        telemetria.errores_callbacks.incrementar(etiqueta=nombre)
+    if flask.request.args.get('cacheKey'):
+        # Consulta por un trabajo en segundo plano: el cálculo corre en otro proceso y solo
+        # cuenta el tamaño de la respuesta que trae el resultado
+        telemetria.sondeos_trabajos.incrementar(etiqueta=nombre)
+        if 'response' in (respuesta.get_json(silent=True) or {}):
+            telemetria.bytes_respuesta.observar(respuesta.content_length or 0, nombre)
+        return respuesta
+    telemetria.duracion_callbacks.observar(segundos, nombre)
+    telemetria.bytes_respuesta.observar(respuesta.content_length or 0, nombre)
+    if LOG_LENTOS_MS > 0 and segundos * 1000 >= LOG_LENTOS_MS:
+        cuerpo = flask.request.get_json(silent=True) or {}
+        detalle = {'callback': nombre, 'ms': round(segundos * 1000, 1), 'disparado_por': cuerpo.get('changedPropIds', []),
+                   'entradas': _valores_entradas(cuerpo.get('inputs')), 'estado': _valores_entradas(cuerpo.get('state'))}
+        print(f"CALLBACK LENTO: {json.dumps(detalle, ensure_ascii=False, default=str)}")
+    return respuesta
+
+@server.teardown_request
+def liberar_perfil_memoria(error=None):
+    # Si la petición falló antes de after_request, la medición no debe quedar tomada
+    medicion = flask.g.pop('perfil_memoria', None)
+    if medicion is not None:
+        medicion.cancelar()
+
+# --- Rutas de administración (requieren DASHBOARD_ADMIN_TOKEN) ---
+# El token va solo en el encabezado X-Dashboard-Admin (nunca en la URL, que queda en historiales y
+# logs). Sin token configurado, o con uno incorrecto, responden 404 como si no existieran.
+def _token_admin():
+    return flask.request.headers.get(perfil_memoria.ENCABEZADO_ADMIN)
+
+@server.route('/metrics')
+def metrics():
+    # Nombres de callbacks, filtros y volúmenes son internos: Prometheus manda el mismo encabezado admin
+    if not perfil_memoria.es_admin(_token_admin()):
+        flask.abort(404)
+    return flask.Response(telemetria.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@server.route('/admin/perfiles')
+def admin_perfiles():
+    if not perfil_memoria.es_admin(_token_admin()):
+        flask.abort(404)
+    limite = flask.request.args.get('limite', 50, type=int)
+    return flask.jsonify(perfilar_todo=perfil_memoria.PERFILAR_TODO, resumen=perfil_memoria.resumen(),
+                         perfiles=perfil_memoria.perfiles(flask.request.args.get('callback'), limite))
+
+@server.route('/admin/perfilar')
+def admin_perfilar():
+    # Activa (?activar=1) o desactiva (?activar=0) el perfilado de los callbacks de este navegador
+    if not perfil_memoria.es_admin(_token_admin()):
+        flask.abort(404)
+    activar = flask.request.args.get('activar', '1') == '1'
+    respuesta = flask.jsonify(perfilado='activado' if activar else 'desactivado')
+    if activar:
+        # La cookie lleva una sesión firmada que vence, no el token
+        respuesta.set_cookie(perfil_memoria.COOKIE, perfil_memoria.nueva_sesion(), max_age=perfil_memoria.DURACION_SESION_SEG,
+                             httponly=True, secure=flask.request.is_secure, samesite='Strict')
+    else:
+        respuesta.delete_cookie(perfil_memoria.COOKIE)
+    return respuesta
 
-# Definición de los paneles de filtros por separado
-panel_filtros_general = html.Div(
-    id='contenedor-filtros-general', 
-    style={'display': 'block'}, # Empieza visible
-    children=[
-        html.H4("Menú de Navegación"), html.Hr(),
-        dbc.Card(dbc.CardBody([
-            dbc.Label("Rango de Fechas:"),
-            dcc.DatePickerRange(id='filtro-fecha', min_date_allowed=df_global_completo['FECHA_DATETIME'].min().date() if not df_global_completo.empty else None, max_date_allowed=df_global_completo['FECHA_DATETIME'].max().date() if not df_global_completo.empty else None, start_date=df_global_completo['FECHA_DATETIME'].min().date() if not df_global_completo.empty else None, end_date=df_global_completo['FECHA_DATETIME'].max().date() if not df_global_completo.empty else None, className="w-100"),
-            html.Br(), html.Br(), dbc.Label("Ubicación(es):"),
-            dcc.Dropdown(id='filtro-ubicacion', multi=True, placeholder="Todas", options=opciones_ubicacion),
-            html.Br(), dbc.Label("Marca(s):"),
-            dcc.Dropdown(id='filtro-marca', multi=True, placeholder="Todas", options=opciones_marca),
-            html.Br(), html.Br(),
-            dbc.Button("Descargar Documentación", id="btn-descargar-readme", color="secondary", outline=True, size="sm", className="w-100"),
-        ]), color="light")
-    ]
-)
+if perfil_memoria.PERFILAR_TODO and not perfil_memoria.TOKEN_ADMIN:
+    print("ADVERTENCIA: DASHBOARD_PERFILAR_MEMORIA=1 sin DASHBOARD_ADMIN_TOKEN: los perfiles se registran pero /admin/perfiles no se puede consultar.")
 
-panel_filtros_comparativo = html.Div(
-    id='contenedor-filtros-comparativo', 
-    style={'display': 'none'}, # Empieza oculto
-    children=[
-        html.H4("Menú Comparativo"), html.Hr(),
-        dbc.Card(dbc.CardBody([
-            html.H6("Selección 1", className="card-title text-primary"),
-            dbc.Label("Fechas 1:"), dcc.DatePickerRange(id='filtro-fecha-1', start_date='2024-01-01', end_date='2024-12-31', className="w-100", display_format='DD/MM/YYYY'),
-            dbc.Label("Ubicación(es) 1:", className="mt-2"), dcc.Dropdown(id='filtro-ubicacion-1', multi=True, placeholder="Todas", options=opciones_ubicacion),
-            dbc.Label("Marca(s) 1:", className="mt-2"), dcc.Dropdown(id='filtro-marca-1', multi=True, placeholder="Todas", options=opciones_marca),
-        ]), color="light", className="mb-3"),
-        dbc.Card(dbc.CardBody([
-            html.H6("Selección 2", className="card-title text-danger"),
-            dbc.Label("Fechas 2:"), dcc.DatePickerRange(id='filtro-fecha-2', start_date='2025-01-01', end_date='2025-12-31', className="w-100", display_format='DD/MM/YYYY'),
-            dbc.Label("Ubicación(es) 2:", className="mt-2"), dcc.Dropdown(id='filtro-ubicacion-2', multi=True, placeholder="Todas", options=opciones_ubicacion),
-            dbc.Label("Marca(s) 2:", className="mt-2"), dcc.Dropdown(id='filtro-marca-2', multi=True, placeholder="Todas", options=opciones_marca),
-        ]), color="light")
-    ]
-)
+# Métrica inicial de cada radio de la pestaña general
+RADIOS_POR_DEFECTO = {'kpi-transaccion-radio': 'UPT', 'ventas-radio': 'VENTAS', 'unidades-radio': 'UNIDADES', 'tickets-radio': 'TICKETS'}
 
-app.layout = html.Div(style={'backgroundColor': COLOR_FONDO_APP, 'padding': '20px', 'fontFamily': STYLE_FONT_FAMILY}, children=[
-    dcc.Store(id='memoria-ciudad-clickeada'),
-    dcc.Download(id="descarga-readme"),
-    dbc.Container([
-        html.Div(id='kpi-container', children=[
+def pantalla_carga():
+    """Página mientras los datos se cargan: consulta el estado cada 2 s y se recarga al terminar."""
+    if error_carga is not None:
+        mensaje = dbc.Alert(f"No se pudieron cargar los datos: {error_carga}", color="danger")
+    else:
+        mensaje = html.Div([dbc.Spinner(color="primary"), html.P("Cargando datos de ventas...", id='estado-carga', className="mt-3")], className="text-center")
+    return html.Div(style={'backgroundColor': COLOR_FONDO_APP, 'padding': '20px', 'fontFamily': STYLE_FONT_FAMILY}, children=[
+        dcc.Interval(id='intervalo-carga', interval=2000, disabled=error_carga is not None),
+        dcc.Store(id='carga-lista', data=False),
+        dbc.Container([html.H2("Monitoreo Comercial en Retail", className="mb-4"), mensaje], fluid=True)
+    ])
+
+# El layout se arma en cada carga de página: así las opciones y el rango de fechas reflejan
+# la versión de los datos publicada en ese momento (incluidos los deltas aplicados).
+def construir_layout():
+    if not datos_cargados.is_set() or error_carga is not None:
+        return pantalla_carga()
+    df_global_completo = datos_actuales.cubo_diario
+    tiendas = datos_actuales.tiendas
+    fecha_min, fecha_max = limites_fechas(datos_actuales)
+    opciones_ubicacion = [{'label': i, 'value': i} for i in sorted(tiendas['UBICACION'].unique())] if not df_global_completo.empty else []
+    opciones_marca = [{'label': i, 'value': i} for i in sorted(tiendas['MARCA'].unique())] if not df_global_completo.empty else []
+
+    # Definición de los paneles de filtros por separado
+    panel_filtros_general = html.Div(
+        id='contenedor-filtros-general', 
+        style={'display': 'block'}, # Empieza visible
+        children=[
+            html.H4("Menú de Navegación"), html.Hr(),
+            dbc.Card(dbc.CardBody([
+                dbc.Label("Rango de Fechas:"),
+                dcc.DatePickerRange(id='filtro-fecha', min_date_allowed=fecha_min, max_date_allowed=fecha_max, start_date=fecha_min, end_date=fecha_max, className="w-100"),
+                html.Small(f"Datos del {fecha_min:%d/%m/%Y} al {fecha_max:%d/%m/%Y}", className="text-muted"),
+                html.Br(), html.Br(), dbc.Label("Ubicación(es):"),
+                dcc.Dropdown(id='filtro-ubicacion', multi=True, placeholder="Todas", options=opciones_ubicacion),
+                html.Br(), dbc.Label("Marca(s):"),
+                dcc.Dropdown(id='filtro-marca', multi=True, placeholder="Todas", options=opciones_marca),
+                html.Br(), html.Br(),
+                dbc.Button("Descargar Documentación", id="btn-descargar-readme", color="secondary", outline=True, size="sm", className="w-100"),
+                html.Hr(), dbc.Label("Exportar datos de la selección:"),
+                dcc.Dropdown(id='exportar-grano', options=[{'label': etiqueta, 'value': grano} for grano, etiqueta in GRANOS.items()], value='diario', clearable=False),
+                dbc.RadioItems(id='exportar-formato', options=[{'label': 'CSV', 'value': 'csv'}, {'label': 'Parquet', 'value': 'parquet', 'disabled': not PARQUET_DISPONIBLE}], value='csv', inline=True, className="mt-2"),
+                dbc.Button("Exportar", id="btn-exportar", href="", external_link=True, color="primary", outline=True, size="sm", className="w-100 mt-2"),
+            ]), color="light")
+        ]
+    )
+
+    panel_filtros_comparativo = html.Div(
+        id='contenedor-filtros-comparativo', 
+        style={'display': 'none'}, # Empieza oculto
+        children=[
+            html.H4("Menú Comparativo"), html.Hr(),
+            dbc.Card(dbc.CardBody([
+                html.H6("Selección 1", className="card-title text-primary"),
+                dbc.Label("Fechas 1:"), dcc.DatePickerRange(id='filtro-fecha-1', start_date='2024-01-01', end_date='2024-12-31', className="w-100", display_format='DD/MM/YYYY'),
+                dbc.Label("Ubicación(es) 1:", className="mt-2"), dcc.Dropdown(id='filtro-ubicacion-1', multi=True, placeholder="Todas", options=opciones_ubicacion),
+                dbc.Label("Marca(s) 1:", className="mt-2"), dcc.Dropdown(id='filtro-marca-1', multi=True, placeholder="Todas", options=opciones_marca),
+            ]), color="light", className="mb-3"),
+            dbc.Card(dbc.CardBody([
+                html.H6("Selección 2", className="card-title text-danger"),
+                dbc.Label("Fechas 2:"), dcc.DatePickerRange(id='filtro-fecha-2', start_date='2025-01-01', end_date='2025-12-31', className="w-100", display_format='DD/MM/YYYY'),
+                dbc.Label("Ubicación(es) 2:", className="mt-2"), dcc.Dropdown(id='filtro-ubicacion-2', multi=True, placeholder="Todas", options=opciones_ubicacion),
+                dbc.Label("Marca(s) 2:", className="mt-2"), dcc.Dropdown(id='filtro-marca-2', multi=True, placeholder="Todas", options=opciones_marca),
+            ]), color="light", className="mb-2"),
+            barra_progreso('progreso-tarjetas-comparativo'),
+        ]
+    )
+
+    return html.Div(style={'backgroundColor': COLOR_FONDO_APP, 'padding': '20px', 'fontFamily': STYLE_FONT_FAMILY}, children=[
+        dcc.Store(id='memoria-ciudad-clickeada'),
+        dcc.Store(id='registro-graficos', data=registro_graficos()),
+        dcc.Download(id="descarga-readme"),
+        dbc.Container([
+            html.Div(id='kpi-container', children=[
+                dbc.Row([
+                    dbc.Col(html.H2("Monitoreo Comercial en Retail"), width=12, lg=4, className="my-auto"),
+                    dbc.Col(dbc.Row(id='kpi-cards-container'), width=12, lg=8)
+                ], className="mb-4 align-items-center")
+            ]),
+            html.Hr(),
             dbc.Row([
-                dbc.Col(html.H2("Monitoreo Comercial en Retail"), width=12, lg=4, className="my-auto"),
-                dbc.Col(dbc.Row(id='kpi-cards-container'), width=12, lg=8)
-            ], className="mb-4 align-items-center")
-        ]),
-        html.Hr(),
-        dbc.Row([
-            # La columna de la izquierda ahora contiene ambos paneles definidos arriba
-            dbc.Col([panel_filtros_general, panel_filtros_comparativo], width=12, lg=3),
+                # La columna de la izquierda ahora contiene ambos paneles definidos arriba
+                dbc.Col([panel_filtros_general, panel_filtros_comparativo], width=12, lg=3),
             
-            dbc.Col([
-                dcc.Tabs(id="tabs-analisis", value='tab-general', children=[
-                    dcc.Tab(label='Análisis General', value='tab-general', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
-                    dcc.Tab(label='Segmentación de Marcas', value='tab-segmentacion', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
-                    dcc.Tab(label='Análisis Comparativo', value='tab-comparativo', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
-                    dcc.Tab(label='Análisis Exploratorio', value='tab-exploratorio', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
-                ]),
-                html.Div(id='tabs-content', className="mt-3")
-            ], width=12, lg=9)
-        ])
-    ], fluid=True)
-])
+                dbc.Col([
+                    dcc.Tabs(id="tabs-analisis", value='tab-general', children=[
+                        dcc.Tab(label='Análisis General', value='tab-general', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
+                        dcc.Tab(label='Segmentación de Marcas', value='tab-segmentacion', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
+                        dcc.Tab(label='Análisis Comparativo', value='tab-comparativo', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
+                        dcc.Tab(label='Análisis Exploratorio', value='tab-exploratorio', style=TAB_STYLE, selected_style=TAB_SELECTED_STYLE),
+                    ]),
+                    html.Div(id='tabs-content', className="mt-3")
+                ], width=12, lg=9)
+            ])
+        ], fluid=True)
+    ])
+
+app.layout = construir_layout
+
+# Página de carga: consulta si los datos ya están y, cuando lo están, recarga la página para
+# mostrar el dashboard con el rango de fechas y las opciones de los datos cargados.
+@app.callback(
+    [Output('carga-lista', 'data'), Output('estado-carga', 'children')],
+    Input('intervalo-carga', 'n_intervals'),
+    prevent_initial_call=True
+)
+def consultar_estado_carga(n_intervals):
+    if datos_cargados.is_set():
+        # También si la carga falló: al recargar, la página muestra el error
+        return True, "Datos listos, abriendo el dashboard..."
+    return False, f"Cargando datos de ventas... ({time.time() - inicio_carga:.0f} s)"
+
+app.clientside_callback(
+    "function(lista) { if (lista) { window.location.reload(); } return lista; }",
+    Output('intervalo-carga', 'disabled'),
+    Input('carga-lista', 'data'),
+    prevent_initial_call=True
+)
 
 # --- 5. Callbacks (Interactividad) ---
 
@@ -281,9 +474,12 @@ app.layout = html.Div(style={'backgroundColor': COLOR_FONDO_APP, 'padding': '20p
     Input('tabs-analisis', 'value')
 )
 def render_filter_panel(tab):
+    df_global_completo = datos_actuales.cubo_diario
+    fecha_min, fecha_max = limites_fechas(datos_actuales)
     # Estas opciones se usan en ambos paneles
-    opciones_ubicacion = [{'label': i, 'value': i} for i in sorted(df_global_completo['UBICACION'].unique())] if not df_global_completo.empty else []
-    opciones_marca = [{'label': i, 'value': i} for i in sorted(df_global_completo['MARCA'].unique())] if not df_global_completo.empty else []
+    tiendas = datos_actuales.tiendas
+    opciones_ubicacion = [{'label': i, 'value': i} for i in sorted(tiendas['UBICACION'].unique())] if not df_global_completo.empty else []
+    opciones_marca = [{'label': i, 'value': i} for i in sorted(tiendas['MARCA'].unique())] if not df_global_completo.empty else []
     
     if tab == 'tab-comparativo':
         # Si la pestaña es "Análisis Comparativo", devuelve el layout con el doble juego de filtros
@@ -314,7 +510,7 @@ def render_filter_panel(tab):
             html.H4("Menú de Navegación"), html.Hr(),
             dbc.Card(dbc.CardBody([
                 dbc.Label("Rango de Fechas:"),
-                dcc.DatePickerRange(id='filtro-fecha', min_date_allowed=df_global_completo['FECHA_DATETIME'].min().date() if not df_global_completo.empty else None, max_date_allowed=df_global_completo['FECHA_DATETIME'].max().date() if not df_global_completo.empty else None, start_date=df_global_completo['FECHA_DATETIME'].min().date() if not df_global_completo.empty else None, end_date=df_global_completo['FECHA_DATETIME'].max().date() if not df_global_completo.empty else None, className="w-100"),
+                dcc.DatePickerRange(id='filtro-fecha', min_date_allowed=fecha_min, max_date_allowed=fecha_max, start_date=fecha_min, end_date=fecha_max, className="w-100"),
                 html.Br(), html.Br(), dbc.Label("Ubicación(es):"),
                 dcc.Dropdown(id='filtro-ubicacion', multi=True, placeholder="Todas", options=opciones_ubicacion),
                 html.Br(), dbc.Label("Marca(s):"),
@@ -343,6 +539,7 @@ def render_tab_content(tab):
                 color="light", className="border"
             ),
             html.Hr(className="my-3"),
+            dcc.Store(id='agregado-general'),
             dbc.Card(dbc.CardBody([
                 html.H5("Rendimiento Geográfico por Ciudad", className="text-center"),
                 dcc.Graph(id='mapa-ventas', style={'height': '60vh'})
@@ -360,7 +557,7 @@ def render_tab_content(tab):
                         {'label': 'Ventas / Ticket (ATV)', 'value': 'ATV'},
                         {'label': 'Ventas / Unidad (ASP)', 'value': 'ASP'}
                     ],
-                    value='UPT', 
+                    value=RADIOS_POR_DEFECTO['kpi-transaccion-radio'], 
                     inline=True, 
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
@@ -382,7 +579,7 @@ def render_tab_content(tab):
                         {'label': 'Ventas / Ticket (ATV)', 'value': 'ATV'},
                         {'label': 'Ventas / Unidad (ASP)', 'value': 'ASP'}
                     ],
-                    value='VENTAS',
+                    value=RADIOS_POR_DEFECTO['ventas-radio'],
                     inline=True,
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
@@ -401,7 +598,7 @@ def render_tab_content(tab):
                     {'label': 'Unidades / Mt2', 'value': 'Unidades_por_MT2'},
                     {'label': 'Unidades / Canon Fijo', 'value': 'Unidades_por_Canon'}
                 ],
-                value='UNIDADES',
+                value=RADIOS_POR_DEFECTO['unidades-radio'],
                 inline=True,
                 labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                 style={'margin-bottom': '10px'}
@@ -421,7 +618,7 @@ def render_tab_content(tab):
                     {'label': 'Tickets / Mt2', 'value': 'Tickets_por_MT2'},
                     {'label': 'Tickets / Canon Fijo', 'value': 'Tickets_por_Canon'}
                     ],
-                    value='TICKETS',
+                    value=RADIOS_POR_DEFECTO['tickets-radio'],
                     inline=True,
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
@@ -462,6 +659,7 @@ def render_tab_content(tab):
                 color="light", className="border"
             ),
             html.Hr(className="my-3"),
+            dcc.Store(id='agregado-comparativo'),
             # a petición de Uldarico
             dbc.Card(dbc.CardBody([
                 html.H5("Análisis Comparativo de KPIs por Transacción", className="card-title"),
@@ -476,6 +674,7 @@ def render_tab_content(tab):
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
                 ),
+                barra_progreso('progreso-kpi-comparativo'),
                 dcc.Graph(id='grafico-kpi-comparativo')
             ])),
             html.Br(),
@@ -496,6 +695,7 @@ def render_tab_content(tab):
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
                 ),
+                barra_progreso('progreso-ventas-comparativo'),
                 dcc.Graph(id='grafico-ventas-comparativo')
             ])),
             html.Br(),
@@ -512,6 +712,7 @@ def render_tab_content(tab):
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
                 ),
+                barra_progreso('progreso-unidades-comparativo'),
                 dcc.Graph(id='grafico-unidades-comparativo')
             ])),
             html.Br(),
@@ -528,6 +729,7 @@ def render_tab_content(tab):
                     labelStyle={'display': 'inline-block', 'margin-right': '20px'},
                     style={'margin-bottom': '10px'}
                 ),
+                barra_progreso('progreso-tickets-comparativo'),
                 dcc.Graph(id='grafico-tickets-comparativo')
             ]))
         ])
@@ -578,8 +780,9 @@ def render_tab_content(tab):
 # --- 5. CALLBACKS Y FUNCIONES AUXILIARES ---
 
 # --- Funciones Auxiliares (Helpers) ---
+@telemetria.medir(telemetria.duracion_filtrado, 'filter_dataframe')
 def filter_dataframe(df, selected_ubicaciones, selected_marcas, start_date, end_date):
-    """Filtra el dataframe principal según las selecciones del usuario."""
+    """Filtra el dataframe principal según las selecciones del usuario (sin copiar la tabla completa)."""
     if not start_date or not end_date or df is None or df.empty:
         return pd.DataFrame()
     
@@ -589,17 +792,166 @@ def filter_dataframe(df, selected_ubicaciones, selected_marcas, start_date, end_
     except Exception:
         return pd.DataFrame()
 
-    df_filtrado = df.copy()
-    if selected_ubicaciones: # Si la lista no está vacía
-        df_filtrado = df_filtrado[df_filtrado['UBICACION'].isin(selected_ubicaciones)]
-    if selected_marcas: # Si la lista no está vacía
-        df_filtrado = df_filtrado[df_filtrado['MARCA'].isin(selected_marcas)]
-    
-    df_filtrado = df_filtrado[
-        (df_filtrado['FECHA_DATETIME'] >= start_date_dt) & 
-        (df_filtrado['FECHA_DATETIME'] <= end_date_dt)
-    ]
-    return df_filtrado
+    motor = datos_actuales.motor_diario if df is datos_actuales.cubo_diario else MotorFiltros(df)
+    return motor.filtrar({'TIENDA_ID': datos_actuales.ids_tiendas(selected_ubicaciones, selected_marcas)}, start_date_dt, end_date_dt)
+
+def normalizar_filtros(selected_ubicaciones, selected_marcas, start_date_dt, end_date_dt):
+    """Clave canónica de una selección: listas ordenadas (vacía = todas) y fechas ya parseadas."""
+    return (tuple(sorted(selected_ubicaciones or [])), tuple(sorted(selected_marcas or [])), start_date_dt, end_date_dt)
+
+def clave_filtros(selected_ubicaciones, selected_marcas, start_date, end_date):
+    """Parsea las fechas y devuelve la clave normalizada, o None si la selección no es válida."""
+    if not start_date or not end_date:
+        return None
+    try:
+        start_date_dt = pd.to_datetime(start_date)
+        end_date_dt = pd.to_datetime(end_date)
+    except Exception:
+        return None
+    return normalizar_filtros(selected_ubicaciones, selected_marcas, start_date_dt, end_date_dt)
+
+@telemetria.medir(telemetria.duracion_filtrado, 'filtrar_cubo')
+def filtrar_cubo(selected_ubicaciones, selected_marcas, start_date, end_date, datos=None):
+    """Filtra el cubo más compacto que responde al rango: el mensual si cubre meses completos, si no el diario.
+
+    El resultado se comparte entre callbacks a través de `cache_filtros`; no debe modificarse.
+    """
+    datos = datos or datos_actuales
+    clave = clave_filtros(selected_ubicaciones, selected_marcas, start_date, end_date)
+    if clave is None or datos.vacio:
+        return pd.DataFrame()
+    return cache_filtros.obtener_o_calcular(('filtro', datos.version) + clave, lambda: datos.filtrar(*clave))
+
+@telemetria.medir(telemetria.duracion_filtrado, 'totales_tiendas')
+def totales_tiendas(selected_ubicaciones, selected_marcas, start_date, end_date, datos=None):
+    """Totales de la selección por tienda (TIENDA_ID, VENTAS, UNIDADES, TICKETS, DIAS).
+
+    Salen del índice de sumas acumuladas: dos lecturas por tienda, sin importar el ancho del rango.
+    Tienen la forma de un cubo, así que sirven tal cual para `agregar_cubo` y `totales_seleccion`.
+    """
+    datos = datos or datos_actuales
+    clave = clave_filtros(selected_ubicaciones, selected_marcas, start_date, end_date)
+    if clave is None or datos.vacio:
+        return pd.DataFrame()
+    return cache_filtros.obtener_o_calcular(('tiendas', datos.version) + clave, lambda: datos.totales_por_tienda(*clave))
+
+def calcular_resumen_general(selected_ubicaciones, selected_marcas, start_date, end_date):
+    """Totales y resumen por ciudad de la pestaña general (tarjetas KPI y mapa), desde `totales_tiendas`.
+
+    Devuelve None si no hay datos.
+    """
+    datos = datos_actuales
+    clave = clave_filtros(selected_ubicaciones, selected_marcas, start_date, end_date)
+    if clave is None or datos.vacio:
+        return None
+    return cache_filtros.obtener_o_calcular(('resumen', datos.version) + clave, lambda: _calcular_resumen_general(datos, *clave))
+
+def calcular_agregado_general(selected_ubicaciones, selected_marcas, start_date, end_date):
+    """Agregado entidad × año de la pestaña general.
+
+    Se calcula una sola vez por selección (compartido vía `cache_filtros`) y de él derivan los
+    cuatro gráficos YoY. Devuelve None si no hay datos.
+    """
+    datos = datos_actuales
+    clave = clave_filtros(selected_ubicaciones, selected_marcas, start_date, end_date)
+    if clave is None or datos.vacio:
+        return None
+    return cache_filtros.obtener_o_calcular(('general', datos.version) + clave, lambda: _calcular_agregado_general(datos, *clave))
+
+def totales_seleccion(df_filtrado, tiendas=None):
+    """Medidas totales de una selección; Mt2 sale de la dimensión y se cuenta una vez por tienda-marca."""
+    if tiendas is None:
+        tiendas = tiendas_presentes(df_filtrado, datos_actuales.tiendas).drop_duplicates(subset=['UBICACION', 'MARCA'])
+    return {
+        'VENTAS': df_filtrado['VENTAS'].sum(), 'UNIDADES': df_filtrado['UNIDADES'].sum(), 'TICKETS': df_filtrado['TICKETS'].sum(),
+        'Metros_Cuadrados': tiendas['Metros_Cuadrados'].sum(), 'Numero_Tiendas': len(tiendas),
+    }
+
+def _calcular_resumen_general(datos, ubicaciones, marcas, start_date_dt, end_date_dt):
+    por_tienda = totales_tiendas(list(ubicaciones), list(marcas), start_date_dt, end_date_dt, datos=datos)
+    if por_tienda.empty:
+        return None
+
+    presentes = tiendas_presentes(por_tienda, datos.tiendas)
+    totales = totales_seleccion(por_tienda, presentes.drop_duplicates(subset=['UBICACION', 'MARCA']))
+
+    # Resumen por CIUDAD para el mapa (cada fila de la dimensión es una tienda UBICACION × MARCA × CIUDAD)
+    stores_per_city = agregar_cubo(presentes, 'CIUDAD', Numero_Tiendas=('CIUDAD', 'size'))
+    sales_units_per_city = agregar_cubo(por_tienda, 'CIUDAD', tiendas=datos.tiendas,
+        Total_Ventas=('VENTAS', 'sum'), 
+        Total_Unidades=('UNIDADES', 'sum')
+    )
+    por_ciudad = pd.merge(sales_units_per_city, stores_per_city, on='CIUDAD', how='left')
+    return {'totales': totales, 'por_ciudad': por_ciudad}
+
+def _calcular_agregado_general(datos, ubicaciones, marcas, start_date_dt, end_date_dt):
+    # El YoY sigue sobre el cubo: necesita el AÑO de cada fila y las tiendas con ventas en cada año
+    df_filtrado = filtrar_cubo(list(ubicaciones), list(marcas), start_date_dt, end_date_dt, datos=datos)
+    if df_filtrado.empty:
+        return None
+
+    df_yoy, grouping_col, title_entity, num_months = agregar_entidad_anio(df_filtrado, list(marcas), datos.tiendas)
+    return {'yoy': df_yoy, 'grouping_col': grouping_col, 'title_entity': title_entity, 'num_months': num_months}
+
+def figura_cacheada(nombre, selecciones=1):
+    """Decora una función (filtros de `selecciones` selecciones..., *parámetros) -> figura con `cache_figuras`.
+
+    La clave es el nombre, la versión de los datos, los filtros normalizados y los demás parámetros
+    (métrica, ejes); los argumentos por nombre (como `avance`) no cambian la figura y no entran en
+    ella. Con filtros inválidos o sin cache se llama directo a la función. La figura se guarda y se
+    devuelve ya compacta (figuras_compactas.py).
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **opciones):
+            n = 4 * selecciones
+            claves = [clave_filtros(*args[i:i + 4]) for i in range(0, n, 4)]
+            if cache_figuras is None or any(clave is None for clave in claves):
+                return figuras_compactas.compactar_figura(funcion(*args, **opciones))
+            version = f"{datos_actuales.version}/{VERSION_CODIGO}"
+            partes = [[list(u), list(m), s.isoformat(), e.isoformat()] for u, m, s, e in claves]
+            clave = json.dumps([nombre, version, partes, list(args[n:])], ensure_ascii=False, default=str)
+            return cache_figuras.obtener_o_calcular(clave, version, lambda: figuras_compactas.compactar_figura(funcion(*args, **opciones)))
+        return envoltura
+    return decorador
+
+def callback_comparativo(salida, progreso, entradas, **opciones):
+    """Registra la función decorada como callback de la pestaña comparativa y la devuelve sin cambios.
+
+    Con administrador de trabajos corre en segundo plano: un nuevo estado de filtros de la misma
+    sesión termina el trabajo anterior de ese callback, salir de la pestaña cancela el que esté en
+    curso y la barra `progreso` (id de un dbc.Progress, o lista de ids) muestra el avance que la
+    función informa con su argumento `avance`. Sin administrador es un callback común y la barra
+    solo indica que está calculando.
+    """
+    barras = [progreso] if isinstance(progreso, str) else list(progreso)
+    en_curso = [(Output(barra, 'style'), {'height': '4px'}, {'height': '4px', 'visibility': 'hidden'}) for barra in barras]
+    def decorador(funcion):
+        if administrador_trabajos is None:
+            app.callback(salida, entradas, running=en_curso, **opciones)(funcion)
+            return funcion
+        # functools.wraps: Dash identifica cada trabajo por el código fuente de la función original
+        @functools.wraps(funcion)
+        def trabajo(set_progress, *args):
+            return funcion(*args, avance=lambda porcentaje: set_progress([porcentaje] * len(barras)))
+        app.callback(salida, entradas, background=True, progress=[Output(barra, 'value') for barra in barras], running=en_curso,
+                     cancel=[Input('tabs-analisis', 'value')], interval=INTERVALO_TRABAJOS_MS, **opciones)(trabajo)
+        return funcion
+    return decorador
+
+def barra_progreso(id_barra):
+    """Barra fina que se muestra mientras corre el callback comparativo que la actualiza."""
+    return dbc.Progress(id=id_barra, value=100, striped=True, animated=True, style={'height': '4px', 'visibility': 'hidden'}, className="mb-2")
+
+def totales_comparacion(u1, m1, s1, e1, u2, m2, s2, e2, avance=None):
+    """Totales por tienda de las dos selecciones comparadas, informando el avance (0-100) a `avance`."""
+    avance = avance or (lambda porcentaje: None)
+    avance(10)
+    df1 = totales_tiendas(u1, m1, s1, e1)
+    avance(50)
+    df2 = totales_tiendas(u2, m2, s2, e2)
+    avance(90)
+    return df1, df2
 
 def create_empty_figure(message="Selecciona filtros para ver datos"):
     """Crea una figura vacía con un mensaje."""
@@ -628,168 +980,128 @@ def toggle_filter_visibility(tab):
         return {'display': 'block'}, {'display': 'none'}
 
 # --- Callbacks para el Contenido de las Pestañas ---
+# Tarjetas KPI: etiqueta corta de cada métrica del registro (metricas.py)
+ETIQUETAS_KPI = {
+    "VENTAS": "Total Ventas", "Metros_Cuadrados": "Total Mt2", "TICKETS": "Total Tickets", "UNIDADES": "Total Unidades",
+    "Ventas_por_MT2": "Ventas/Mt2", "UPT": "Unidades/Ticket (UPT)", "ATV": "Ventas/Ticket (ATV)", "ASP": "Artículo Prom. (ASP)",
+}
+CLAVES_KPI = list(ETIQUETAS_KPI)
+
 @app.callback(
     Output('kpi-cards-container', 'children'),
     [Input('tabs-analisis', 'value'),
-     # Inputs para el tab General
      Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'),
-     Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date'),
-     # Inputs para el tab Comparativo
+     Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date')]
+)
+def update_kpis(active_tab, ub_gral, m_gral, sd_gral, ed_gral):
+    # En la pestaña comparativa las tarjetas las arma update_comparative_kpis (en segundo plano)
+    if active_tab == 'tab-comparativo':
+        return dash.no_update
+
+    # Lógica para KPIs generales (acá están los básicos en retail)
+    agregado = calcular_resumen_general(ub_gral, m_gral, sd_gral, ed_gral)
+    if agregado is None: return [dbc.Col(dbc.Card(dbc.CardBody("Sin Datos")), md=12)]
+    
+    kpis = evaluar_totales(agregado['totales'], CLAVES_KPI)
+    kpi_definitions = [{"label": ETIQUETAS_KPI[clave], "value": formatear_valor(clave, kpis[clave])} for clave in CLAVES_KPI]
+    
+    kpi_cards = [dbc.Col(dbc.Card(dbc.CardBody([html.P(kpi["label"], className="text-muted mb-0 small"), html.H4(kpi["value"], className="text-secondary")])), md=4, lg=3, className="mb-2") for kpi in kpi_definitions]
+    
+    num_cols_por_fila = 4
+    kpi_rows = [dbc.Row(kpi_cards[i:i + num_cols_por_fila]) for i in range(0, len(kpi_cards), num_cols_por_fila)]
+    return kpi_rows
+
+# Tarjetas de la pestaña comparativa: comparten la salida con update_kpis
+@callback_comparativo(
+    Output('kpi-cards-container', 'children', allow_duplicate=True), 'progreso-tarjetas-comparativo',
+    [Input('tabs-analisis', 'value'),
      Input('filtro-ubicacion-1', 'value'), Input('filtro-marca-1', 'value'),
      Input('filtro-fecha-1', 'start_date'), Input('filtro-fecha-1', 'end_date'),
      Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'),
-     Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date')]
+     Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date')],
+    prevent_initial_call=True
 )
-def update_kpis(active_tab, 
-                ub_gral, m_gral, sd_gral, ed_gral,
-                u1, m1, s1, e1, u2, m2, s2, e2):
+def update_comparative_kpis(active_tab, u1, m1, s1, e1, u2, m2, s2, e2, avance=None):
+    if active_tab != 'tab-comparativo':
+        return dash.no_update
+    # --- LÓGICA PARA KPIs COMPARATIVOS (CON 9 KPIs) ---
+    if not all([s1, e1, s2, e2]): return []
 
-    # Previene que el callback se ejecute al inicio si los inputs no están listos
-    triggered_id = dash.ctx.triggered_id
-    if not triggered_id and active_tab != 'tab-general':
-        return []
+    df1, df2 = totales_comparacion(u1, m1, s1, e1, u2, m2, s2, e2, avance)
     
-    if active_tab == 'tab-comparativo':
-        # --- LÓGICA PARA KPIs COMPARATIVOS (CON 9 KPIs) ---
-        if not all([s1, e1, s2, e2]): return []
-
-        df1 = filter_dataframe(df_global_completo, u1, m1, s1, e1)
-        df2 = filter_dataframe(df_global_completo, u2, m2, s2, e2)
-        
-        def calc_pct_change(new_val, old_val):
-            if old_val > 0:
-                return ((new_val - old_val) / old_val) * 100
-            elif new_val > 0:
-                return float('inf')
-            return 0.0
-
-        # --- Calcular para Selección 1 ---
-        v1 = df1['VENTAS'].sum(); u1_total = df1['UNIDADES'].sum(); t1 = df1['TICKETS'].sum()
-        m2_1 = df1.drop_duplicates(subset=['UBICACION', 'MARCA'])['Metros_Cuadrados'].sum()
-        kpi_raw_1 = {
-            "Total Ventas": v1, "Total Mt2": m2_1, "Total Tickets": t1, "Total Unidades": u1_total,
-            "Ventas/Mt2": (v1 / m2_1) if m2_1 > 0 else 0,
-            "Unidades/Ticket (UPT)": (u1_total / t1) if t1 > 0 else 0,
-            "Ventas/Ticket (ATV)": (v1 / t1) if t1 > 0 else 0,
-            "Artículo Prom. (ASP)": (v1 / u1_total) if u1_total > 0 else 0,
-            #"Unidades/Mt2": (u1_total / m2_1) if m2_1 > 0 else 0
-        }
-
-        # --- Calcular para Selección 2 ---
-        v2 = df2['VENTAS'].sum(); u2_total = df2['UNIDADES'].sum(); t2 = df2['TICKETS'].sum()
-        m2_2 = df2.drop_duplicates(subset=['UBICACION', 'MARCA'])['Metros_Cuadrados'].sum()
-        kpi_raw_2 = {
-            "Total Ventas": v2, "Total Mt2": m2_2, "Total Tickets": t2, "Total Unidades": u2_total,
-            "Ventas/Mt2": (v2 / m2_2) if m2_2 > 0 else 0,
-            "Unidades/Ticket (UPT)": (u2_total / t2) if t2 > 0 else 0,
-            "Ventas/Ticket (ATV)": (v2 / t2) if t2 > 0 else 0,
-            "Artículo Prom. (ASP)": (v2 / u2_total) if u2_total > 0 else 0,
-            #"Unidades/Mt2": (u2_total / m2_2) if m2_2 > 0 else 0
-        }
-
-        kpi_formats = {
-            "Total Ventas": "${:,.0f}", "Total Unidades": "{:,.0f}", "Total Tickets": "{:,.0f}", "Total Mt2": "{:,.0f}",
-            "Ventas/Mt2": "${:,.2f}", "Unidades/Ticket (UPT)": "{:,.2f}", "Ventas/Ticket (ATV)": "${:,.2f}",
-            "Artículo Prom. (ASP)": "${:,.2f}", #"Unidades/Mt2": "{:,.2f}"
-        }
-        
-        def generar_indicador_cambio(change_pct):
-            if change_pct == float('inf'): return dbc.Row([dbc.Col(html.I(className="bi bi-rocket-takeoff-fill me-2"), width="auto"), dbc.Col(html.H6("Nuevo", className="mb-0"))], className="text-success", align="center")
-            if change_pct > 0.1: return dbc.Row([dbc.Col(html.I(className="bi bi-arrow-up-circle-fill me-2"), width="auto"), dbc.Col(html.H6(f"+{change_pct:.1f}%", className="mb-0"))], className="text-success", align="center")
-            elif change_pct < -0.1: return dbc.Row([dbc.Col(html.I(className="bi bi-arrow-down-circle-fill me-2"), width="auto"), dbc.Col(html.H6(f"{change_pct:.1f}%", className="mb-0"))], className="text-danger", align="center")
-            else: return html.P("-", className="text-muted text-center fw-bold mb-0")
-
-        # --- Lista completa de 9 KPIs a mostrar (comenté el último) ---
-        kpi_defs = ["Total Ventas", "Total Mt2", "Total Tickets", "Total Unidades", "Ventas/Mt2", "Ventas/Ticket (ATV)", "Unidades/Ticket (UPT)", "Artículo Prom. (ASP)"]
-        
-        cards = []
-        for kpi_name in kpi_defs:
-            val1 = kpi_raw_1.get(kpi_name, 0)
-            val2 = kpi_raw_2.get(kpi_name, 0)
-            change = calc_pct_change(val2, val1)
-            indicator_component = generar_indicador_cambio(change)
-            
-            card = dbc.Col(
-                dbc.Card(dbc.CardBody([
-                    html.P(kpi_name, className="card-title font-weight-bold text-center small"),
-                    html.Hr(className="my-2"),
-                    dbc.Row([
-                        dbc.Col(html.P("Sel 1:", className="text-primary small mb-1 font-weight-bold"), width="auto"),
-                        dbc.Col(html.H6(kpi_formats.get(kpi_name, "{:,.2f}").format(val1), className="text-primary text-end")),
-                    ], align="center"),
-                    dbc.Row([
-                        dbc.Col(html.P("Sel 2:", className="text-danger small mb-1 font-weight-bold"), width="auto"),
-                        dbc.Col(html.H6(kpi_formats.get(kpi_name, "{:,.2f}").format(val2), className="text-danger text-end")),
-                    ]),
-                    html.Hr(className="my-1"),
-                    indicator_component
-                ])),
-                width=6, sm=4, md=4, lg=3, xl=3, className="mb-3"
-            )
-            cards.append(card)
-        
-        num_cols_por_fila = 4
-        kpi_rows = [dbc.Row(cards[i:i + num_cols_por_fila]) for i in range(0, len(cards), num_cols_por_fila)]
-        return kpi_rows
-
-    else: # Lógica para KPIs generales (acá están los básicos en retail)
-        df_filtrado = filter_dataframe(df_global_completo, ub_gral, m_gral, sd_gral, ed_gral)
-        if df_filtrado.empty: return [dbc.Col(dbc.Card(dbc.CardBody("Sin Datos")), md=12)]
-        
-        total_ventas = df_filtrado['VENTAS'].sum(); total_unidades = df_filtrado['UNIDADES'].sum(); total_tickets = df_filtrado['TICKETS'].sum()
-        total_mt2 = df_filtrado.drop_duplicates(subset=['UBICACION', 'MARCA'])['Metros_Cuadrados'].sum()
-
-        kpi_definitions = [
-            {"label": "Total Ventas", "value": f"${total_ventas:,.0f}"},{"label": "Total Mt2", "value": f"{total_mt2:,.0f}"},
-            {"label": "Total Tickets", "value": f"{total_tickets:,.0f}"},{"label": "Total Unidades", "value": f"{total_unidades:,.0f}"},
-            {"label": "Ventas/Mt2", "value": f"${(total_ventas/total_mt2 if total_mt2 > 0 else 0):,.2f}"},
-            {"label": "Unidades/Ticket (UPT)", "value": f"{(total_unidades/total_tickets if total_tickets > 0 else 0):,.2f}"},
-            {"label": "Ventas/Ticket (ATV)", "value": f"${(total_ventas/total_tickets if total_tickets > 0 else 0):,.2f}"},
-            {"label": "Artículo Prom. (ASP)", "value": f"${(total_ventas/total_unidades if total_unidades > 0 else 0):,.2f}"},
-            #{"label": "Unidades/Mt2", "value": f"{(total_unidades/total_mt2 if total_mt2 > 0 else 0):,.2f}"}
-        ]
-        
-        kpi_cards = [dbc.Col(dbc.Card(dbc.CardBody([html.P(kpi["label"], className="text-muted mb-0 small"), html.H4(kpi["value"], className="text-secondary")])), md=4, lg=3, className="mb-2") for kpi in kpi_definitions]
+    def calc_pct_change(new_val, old_val):
+        if old_val > 0:
+            return ((new_val - old_val) / old_val) * 100
+        elif new_val > 0:
+            return float('inf')
+        return 0.0
+
+    # Mismas definiciones que los gráficos (metricas.py); sin dato cuenta como 0
+    kpi_raw_1 = evaluar_totales(totales_seleccion(df1), CLAVES_KPI)
+    kpi_raw_2 = evaluar_totales(totales_seleccion(df2), CLAVES_KPI)
+    
+    def generar_indicador_cambio(change_pct):
+        if change_pct == float('inf'): return dbc.Row([dbc.Col(html.I(className="bi bi-rocket-takeoff-fill me-2"), width="auto"), dbc.Col(html.H6("Nuevo", className="mb-0"))], className="text-success", align="center")
+        if change_pct > 0.1: return dbc.Row([dbc.Col(html.I(className="bi bi-arrow-up-circle-fill me-2"), width="auto"), dbc.Col(html.H6(f"+{change_pct:.1f}%", className="mb-0"))], className="text-success", align="center")
+        elif change_pct < -0.1: return dbc.Row([dbc.Col(html.I(className="bi bi-arrow-down-circle-fill me-2"), width="auto"), dbc.Col(html.H6(f"{change_pct:.1f}%", className="mb-0"))], className="text-danger", align="center")
+        else: return html.P("-", className="text-muted text-center fw-bold mb-0")
+
+    # --- KPIs a mostrar, en el orden de las tarjetas ---
+    kpi_defs = ["VENTAS", "Metros_Cuadrados", "TICKETS", "UNIDADES", "Ventas_por_MT2", "ATV", "UPT", "ASP"]
+    
+    cards = []
+    for clave in kpi_defs:
+        kpi_name = ETIQUETAS_KPI[clave]
+        val1 = kpi_raw_1.get(clave, 0)
+        val2 = kpi_raw_2.get(clave, 0)
+        change = calc_pct_change(val2, val1)
+        indicator_component = generar_indicador_cambio(change)
         
-        num_cols_por_fila = 4
-        kpi_rows = [dbc.Row(kpi_cards[i:i + num_cols_por_fila]) for i in range(0, len(kpi_cards), num_cols_por_fila)]
-        return kpi_rows
+        card = dbc.Col(
+            dbc.Card(dbc.CardBody([
+                html.P(kpi_name, className="card-title font-weight-bold text-center small"),
+                html.Hr(className="my-2"),
+                dbc.Row([
+                    dbc.Col(html.P("Sel 1:", className="text-primary small mb-1 font-weight-bold"), width="auto"),
+                    dbc.Col(html.H6(formatear_valor(clave, val1), className="text-primary text-end")),
+                ], align="center"),
+                dbc.Row([
+                    dbc.Col(html.P("Sel 2:", className="text-danger small mb-1 font-weight-bold"), width="auto"),
+                    dbc.Col(html.H6(formatear_valor(clave, val2), className="text-danger text-end")),
+                ]),
+                html.Hr(className="my-1"),
+                indicator_component
+            ])),
+            width=6, sm=4, md=4, lg=3, xl=3, className="mb-3"
+        )
+        cards.append(card)
+    
+    num_cols_por_fila = 4
+    kpi_rows = [dbc.Row(cards[i:i + num_cols_por_fila]) for i in range(0, len(cards), num_cols_por_fila)]
+    return kpi_rows
 
-        
-# Callback para el mapa
-@app.callback(
-    Output('mapa-ventas', 'figure'),
-    [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'),
-     Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date')]
-)
+# Mapa (se actualiza desde update_general_tab)
+@figura_cacheada('mapa')
 def update_map_chart(selected_ubicaciones, selected_marcas, start_date, end_date):
     if start_date is None: return dash.no_update
-        
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    if df_filtrado.empty: 
+    return figura_mapa(calcular_resumen_general(selected_ubicaciones, selected_marcas, start_date, end_date))
+
+def figura_mapa(agregado):
+    if agregado is None: 
         return create_empty_figure("Sin datos para el mapa")
     
-    # --- Lógica de Conteo y Agregación ---
-    
-    # 1. Calcular totales para la selección completa
-    total_ventas_seleccion = df_filtrado['VENTAS'].sum()
-    total_tiendas_seleccion = len(df_filtrado.drop_duplicates(subset=['UBICACION', 'MARCA']))
+    # --- Totales de la selección completa (ya agregados) ---
+    total_ventas_seleccion = agregado['totales']['VENTAS']
+    total_tiendas_seleccion = agregado['totales']['Numero_Tiendas']
     
     if total_ventas_seleccion == 0:
         return create_empty_figure("Las ventas totales son cero en esta selección")
 
-    # 2. Contar tiendas y agregar ventas/unidades por CIUDAD
-    stores_per_city = df_filtrado.drop_duplicates(subset=['CIUDAD', 'UBICACION', 'MARCA']).groupby('CIUDAD').size().reset_index(name='Numero_Tiendas')
-    sales_units_per_city = df_filtrado.groupby('CIUDAD', as_index=False).agg(
-        Total_Ventas=('VENTAS', 'sum'), 
-        Total_Unidades=('UNIDADES', 'sum')
-    )
-    
-    # 3. Unir los dataframes para tener toda la información por ciudad
-    df_mapa_data = pd.merge(sales_units_per_city, stores_per_city, on='CIUDAD', how='left')
+    # Tiendas, ventas y unidades por CIUDAD (copia: el agregado se comparte entre callbacks)
+    df_mapa_data = agregado['por_ciudad'].copy()
     df_mapa_data['Total_Unidades'] = df_mapa_data['Total_Unidades'].astype(int)
     
-    # 4. Calcular la columna de porcentaje de ventas
+    # Calcular la columna de porcentaje de ventas
     df_mapa_data['Porc_Ventas'] = (df_mapa_data['Total_Ventas'] / total_ventas_seleccion)
 
     # Unir con coordenadas
@@ -852,37 +1164,79 @@ def store_clicked_city(clickData):
 def update_city_detail_view(clicked_city, selected_ubicaciones, selected_marcas, start_date, end_date):
     if not clicked_city: return dbc.Alert("Haz clic en una ciudad en el mapa para ver el detalle de sus ubicaciones.", color="info", className="mt-3 text-center")
     
-    df_filtrado_general = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    df_ciudad_filtrada = df_filtrado_general[df_filtrado_general['CIUDAD'] == clicked_city]
+    df_filtrado_general = filtrar_cubo(selected_ubicaciones, selected_marcas, start_date, end_date)
+    tiendas = datos_actuales.tiendas
+    en_ciudad = (tiendas['CIUDAD'] == clicked_city).to_numpy()
+    df_ciudad_filtrada = df_filtrado_general[en_ciudad[df_filtrado_general['TIENDA_ID'].to_numpy()]] if not df_filtrado_general.empty else df_filtrado_general
     if df_ciudad_filtrada.empty: return html.Div(f"No hay datos para '{clicked_city}' en la selección actual.")
-    df_detalle_ubicacion = df_ciudad_filtrada.groupby('UBICACION', as_index=False).agg(Total_Ventas=('VENTAS', 'sum')).sort_values(by='Total_Ventas', ascending=False)
+    df_detalle_ubicacion = agregar_cubo(df_ciudad_filtrada, 'UBICACION', tiendas=tiendas, Total_Ventas=('VENTAS', 'sum')).sort_values(by='Total_Ventas', ascending=False)
     
     fig_detalle = px.bar(df_detalle_ubicacion, x='UBICACION', y='Total_Ventas', text='Total_Ventas', title=f"Ventas por Ubicación en: {clicked_city}")
-    fig_detalle.update_traces(texttemplate='$%{text:,.0f}', textposition='outside')
+    fig_detalle.update_traces(texttemplate='$%{y:,.0f}', textposition='outside')
     fig_detalle.update_layout(xaxis_title=None, yaxis_title="Ventas Totales ($)", paper_bgcolor=COLOR_FONDO_GRAFICO, plot_bgcolor=COLOR_FONDO_GRAFICO, font_color=COLOR_TEXTO_OSCURO, yaxis=dict(gridcolor='#dee2e6'))
-    return dbc.Card(dbc.CardBody(dcc.Graph(figure=fig_detalle)))
-
-# Callbacks para los 3 gráficos dinámicos de la pestaña general
-@app.callback(Output('grafico-ventas-dinamico', 'figure'), [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'), Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date'), Input('ventas-radio', 'value')])
-def update_sales_dynamic_chart(selected_ubicaciones, selected_marcas, start_date, end_date, selected_metric):
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    metric_map = {'VENTAS': {'label':'Ventas Totales','value':'VENTAS','formatter':'$%{text:,.0f}'}, 'Ventas_por_MT2': {'label':'Ventas / Mt2','value':'Ventas_por_MT2','formatter':'$%{text:,.2f}'}, 'Relacion_Ventas_Canon': {'label':'Ventas / Canon Periodo','value':'Relacion_Ventas_Canon','formatter':'%{text:,.2f}x'}, 'ATV': {'label':'Ventas / Ticket (ATV)','value':'ATV','formatter':'$%{text:,.2f}'}, 'ASP': {'label':'Ventas / Unidad (ASP)','value':'ASP','formatter':'$%{text:,.2f}'}}
-    return create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_map[selected_metric])
-
-@app.callback(Output('grafico-unidades-dinamico', 'figure'), [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'), Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date'), Input('unidades-radio', 'value')])
-def update_units_dynamic_chart(selected_ubicaciones, selected_marcas, start_date, end_date, selected_metric):
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    metric_map = {'UNIDADES': {'label':'Unidades Totales','value':'UNIDADES','formatter':'%{text:,.0f}'}, 'UPT': {'label':'Unidades / Ticket (UPT)','value':'UPT','formatter':'%{text:,.2f}'}, 'Unidades_por_MT2': {'label':'Unidades / Mt2','value':'Unidades_por_MT2','formatter':'%{text:,.2f}'}, 'Unidades_por_Canon': {'label':'Unidades / Canon Periodo','value':'Unidades_por_Canon','formatter':'%{text:,.2f}'}}
-    return create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_map[selected_metric])
-
-@app.callback(Output('grafico-tickets-dinamico', 'figure'), [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'), Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date'), Input('tickets-radio', 'value')])
-def update_tickets_dynamic_chart(selected_ubicaciones, selected_marcas, start_date, end_date, selected_metric):
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    metric_map = {'TICKETS': {'label':'Tickets Totales','value':'TICKETS','formatter':'%{text:,.0f}'}, 'Tickets_por_MT2': {'label':'Tickets / Mt2','value':'Tickets_por_MT2','formatter':'%{text:,.2f}'}, 'Tickets_por_Canon': {'label':'Tickets / Canon Periodo','value':'Tickets_por_Canon','formatter':'%{text:,.2f}'}}
-    return create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_map[selected_metric])
-
-
+    return dbc.Card(dbc.CardBody(dcc.Graph(figure=figuras_compactas.compactar_figura(fig_detalle))))
+
+# --- Gráficos de barras por métrica (YoY y comparativos): los arma el navegador ---
+# Todas las métricas de esos gráficos derivan de las mismas sumas (VENTAS, UNIDADES, TICKETS, Mt2
+# y Canon) por entidad × año o por marca. El servidor envía ese agregado compacto una vez por
+# cambio de filtros (stores 'agregado-general' y 'agregado-comparativo') y un callback del lado del
+# cliente (assets/graficos_cliente.js) calcula la métrica elegida y arma la figura: cambiar de
+# métrica no llega al servidor. El store 'registro-graficos' lleva las métricas de metricas.py.
+COLUMNAS_AGREGADO_CLIENTE = ['VENTAS', 'UNIDADES', 'TICKETS', 'Metros_Cuadrados', 'Canon_Fijo']
+GRAFICOS_YOY = {'grafico-kpi-dinamico': 'kpi-transaccion-radio', 'grafico-ventas-dinamico': 'ventas-radio',
+                'grafico-unidades-dinamico': 'unidades-radio', 'grafico-tickets-dinamico': 'tickets-radio'}
+GRAFICOS_COMPARATIVOS = {'grafico-kpi-comparativo': 'kpi-transaccion-radio-comp', 'grafico-ventas-comparativo': 'ventas-radio-comp',
+                         'grafico-unidades-comparativo': 'unidades-radio-comp', 'grafico-tickets-comparativo': 'tickets-radio-comp'}
+
+def _columnas_cliente(df, claves):
+    """{columna: lista} de `df` para enviar como JSON (NaN -> null)."""
+    return {col: df[col].astype(object).where(df[col].notna(), None).tolist() for col in claves if col in df.columns}
+
+def agregado_yoy_cliente(agregado):
+    """Agregado entidad × año de la pestaña general, en columnas, para los gráficos YoY del navegador."""
+    if agregado is None:
+        return {'filas': None}
+    df_agg, grouping_col = agregado['yoy'], agregado['grouping_col']
+    filas = {'entidad': df_agg[grouping_col].astype(str).tolist(), 'anio': df_agg['AÑO'].astype(str).tolist(),
+             **_columnas_cliente(df_agg, COLUMNAS_AGREGADO_CLIENTE)}
+    # El Canon del agregado es mensual: el navegador lo prorratea por los meses del período
+    return {'entidad': grouping_col, 'meses': int(agregado['num_months']), 'filas': filas}
+
+def agregado_comparativo_cliente(df_tiendas1, df_tiendas2):
+    """Sumas por MARCA de las dos selecciones comparadas, para los gráficos comparativos del navegador."""
+    if df_tiendas1.empty or df_tiendas2.empty:
+        return {'selecciones': None}
+    selecciones = []
+    for df_tiendas in (df_tiendas1, df_tiendas2):
+        sumas = {col: (col, 'sum') for col in COLUMNAS_AGREGADO_CLIENTE if col in MEDIDAS or col in datos_actuales.tiendas.columns}
+        df_agg = agregar_cubo(df_tiendas, 'MARCA', tiendas=datos_actuales.tiendas, **sumas)
+        selecciones.append({'MARCA': df_agg['MARCA'].astype(str).tolist(), **_columnas_cliente(df_agg, COLUMNAS_AGREGADO_CLIENTE)})
+    return {'selecciones': selecciones}
+
+def registro_graficos():
+    """Métricas (metricas.py), colores y plantilla con que el navegador arma los gráficos de barras."""
+    metricas = {clave: {'numerador': metrica['numerador'], 'denominador': metrica['denominador'], 'canon': bool(metrica.get('canon')),
+                        'formatter': metrica['formatter'], 'label_periodo': detalle_metrica(clave, prorrateado=True)['label'],
+                        'label_fijo': detalle_metrica(clave, prorrateado=False)['label']} for clave, metrica in METRICAS.items()}
+    return {'metricas': metricas, 'paleta': list(PALETA_COLORES), 'plantilla': figuras_compactas.plantilla(['bar']),
+            'colores': {'fondo': COLOR_FONDO_GRAFICO, 'texto': COLOR_TEXTO_OSCURO, 'seleccion1': COLOR_PRIMARIO_AZUL, 'seleccion2': '#DC3545'}}
+
+# El mapa y el agregado de los 4 gráficos YoY salen de un solo callback por cambio de filtros;
+# los radios de métrica no pasan por aquí (ver abajo los callbacks del cliente).
+@app.callback(
+    [Output('mapa-ventas', 'figure'), Output('agregado-general', 'data')],
+    [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'),
+     Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date')]
+)
+def update_general_tab(selected_ubicaciones, selected_marcas, start_date, end_date):
+    if start_date is None: return [dash.no_update] * 2 # Evita errores si el callback se dispara antes de tiempo
+    filtros = (selected_ubicaciones, selected_marcas, start_date, end_date)
+    # El mapa y el agregado comparten el filtrado de cache_filtros
+    return update_map_chart(*filtros), agregado_yoy_cliente(calcular_agregado_general(*filtros))
 
+for id_grafico, id_radio in GRAFICOS_YOY.items():
+    app.clientside_callback(ClientsideFunction('graficos', 'yoy'), Output(id_grafico, 'figure'),
+                            Input('agregado-general', 'data'), Input(id_radio, 'value'), State('registro-graficos', 'data'))
 
 # --- Función Auxiliar para crear el gráfico de segmentación ---
 
@@ -955,33 +1309,27 @@ def create_segmentation_chart(df_agg, x_col, y_col, color_col, size_col, text_co
     [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'),
      Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date')]
 )
+@figura_cacheada('segmentacion-mt2')
 def update_mt2_scatter(selected_ubicaciones, selected_marcas, start_date, end_date):
     if start_date is None: return dash.no_update # No actualizar si este gráfico no está visible
     
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
+    df_filtrado = filtrar_cubo(selected_ubicaciones, selected_marcas, start_date, end_date)
     grouping_col, title_entity = ('UBICACION', f"para: {selected_marcas[0]}") if selected_marcas and len(selected_marcas) == 1 else ('MARCA', "(Global)")
     
-    df_agg = df_filtrado.groupby(grouping_col, as_index=False).agg(
-        Total_Ventas=('VENTAS', 'sum'), Total_Unidades=('UNIDADES', 'sum'), 
+    df_agg = agregar_cubo(df_filtrado, grouping_col, tiendas=datos_actuales.tiendas,
+        VENTAS=('VENTAS', 'sum'), UNIDADES=('UNIDADES', 'sum'), 
         Metros_Cuadrados=('Metros_Cuadrados', 'sum')
     )
     df_agg.dropna(subset=['Metros_Cuadrados'], inplace=True); df_agg = df_agg[df_agg['Metros_Cuadrados'] > 0]
     if df_agg.empty or df_agg.shape[0] < 2: return create_empty_figure("No hay suficientes datos para segmentar")
 
-    df_agg['Ventas_por_MT2'] = df_agg['Total_Ventas'] / df_agg['Metros_Cuadrados']
-    df_agg['Unidades_por_MT2'] = df_agg['Total_Unidades'] / df_agg['Metros_Cuadrados']
-    df_agg.replace([np.inf, -np.inf], np.nan, inplace=True); df_agg.dropna(subset=['Ventas_por_MT2', 'Unidades_por_MT2'], inplace=True)
+    df_agg = evaluar_metricas(df_agg, ['Ventas_por_MT2', 'Unidades_por_MT2']).dropna(subset=['Ventas_por_MT2', 'Unidades_por_MT2'])
     if df_agg.empty or df_agg.shape[0] < 2: return create_empty_figure("Datos insuficientes")
 
-    median_ventas_mt2 = df_agg['Ventas_por_MT2'].median(); median_unidades_mt2 = df_agg['Unidades_por_MT2'].median()
-    def definir_segmento_mt2(row):
-        if row['Ventas_por_MT2'] >= median_ventas_mt2 and row['Unidades_por_MT2'] >= median_unidades_mt2: return 'Líder Productividad'
-        if row['Ventas_por_MT2'] >= median_ventas_mt2 and row['Unidades_por_MT2'] < median_unidades_mt2: return 'Eficiente en Valor'
-        if row['Ventas_por_MT2'] < median_ventas_mt2 and row['Unidades_por_MT2'] >= median_unidades_mt2: return 'Movilizador de Volumen'
-        return ' Desafío de Productividad'
-    df_agg['Segmento_Eficiencia'] = df_agg.apply(definir_segmento_mt2, axis=1)
+    df_agg['Segmento_Eficiencia'] = clasificar_cuadrantes(df_agg, 'Ventas_por_MT2', 'Unidades_por_MT2',
+        ('Líder Productividad', 'Eficiente en Valor', 'Movilizador de Volumen', ' Desafío de Productividad'))
     
-    return create_segmentation_chart(df_agg, 'Unidades_por_MT2', 'Ventas_por_MT2', 'Segmento_Eficiencia', 'Total_Ventas', grouping_col, 
+    return create_segmentation_chart(df_agg, 'Unidades_por_MT2', 'Ventas_por_MT2', 'Segmento_Eficiencia', 'VENTAS', grouping_col, 
                                      f"Segmentación por Eficiencia de M² de {grouping_col.capitalize()}s {title_entity}", 'Unidades por Metro Cuadrado', 'Ventas por Metro Cuadrado ($)')
 
 @app.callback(
@@ -989,203 +1337,56 @@ def update_mt2_scatter(selected_ubicaciones, selected_marcas, start_date, end_da
     [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'),
      Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date')]
 )
+@figura_cacheada('segmentacion-canon')
 def update_canon_scatter(selected_ubicaciones, selected_marcas, start_date, end_date):
     if start_date is None: return dash.no_update
     
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date).dropna(subset=['Canon_Fijo'])
+    df_filtrado = filtrar_cubo(selected_ubicaciones, selected_marcas, start_date, end_date)
+    if not df_filtrado.empty:
+        # Solo tiendas con Canon registrado en la dimensión
+        con_canon = datos_actuales.tiendas['Canon_Fijo'].notna().to_numpy()
+        df_filtrado = df_filtrado[con_canon[df_filtrado['TIENDA_ID'].to_numpy()]]
     grouping_col, title_entity = ('UBICACION', f"para: {selected_marcas[0]}") if selected_marcas and len(selected_marcas) == 1 else ('MARCA', "(Global)")
     
-    df_agg = df_filtrado.groupby(grouping_col, as_index=False).agg(
-        Total_Ventas=('VENTAS', 'sum'), Total_Tickets=('TICKETS', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum')
+    df_agg = agregar_cubo(df_filtrado, grouping_col, tiendas=datos_actuales.tiendas,
+        VENTAS=('VENTAS', 'sum'), TICKETS=('TICKETS', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum')
     )
     df_agg = df_agg[df_agg['Canon_Fijo'] > 0]
     if df_agg.empty or df_agg.shape[0] < 2: return create_empty_figure("No hay datos de Canon Fijo para segmentar")
 
-    df_agg['Ventas_por_Canon'] = df_agg['Total_Ventas'] / df_agg['Canon_Fijo']
-    df_agg['Tickets_por_Canon'] = df_agg['Total_Tickets'] / df_agg['Canon_Fijo']
-    df_agg.replace([np.inf, -np.inf], np.nan, inplace=True); df_agg.dropna(subset=['Ventas_por_Canon', 'Tickets_por_Canon'], inplace=True)
+    df_agg = evaluar_metricas(df_agg, ['Ventas_por_Canon', 'Tickets_por_Canon']).dropna(subset=['Ventas_por_Canon', 'Tickets_por_Canon'])
     if df_agg.empty or df_agg.shape[0] < 2: return create_empty_figure("Datos insuficientes")
 
-    median_ventas_canon = df_agg['Ventas_por_Canon'].median(); median_tickets_canon = df_agg['Tickets_por_Canon'].median()
-    
-    def definir_segmento_canon(row):
-        if row['Ventas_por_Canon'] >= median_ventas_canon and row['Tickets_por_Canon'] >= median_tickets_canon: return 'Líder en Rentabilidad'
-        if row['Ventas_por_Canon'] >= median_ventas_canon and row['Tickets_por_Canon'] < median_tickets_canon: return 'Rentable (Bajo Tráfico)'
-        if row['Ventas_por_Canon'] < median_ventas_canon and row['Tickets_por_Canon'] >= median_tickets_canon: return 'Atrae Tráfico (Baja Rent.)'
-        return 'Desafío de Costos'
-    df_agg['Segmento_Eficiencia'] = df_agg.apply(definir_segmento_canon, axis=1)
+    df_agg['Segmento_Eficiencia'] = clasificar_cuadrantes(df_agg, 'Ventas_por_Canon', 'Tickets_por_Canon',
+        ('Líder en Rentabilidad', 'Rentable (Bajo Tráfico)', 'Atrae Tráfico (Baja Rent.)', 'Desafío de Costos'))
     
-    return create_segmentation_chart(df_agg, 'Tickets_por_Canon', 'Ventas_por_Canon', 'Segmento_Eficiencia', 'Total_Ventas', grouping_col,
+    return create_segmentation_chart(df_agg, 'Tickets_por_Canon', 'Ventas_por_Canon', 'Segmento_Eficiencia', 'VENTAS', grouping_col,
                                      f"Segmentación por Eficiencia de Canon de {grouping_col.capitalize()}s {title_entity}", 'Tickets por $ de Canon', 'Ventas por $ de Canon')
 
 
 # --- ME EQUIVOQUE Y ESTOS CALLBACKS ESTAN DESORDENADOS ES DECIR NO ESTAN ESCRITOS POR ORDEN DE APARICION PERO FUNCIONA PORQUE EL ORDEN ESTA EN EL LAYOUT PERO PARA QUIEN LEA... NO ESTAN POR ORDEN DE APARICIÓN---
 
-# --- Función Auxiliar para los Gráficos Comparativos (CON ORDENAMIENTO) ---
-def create_comparative_chart(df_filtrado1, df_filtrado2, metric_details):
-    value_col = metric_details['value']
-    
-    if df_filtrado1.empty or df_filtrado2.empty:
-        return create_empty_figure("Una o ambas selecciones no tienen datos.")
-    
-    # La comparación siempre se hará por MARCA
-    grouping_col = 'MARCA'
-    
-    # Procesar Selección 1
-    df_agg1 = df_filtrado1.groupby(grouping_col, as_index=False).agg(Total_Ventas=('VENTAS', 'sum'), Total_Tickets=('TICKETS', 'sum'), Total_Unidades=('UNIDADES', 'sum'), Metros_Cuadrados=('Metros_Cuadrados', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum'))
-    df_agg1['Comparación'] = 'Selección 1'
-
-    # Procesar Selección 2
-    df_agg2 = df_filtrado2.groupby(grouping_col, as_index=False).agg(Total_Ventas=('VENTAS', 'sum'), Total_Tickets=('TICKETS', 'sum'), Total_Unidades=('UNIDADES', 'sum'), Metros_Cuadrados=('Metros_Cuadrados', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum'))
-    df_agg2['Comparación'] = 'Selección 2'
-
-    df_comparativo = pd.concat([df_agg1, df_agg2], ignore_index=True)
-    df_comparativo.replace(0, np.nan, inplace=True)
-
-    # Calcular dinámicamente la métrica
-    y_col_to_plot = value_col
-    with np.errstate(divide='ignore', invalid='ignore'):
-        if y_col_to_plot == 'VENTAS': df_comparativo[y_col_to_plot] = df_comparativo['Total_Ventas']
-        elif y_col_to_plot == 'UNIDADES': df_comparativo[y_col_to_plot] = df_comparativo['Total_Unidades']
-        elif y_col_to_plot == 'TICKETS': df_comparativo[y_col_to_plot] = df_comparativo['Total_Tickets']
-        elif y_col_to_plot == 'Ventas_por_MT2': df_comparativo[y_col_to_plot] = df_comparativo['Total_Ventas'] / df_comparativo['Metros_Cuadrados']
-        elif y_col_to_plot == 'Relacion_Ventas_Canon': df_comparativo[y_col_to_plot] = df_comparativo['Total_Ventas'] / df_comparativo['Canon_Fijo']
-        elif y_col_to_plot == 'ATV': df_comparativo[y_col_to_plot] = df_comparativo['Total_Ventas'] / df_comparativo['Total_Tickets']
-        elif y_col_to_plot == 'ASP': df_comparativo[y_col_to_plot] = df_comparativo['Total_Ventas'] / df_comparativo['Total_Unidades']
-        elif y_col_to_plot == 'UPT': df_comparativo[y_col_to_plot] = df_comparativo['Total_Unidades'] / df_comparativo['Total_Tickets']
-        elif y_col_to_plot == 'Unidades_por_MT2': df_comparativo[y_col_to_plot] = df_comparativo['Total_Unidades'] / df_comparativo['Metros_Cuadrados']
-        elif y_col_to_plot == 'Unidades_por_Canon': df_comparativo[y_col_to_plot] = df_comparativo['Total_Unidades'] / df_comparativo['Canon_Fijo']
-        elif y_col_to_plot == 'Tickets_por_MT2': df_comparativo[y_col_to_plot] = df_comparativo['Total_Tickets'] / df_comparativo['Metros_Cuadrados']
-        elif y_col_to_plot == 'Tickets_por_Canon': df_comparativo[y_col_to_plot] = df_comparativo['Total_Tickets'] / df_comparativo['Canon_Fijo']
-
-    df_comparativo[y_col_to_plot] = df_comparativo[y_col_to_plot].round(2)
-    df_comparativo.replace([np.inf, -np.inf], np.nan, inplace=True)
-    df_comparativo.dropna(subset=[y_col_to_plot], inplace=True)
-
-    if df_comparativo.empty:
-        return create_empty_figure("No hay datos para esta métrica con las selecciones actuales.")
-
-    
-    # 1. Calcular el valor total (suma de ambas selecciones) para ordenar
-    sorting_order_df = df_comparativo.groupby(grouping_col)[y_col_to_plot].sum().reset_index()
-    # 2. Crear la lista ordenada
-    sorted_categories = sorting_order_df.sort_values(by=y_col_to_plot, ascending=False)[grouping_col].tolist()
-    # ------------------------------------
-
-    fig = px.bar(
-        df_comparativo, x=grouping_col, y=y_col_to_plot, color='Comparación',
-        barmode='group', text=y_col_to_plot,
-        #title=f"Comparativa de {metric_details['label']}",
-        color_discrete_map={'Selección 1': COLOR_PRIMARIO_AZUL, 'Selección 2': '#DC3545'},
-        category_orders={grouping_col: sorted_categories} # <-- 3. APLICAR EL ORDEN
-    )
-    
-    hover_template = (f"<b>Marca:</b> %{{x}}<br>"
-                      "<b>%{fullData.name}</b><br>"
-                      f"<b>{metric_details['label']}:</b> {metric_details['formatter'].replace('text', 'y')}"
-                      "<extra></extra>")
+def agregar_entidad_anio(df_filtrado, selected_marcas, tiendas=None):
+    """Suma las medidas por entidad (MARCA, o UBICACION si hay una sola marca) y AÑO.
 
-    fig.update_traces(
-        texttemplate=metric_details['formatter'], 
-        textposition='outside',
-        hovertemplate=hover_template
-    )
-    
-    y_axis_prefix = '$' if '$' in metric_details['formatter'] else ''
-    fig.update_layout(
-        paper_bgcolor=COLOR_FONDO_GRAFICO, plot_bgcolor=COLOR_FONDO_GRAFICO, font_color=COLOR_TEXTO_OSCURO,
-        xaxis_title="Marca", yaxis_title=metric_details['label'], legend_title_text='Comparación',
-        yaxis=dict(gridcolor='#dee2e6', tickprefix=y_axis_prefix, tickformat=",.2f")
-    )
-    return fig
-
-
-# --- Función Auxiliar para crear los gráficos de barras YoY (CON ORDENAMIENTO) ---
-def create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_details):
-    value_col = metric_details['value']
-    
-    if df_filtrado.empty: return create_empty_figure("No hay datos para esta selección")
-    if value_col in ['Relacion_Ventas_Canon', 'Unidades_por_Canon', 'Tickets_por_Canon'] and 'Canon_Fijo' not in df_filtrado.columns:
-        return create_empty_figure("Datos de Canon Fijo no disponibles")
-    
+    El Canon_Fijo (mensual) de cada entidad y año es la suma del Canon de sus tiendas distintas con
+    ventas en ese año: no depende del orden de las filas. Se prorratea con `num_months`.
+    """
+    tiendas = datos_actuales.tiendas if tiendas is None else tiendas
     grouping_col, title_entity = ('UBICACION', f"para: {selected_marcas[0]}") if selected_marcas and len(selected_marcas) == 1 else ('MARCA', "(Global)")
     
-    df_agg = df_filtrado.groupby([grouping_col, 'AÑO'], as_index=False).agg(
-        Total_Ventas=('VENTAS', 'sum'), Total_Tickets=('TICKETS', 'sum'),
-        Total_Unidades=('UNIDADES', 'sum'), Metros_Cuadrados=('Metros_Cuadrados', 'sum'),
-        Canon_Fijo=('Canon_Fijo', 'first')
-    )
-    df_agg.replace(0, np.nan, inplace=True)
-    
-    y_col_to_plot = value_col
-    with np.errstate(divide='ignore', invalid='ignore'):
-        if y_col_to_plot == 'VENTAS': df_agg[y_col_to_plot] = df_agg['Total_Ventas']
-        elif y_col_to_plot == 'UNIDADES': df_agg[y_col_to_plot] = df_agg['Total_Unidades']
-        elif y_col_to_plot == 'TICKETS': df_agg[y_col_to_plot] = df_agg['Total_Tickets']
-        elif y_col_to_plot == 'Ventas_por_MT2': df_agg[y_col_to_plot] = df_agg['Total_Ventas'] / df_agg['Metros_Cuadrados']
-        elif y_col_to_plot == 'Relacion_Ventas_Canon':
-            num_months = df_filtrado['FECHA_DATETIME'].dt.to_period('M').nunique()
-            df_agg['Canon_Total_Periodo'] = df_agg['Canon_Fijo'] * num_months
-            df_agg[y_col_to_plot] = df_agg['Total_Ventas'] / df_agg['Canon_Total_Periodo']
-        elif y_col_to_plot == 'ATV': df_agg[y_col_to_plot] = df_agg['Total_Ventas'] / df_agg['Total_Tickets']
-        elif y_col_to_plot == 'ASP': df_agg[y_col_to_plot] = df_agg['Total_Ventas'] / df_agg['Total_Unidades']
-        elif y_col_to_plot == 'UPT': df_agg[y_col_to_plot] = df_agg['Total_Unidades'] / df_agg['Total_Tickets']
-        elif y_col_to_plot == 'Unidades_por_MT2': df_agg[y_col_to_plot] = df_agg['Total_Unidades'] / df_agg['Metros_Cuadrados']
-        elif y_col_to_plot == 'Tickets_por_MT2': df_agg[y_col_to_plot] = df_agg['Total_Tickets'] / df_agg['Metros_Cuadrados']
-        elif y_col_to_plot == 'Unidades_por_Canon':
-            num_months = df_filtrado['FECHA_DATETIME'].dt.to_period('M').nunique()
-            df_agg['Canon_Total_Periodo'] = df_agg['Canon_Fijo'] * num_months
-            df_agg[y_col_to_plot] = df_agg['Total_Unidades'] / df_agg['Canon_Total_Periodo']
-        elif y_col_to_plot == 'Tickets_por_Canon':
-            num_months = df_filtrado['FECHA_DATETIME'].dt.to_period('M').nunique()
-            df_agg['Canon_Total_Periodo'] = df_agg['Canon_Fijo'] * num_months
-            df_agg[y_col_to_plot] = df_agg['Total_Tickets'] / df_agg['Canon_Total_Periodo']
-
-    df_agg[y_col_to_plot] = df_agg[y_col_to_plot].round(2)
-    df_agg.replace([np.inf, -np.inf], np.nan, inplace=True); df_agg.dropna(subset=[y_col_to_plot], inplace=True)
-    if df_agg.empty: return create_empty_figure("No hay datos para esta métrica")
-    df_agg['AÑO'] = df_agg['AÑO'].astype(str)
-
-
-    # 1. Calcular el valor total de la métrica por entidad para poder ordenar
-    sorting_order_df = df_agg.groupby(grouping_col)[y_col_to_plot].sum().reset_index()
-    # 2. Crear la lista ordenada de categorías (de mayor a menor)
-    sorted_categories = sorting_order_df.sort_values(by=y_col_to_plot, ascending=False)[grouping_col].tolist()
-    # ------------------------------------
-
-    fig = px.bar(
-        df_agg, x=grouping_col, y=y_col_to_plot, color='AÑO', 
-        barmode='group', text=y_col_to_plot,
-        #title=f'Comparativa YoY de {metric_details["label"]} por {grouping_col.capitalize()}',
-        color_discrete_sequence=PALETA_COLORES,
-        category_orders={grouping_col: sorted_categories} # ORDEN
+    agregaciones = dict(
+        VENTAS=('VENTAS', 'sum'), TICKETS=('TICKETS', 'sum'),
+        UNIDADES=('UNIDADES', 'sum'), Metros_Cuadrados=('Metros_Cuadrados', 'sum')
     )
-    
-    hover_template = (f"<b>{grouping_col}:</b> %{{x}}<br>"
-                      "<b>Año:</b> %{fullData.name}<br>"
-                      f"<b>{metric_details['label']}:</b> {metric_details['formatter'].replace('text', 'y')}"
-                      "<extra></extra>")
-    
-    fig.update_traces(
-        texttemplate=metric_details['formatter'], 
-        textposition="outside", 
-        textangle=0, 
-        textfont=dict(size=12, family="Arial"),
-        hovertemplate=hover_template
-    )
-    
-    y_axis_prefix = '$' if '$' in metric_details['formatter'] else ''
-    fig.update_layout(
-        paper_bgcolor=COLOR_FONDO_GRAFICO, plot_bgcolor=COLOR_FONDO_GRAFICO, font_color=COLOR_TEXTO_OSCURO,
-        xaxis_title=None, 
-        yaxis_title=metric_details['label'], 
-        legend_title_text='Año',
-        yaxis=dict(gridcolor='#dee2e6', tickprefix=y_axis_prefix, tickformat=",.2f"),
-        xaxis=dict(gridcolor='#e9ecef'),
-        xaxis_tickangle=-45
-    )
-    return fig
-    
+    df_agg = agregar_cubo(df_filtrado, [grouping_col, 'AÑO'], tiendas=tiendas, **agregaciones)
+    if 'Canon_Fijo' in tiendas.columns:
+        canon = sumar_atributo_tiendas(df_filtrado, [grouping_col, 'AÑO'], tiendas, 'Canon_Fijo')
+        df_agg = df_agg.merge(canon, on=[grouping_col, 'AÑO'], how='left')
+    # Meses distintos del período: base para prorratear el Canon mensual
+    num_months = np.unique(df_filtrado['FECHA_DATETIME'].to_numpy().astype('datetime64[M]')).size
+    return df_agg, grouping_col, title_entity, num_months
+
 # --- Callback para la Descarga del README ---
 @app.callback(
     Output("descarga-readme", "data"),
@@ -1194,41 +1395,53 @@ def create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_details):
 )
 def func_descargar_readme(n_clicks):
     return dcc.send_string(README_TEXT, "README.md")
+
+# --- Exportación de los datos de la selección (descarga por bloques) ---
+# El enlace lleva los filtros en la URL; la ruta genera el archivo de a bloques desde el motor de
+# filtros mientras el navegador lo descarga, sin armarlo en memoria.
+@app.callback(
+    Output("btn-exportar", "href"),
+    [Input('filtro-ubicacion', 'value'), Input('filtro-marca', 'value'), Input('filtro-fecha', 'start_date'), Input('filtro-fecha', 'end_date'),
+     Input('exportar-grano', 'value'), Input('exportar-formato', 'value')],
+)
+def actualizar_enlace_exportacion(selected_ubicaciones, selected_marcas, start_date, end_date, grano, formato):
+    consulta = urlencode({'ubicacion': selected_ubicaciones or [], 'marca': selected_marcas or [], 'desde': start_date or '', 'hasta': end_date or ''}, doseq=True)
+    return f"{app.get_relative_path('/exportar/')}{grano}.{formato}?{consulta}"
+
+@server.route('/exportar/<grano>.<formato>')
+def exportar_datos(grano, formato):
+    if grano not in GRANOS or formato not in FORMATOS:
+        flask.abort(404)
+    if formato == 'parquet' and not PARQUET_DISPONIBLE:
+        return "La exportación a Parquet requiere pyarrow (pip install pyarrow).", 501
+    args = flask.request.args
+    clave = clave_filtros(args.getlist('ubicacion'), args.getlist('marca'), args.get('desde'), args.get('hasta'))
+    # La descarga usa de principio a fin la versión de los datos con la que empezó
+    datos = datos_actuales
+    if datos is None:
+        return "Los datos todavía se están cargando.", 503
+    if clave is None or datos.vacio:
+        return "Selección de filtros inválida.", 400
+    bloques = bloques_exportacion(datos, grano, *clave)
+    cuerpo = csv_en_bloques(bloques) if formato == 'csv' else parquet_en_bloques(bloques)
+    nombre = f"ventas_{grano}_{clave[2]:%Y%m%d}_{clave[3]:%Y%m%d}.{formato}"
+    return flask.Response(cuerpo, mimetype=FORMATOS[formato], headers={'Content-Disposition': f'attachment; filename="{nombre}"'})
     
 # --- Callbacks para la Pestaña de Análisis Comparativo ---
-@app.callback(Output('grafico-ventas-comparativo', 'figure'),
-              [Input('filtro-ubicacion-1', 'value'), Input('filtro-marca-1', 'value'), Input('filtro-fecha-1', 'start_date'), Input('filtro-fecha-1', 'end_date'),
-               Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'), Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date'),
-               Input('ventas-radio-comp', 'value')])
-def update_comparative_sales_chart(u1, m1, s1, e1, u2, m2, s2, e2, metric):
-    if not all([s1, e1, s2, e2]): return dash.no_update
-    df1 = filter_dataframe(df_global_completo, u1, m1, s1, e1)
-    df2 = filter_dataframe(df_global_completo, u2, m2, s2, e2)
-    metric_map = {'VENTAS': {'label':'Ventas Totales','value':'VENTAS','formatter':'$%{text:,.0f}'}, 'Ventas_por_MT2': {'label':'Ventas / Mt2','value':'Ventas_por_MT2','formatter':'$%{text:,.2f}'}, 'Relacion_Ventas_Canon': {'label':'Ventas / Canon Fijo','value':'Relacion_Ventas_Canon','formatter':'%{text:,.2f}x'}, 'ATV': {'label':'Ventas / Ticket (ATV)','value':'ATV','formatter':'$%{text:,.2f}'}, 'ASP': {'label':'Ventas / Unidad (ASP)','value':'ASP','formatter':'$%{text:,.2f}'}}
-    return create_comparative_chart(df1, df2, metric_map[metric])
-
-@app.callback(Output('grafico-unidades-comparativo', 'figure'),
+# Un trabajo por cambio de filtros calcula las sumas por marca de las dos selecciones; los cuatro
+# gráficos comparativos las toman del store 'agregado-comparativo' y derivan su métrica en el navegador.
+@callback_comparativo(Output('agregado-comparativo', 'data'),
+              ['progreso-kpi-comparativo', 'progreso-ventas-comparativo', 'progreso-unidades-comparativo', 'progreso-tickets-comparativo'],
               [Input('filtro-ubicacion-1', 'value'), Input('filtro-marca-1', 'value'), Input('filtro-fecha-1', 'start_date'), Input('filtro-fecha-1', 'end_date'),
-               Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'), Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date'),
-               Input('unidades-radio-comp', 'value')])
-def update_comparative_units_chart(u1, m1, s1, e1, u2, m2, s2, e2, metric):
+               Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'), Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date')])
+def update_comparative_aggregate(u1, m1, s1, e1, u2, m2, s2, e2, avance=None):
     if not all([s1, e1, s2, e2]): return dash.no_update
-    df1 = filter_dataframe(df_global_completo, u1, m1, s1, e1)
-    df2 = filter_dataframe(df_global_completo, u2, m2, s2, e2)
-    metric_map = {'UNIDADES': {'label':'Unidades Totales','value':'UNIDADES','formatter':'%{text:,.0f}'}, 'UPT': {'label':'Unidades / Ticket (UPT)','value':'UPT','formatter':'%{text:,.2f}'}, 'Unidades_por_MT2': {'label':'Unidades / Mt2','value':'Unidades_por_MT2','formatter':'%{text:,.2f}'}, 'Unidades_por_Canon': {'label':'Unidades / Canon Fijo','value':'Unidades_por_Canon','formatter':'%{text:,.2f}'}}
-    return create_comparative_chart(df1, df2, metric_map[metric])
+    # Comparativo: el Canon se toma sumado, sin prorratear ("Canon Fijo")
+    return agregado_comparativo_cliente(*totales_comparacion(u1, m1, s1, e1, u2, m2, s2, e2, avance))
 
-@app.callback(Output('grafico-tickets-comparativo', 'figure'),
-              [Input('filtro-ubicacion-1', 'value'), Input('filtro-marca-1', 'value'), Input('filtro-fecha-1', 'start_date'), Input('filtro-fecha-1', 'end_date'),
-               Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'), Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date'),
-               Input('tickets-radio-comp', 'value')])
-def update_comparative_tickets_chart(u1, m1, s1, e1, u2, m2, s2, e2, metric):
-    if not all([s1, e1, s2, e2]): return dash.no_update
-    df1 = filter_dataframe(df_global_completo, u1, m1, s1, e1)
-    df2 = filter_dataframe(df_global_completo, u2, m2, s2, e2)
-    metric_map = {'TICKETS': {'label':'Tickets Totales','value':'TICKETS','formatter':'%{text:,.0f}'}, 'Tickets_por_MT2': {'label':'Tickets / Mt2','value':'Tickets_por_MT2','formatter':'%{text:,.2f}'}, 'Tickets_por_Canon': {'label':'Tickets / Canon Fijo','value':'Tickets_por_Canon','formatter':'%{text:,.2f}'}}
-    return create_comparative_chart(df1, df2, metric_map[metric])
-    
+for id_grafico, id_radio in GRAFICOS_COMPARATIVOS.items():
+    app.clientside_callback(ClientsideFunction('graficos', 'comparativo'), Output(id_grafico, 'figure'),
+                            Input('agregado-comparativo', 'data'), Input(id_radio, 'value'), State('registro-graficos', 'data'))
 
 # --- Callback para el gráfico exploratorio---
 @app.callback(
@@ -1238,16 +1451,17 @@ def update_comparative_tickets_chart(u1, m1, s1, e1, u2, m2, s2, e2, metric):
      Input('exploratorio-eje-x', 'value'),
      Input('exploratorio-eje-y', 'value')]
 )
+@figura_cacheada('exploratorio')
 def update_exploratory_chart(selected_ubicaciones, selected_marcas, start_date, end_date, eje_x, eje_y):
     if not all([start_date, end_date, eje_x, eje_y]):
         return create_empty_figure("Selecciona variables para los ejes X e Y")
 
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
+    df_filtrado = filtrar_cubo(selected_ubicaciones, selected_marcas, start_date, end_date)
     if df_filtrado.empty:
         return create_empty_figure("Sin datos para la selección de filtros")
 
     # Agregar MARCA para tener puntos definidos en el gráfico
-    df_agg = df_filtrado.groupby('MARCA', as_index=False).agg(
+    df_agg = agregar_cubo(df_filtrado, 'MARCA', tiendas=datos_actuales.tiendas,
         VENTAS=('VENTAS', 'sum'),
         UNIDADES=('UNIDADES', 'sum'),
         TICKETS=('TICKETS', 'sum'),
@@ -1257,17 +1471,8 @@ def update_exploratory_chart(selected_ubicaciones, selected_marcas, start_date,
     df_agg.replace(0, np.nan, inplace=True)
 
     
-    # Calcular TODAS las métricas derivadas que podrían ser seleccionadas
-    with np.errstate(divide='ignore', invalid='ignore'):
-        df_agg['Ventas_por_MT2'] = df_agg['VENTAS'] / df_agg['Metros_Cuadrados']
-        df_agg['Unidades_por_MT2'] = df_agg['UNIDADES'] / df_agg['Metros_Cuadrados']
-        df_agg['Tickets_por_MT2'] = df_agg['TICKETS'] / df_agg['Metros_Cuadrados']
-        df_agg['Ventas_por_Canon'] = df_agg['VENTAS'] / df_agg['Canon_Fijo']
-        df_agg['Unidades_por_Canon'] = df_agg['UNIDADES'] / df_agg['Canon_Fijo']
-        df_agg['Tickets_por_Canon'] = df_agg['TICKETS'] / df_agg['Canon_Fijo']
-        df_agg['ATV'] = df_agg['VENTAS'] / df_agg['TICKETS'] 
-        df_agg['UPT'] = df_agg['UNIDADES'] / df_agg['TICKETS'] 
-        df_agg['ASP'] = df_agg['VENTAS'] / df_agg['UNIDADES'] # Precio de Venta Promedio
+    # Solo las dos métricas elegidas (definidas en metricas.py)
+    df_agg = evaluar_metricas(df_agg, [eje_x, eje_y])
     
     df_agg.dropna(subset=[eje_x, eje_y], inplace=True)
     if df_agg.empty:
@@ -1306,60 +1511,119 @@ def update_exploratory_chart(selected_ubicaciones, selected_marcas, start_date,
     )
     return fig
 
-# --- Callback para el nuevo gráfico de KPIs en la pestaña general ---
-@app.callback(
-    Output('grafico-kpi-dinamico', 'figure'),
-    [Input('filtro-ubicacion', 'value'),
-     Input('filtro-marca', 'value'),
-     Input('filtro-fecha', 'start_date'),
-     Input('filtro-fecha', 'end_date'),
-     Input('kpi-transaccion-radio', 'value')]
-)
-def update_kpi_dynamic_chart(selected_ubicaciones, selected_marcas, start_date, end_date, selected_metric):
-    if start_date is None: return dash.no_update # Evita errores si el callback se dispara antes de tiempo
-    df_filtrado = filter_dataframe(df_global_completo, selected_ubicaciones, selected_marcas, start_date, end_date)
-    
-    metric_map = {
-        'UPT': {'label':'Unidades / Ticket (UPT)','value':'UPT','formatter':'%{text:,.2f}'},
-        'ATV': {'label':'Ventas / Ticket (ATV)','value':'ATV','formatter':'$%{text:,.2f}'},
-        'ASP': {'label':'Ventas / Unidad (ASP)','value':'ASP','formatter':'$%{text:,.2f}'}
-    }
-    
-    return create_interactive_yoy_chart(df_filtrado, selected_marcas, metric_map[selected_metric])
-
-
-# --- Callback para el nuevo gráfico de KPIs en la pestaña comparativa ---
-@app.callback(
-    Output('grafico-kpi-comparativo', 'figure'),
-    [Input('filtro-ubicacion-1', 'value'), Input('filtro-marca-1', 'value'), Input('filtro-fecha-1', 'start_date'), Input('filtro-fecha-1', 'end_date'),
-     Input('filtro-ubicacion-2', 'value'), Input('filtro-marca-2', 'value'), Input('filtro-fecha-2', 'start_date'), Input('filtro-fecha-2', 'end_date'),
-     Input('kpi-transaccion-radio-comp', 'value')]
-)
-def update_comparative_kpi_chart(u1, m1, s1, e1, u2, m2, s2, e2, metric):
-    if not all([s1, e1, s2, e2]): return dash.no_update
-    df1 = filter_dataframe(df_global_completo, u1, m1, s1, e1)
-    df2 = filter_dataframe(df_global_completo, u2, m2, s2, e2)
-
-    metric_map = {
-        'UPT': {'label':'Unidades / Ticket (UPT)','value':'UPT','formatter':'%{text:,.2f}'},
-        'ATV': {'label':'Ventas / Ticket (ATV)','value':'ATV','formatter':'$%{text:,.2f}'},
-        'ASP': {'label':'Ventas / Unidad (ASP)','value':'ASP','formatter':'$%{text:,.2f}'}
-    }
-    
-    return create_comparative_chart(df1, df2, metric_map[metric])
+# --- 6. CARGA EN SEGUNDO PLANO, PRECALENTAMIENTO Y ESTADO DE PREPARACIÓN ---
+# Al importar el módulo, un hilo carga los datos, aplica los deltas pendientes y precalcula las
+# vistas más pedidas de la pestaña general (todo el período, cada marca sola y cada año): quedan en
+# cache_filtros (del proceso) y en cache_figuras (compartida entre workers). Mientras tanto el
+# servidor ya responde: /healthz (vivo) y /readyz, que da 503 hasta que los datos están cargados y
+# precalentados, así el orquestador no mata al proceso ni el balanceador le envía usuarios en frío.
+# DASHBOARD_PRECALENTAR=0 desactiva el precalentamiento.
+PRECALENTAR = os.environ.get('DASHBOARD_PRECALENTAR', '1') == '1'
+precalentamiento_listo = threading.Event()
+
+def selecciones_precalentamiento(datos):
+    """Filtros (ubicaciones, marcas, inicio, fin) a precalcular: el estado inicial, cada marca sola y cada año."""
+    if datos.vacio:
+        return []
+    inicio, fin = limites_fechas(datos)
+    selecciones = [(None, None, str(inicio), str(fin))]
+    selecciones += [(None, [marca], str(inicio), str(fin)) for marca in sorted(datos.tiendas['MARCA'].unique())]
+    for anio in range(inicio.year, fin.year + 1):
+        selecciones.append((None, None, str(max(inicio, inicio.replace(year=anio, month=1, day=1))), str(min(fin, fin.replace(year=anio, month=12, day=31)))))
+    return selecciones
+
+def precalentar():
+    """Calcula KPIs, mapa y el agregado de los gráficos YoY de cada selección de `selecciones_precalentamiento`."""
+    inicio = time.perf_counter()
+    selecciones = selecciones_precalentamiento(datos_actuales)
+    try:
+        for filtros in selecciones:
+            calcular_resumen_general(*filtros)
+            update_map_chart(*filtros)
+            calcular_agregado_general(*filtros)
+        print(f"Precalentamiento: {len(selecciones)} selecciones listas en {time.perf_counter() - inicio:.1f} s.")
+    except Exception as e:
+        # Un fallo aquí no debe dejar al worker fuera de servicio: las vistas se calcularán a pedido
+        print(f"ADVERTENCIA: El precalentamiento falló ({e}); las vistas se calcularán a pedido.")
+    finally:
+        precalentamiento_listo.set()
+
+def cargar_datos():
+    """Carga y publica los datos, aplica los deltas y arranca su vigilancia; después precalienta."""
+    global error_carga
+    try:
+        datos = cargar_y_preparar_datos()
+        if datos.vacio:
+            raise ValueError("los archivos no tienen ventas válidas")
+        publicar_datos(datos)
+        revisar_deltas()
+        if INTERVALO_DELTAS_SEG > 0:
+            threading.Thread(target=_vigilar_deltas, name='vigilancia-deltas', daemon=True).start()
+        print(f"Datos cargados en {time.time() - inicio_carga:.1f} s: {len(datos_actuales.cubo_diario):,} filas diarias (versión {datos_actuales.version}).")
+    except Exception as e:
+        error_carga = str(e) or type(e).__name__
+        print("ERROR CRÍTICO: La carga de datos falló. La aplicación no puede mostrar el dashboard.")
+        print(f"Por favor, revisa el problema en los archivos Excel: {error_carga}")
+    finally:
+        datos_cargados.set()
+    if error_carga is None and PRECALENTAR:
+        precalentar()
+    else:
+        precalentamiento_listo.set()
+
+@server.route('/healthz')
+def healthz():
+    # Vivo mientras el proceso responde; una carga fallida no se arregla sola, así que pide reiniciarlo
+    if error_carga is not None:
+        return flask.jsonify(estado='error', error=error_carga), 500
+    return flask.jsonify(estado='vivo')
+
+@server.route('/readyz')
+def readyz():
+    if not datos_cargados.is_set():
+        return flask.jsonify(estado='cargando', segundos=round(time.time() - inicio_carga, 1)), 503
+    if error_carga is not None:
+        return flask.jsonify(estado='error', error=error_carga), 503
+    datos = datos_actuales
+    fecha_min, fecha_max = limites_fechas(datos)
+    estado = 'listo' if precalentamiento_listo.is_set() else 'precalentando'
+    return flask.jsonify(estado=estado, version=datos.version, filas=len(datos.cubo_diario),
+                         fecha_min=str(fecha_min), fecha_max=str(fecha_max)), 200 if estado == 'listo' else 503
+
+_carga_iniciada = False
+_cerrojo_carga = threading.Lock()
+
+def iniciar_carga():
+    """Arranca la carga en segundo plano una sola vez por proceso; las llamadas siguientes no hacen nada.
+
+    La llaman el bloque `__main__`, el hook `post_fork` de gunicorn.conf.py y, por si el servidor
+    es otro, la primera petición. Así importar `app` (pruebas, scripts, el benchmark) no dispara
+    una carga.
+    """
+    global _carga_iniciada, inicio_carga
+    with _cerrojo_carga:
+        if _carga_iniciada:
+            return
+        _carga_iniciada = True
+        inicio_carga = time.time()
+    threading.Thread(target=cargar_datos, name='carga-datos', daemon=True).start()
+
+@server.before_request
+def iniciar_carga_en_primera_peticion():
+    if not _carga_iniciada:
+        iniciar_carga()
 
 # ---  Ejecutar la App ---
 if __name__ == '__main__':
-    # Primero, verificar si los datos se cargaron correctamente
-    if df_global_completo is None or df_global_completo.empty:
-        # Si no, imprimir un error y no iniciar el servidor
-        print("ERROR CRÍTICO: La carga de datos falló. La aplicación no puede iniciar.")
-        print("Por favor, revisa los mensajes de error anteriores para identificar el problema en los archivos Excel.")
-    else:
-        # Si todo está bien, iniciar el servidor
-        print("\nDatos cargados correctamente.")
-        # Render usará la variable de entorno PORT, si no, usa el puerto 8050 para desarrollo local
-        port = int(os.environ.get("PORT", 8050))
-        print(f"Iniciando servidor Dash en http://0.0.0.0:{port}/")
-        # Usamos host='0.0.0.0' para que sea accesible en redes y para el despliegue
-        app.run(host='0.0.0.0', port=port, debug=True)
+    # Los datos se cargan en segundo plano: el servidor arranca ya y muestra una página de carga
+    # (si la carga falla, los detalles quedan arriba en la consola y en /readyz)
+    # Render usará la variable de entorno PORT, si no, usa el puerto 8050 para desarrollo local
+    debug = os.environ.get('DASHBOARD_DEBUG', '1') == '1'
+    # Con debug, este proceso solo vigila los archivos y relanza otro (WERKZEUG_RUN_MAIN) que sirve
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_carga()
+    port = int(os.environ.get("PORT", 8050))
+    print(f"Iniciando servidor Dash en http://0.0.0.0:{port}/")
+    # Usamos host='0.0.0.0' para que sea accesible en redes y para el despliegue.
+    # El modo debug (con su proceso recargador) es solo para desarrollo; en producción usar gunicorn.conf.py
+    app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,156 @@
+// --- GRÁFICOS DE BARRAS POR MÉTRICA, ARMADOS EN EL NAVEGADOR ---
+// Gráficos YoY (pestaña general) y comparativos: parten del agregado compacto que envía el
+// servidor una vez por cambio de filtros (sumas por entidad × año o por marca) y de las métricas
+// de metricas.py (store 'registro-graficos'). Cambiar de métrica se resuelve aquí, sin pedir nada
+// al servidor. La aritmética es la de evaluar_metricas: los ceros y las divisiones sin dato quedan
+// fuera del gráfico y los valores se redondean a 2 decimales como numpy (mitades al par).
+(function () {
+    var noUpdate = function () { return window.dash_clientside.no_update; };
+
+    function figuraVacia(mensaje, registro) {
+        var colores = registro.colores;
+        return {layout: {paper_bgcolor: colores.fondo, plot_bgcolor: colores.fondo, font: {color: colores.texto},
+                         annotations: [{text: mensaje, showarrow: false, font: {size: 16}}]}};
+    }
+
+    // Sin dato (null en el JSON) o cero cuentan como NaN, como el replace(0, np.nan) del servidor
+    function valorBase(columna, i) {
+        var valor = columna[i];
+        return (valor === null || valor === undefined || valor === 0) ? NaN : valor;
+    }
+
+    function evaluarMetrica(columnas, i, metrica, meses) {
+        var valor = valorBase(columnas[metrica.numerador], i);
+        if (metrica.denominador !== null) {
+            var denominador = valorBase(columnas[metrica.denominador], i);
+            // El Canon es mensual: con `meses` se prorratea al período
+            if (metrica.canon && meses !== null) {
+                denominador = denominador * meses;
+            }
+            valor = valor / denominador;
+        }
+        return isFinite(valor) ? redondear(valor) : NaN;
+    }
+
+    // round(2) de pandas: rint(valor × 100) / 100, con las mitades al par
+    function redondear(valor) {
+        var escalado = valor * 100;
+        var entero = Math.round(escalado);
+        if (entero - escalado === 0.5 && entero % 2 !== 0) {
+            entero -= 1;
+        }
+        return entero / 100;
+    }
+
+    // Filas con valor de la métrica, agrupadas por serie (año o selección) en orden de aparición, y
+    // categorías del eje X ordenadas por la suma de la métrica entre series, de mayor a menor
+    function series(filas) {
+        var porSerie = {}, nombres = [], sumas = {}, categorias = [];
+        filas.forEach(function (fila) {
+            if (!(fila.serie in porSerie)) {
+                porSerie[fila.serie] = {x: [], y: []};
+                nombres.push(fila.serie);
+            }
+            porSerie[fila.serie].x.push(fila.categoria);
+            porSerie[fila.serie].y.push(fila.valor);
+            if (!(fila.categoria in sumas)) {
+                sumas[fila.categoria] = 0;
+                categorias.push(fila.categoria);
+            }
+            sumas[fila.categoria] += fila.valor;
+        });
+        categorias.sort();
+        categorias.sort(function (a, b) { return sumas[b] - sumas[a]; });
+        return {nombres: nombres, porSerie: porSerie, orden: categorias};
+    }
+
+    function figuraBarras(datos, colorSerie, estiloTrazas, plantillaHover, ejeX, tituloLeyenda, etiqueta, formato, registro) {
+        var texto = formato.split('text').join('y');
+        var trazas = datos.nombres.map(function (nombre, k) {
+            return Object.assign({
+                type: 'bar', name: nombre, x: datos.porSerie[nombre].x, y: datos.porSerie[nombre].y,
+                marker: {color: colorSerie(nombre, k), pattern: {shape: ''}},
+                alignmentgroup: 'True', offsetgroup: nombre, legendgroup: nombre, orientation: 'v', showlegend: true,
+                textposition: 'outside', texttemplate: texto, xaxis: 'x', yaxis: 'y',
+                hovertemplate: plantillaHover + '<b>' + etiqueta + ':</b> ' + texto + '<extra></extra>'
+            }, estiloTrazas);
+        });
+        var colores = registro.colores;
+        return {
+            data: trazas,
+            layout: {
+                template: registro.plantilla,
+                xaxis: Object.assign({anchor: 'y', domain: [0, 1], categoryorder: 'array', categoryarray: datos.orden}, ejeX),
+                yaxis: {anchor: 'x', domain: [0, 1], title: {text: etiqueta}, gridcolor: '#dee2e6',
+                        tickprefix: formato.indexOf('$') !== -1 ? '$' : '', tickformat: ',.2f'},
+                legend: {title: {text: tituloLeyenda}, tracegroupgap: 0}, margin: {t: 60}, barmode: 'group',
+                font: {color: colores.texto}, paper_bgcolor: colores.fondo, plot_bgcolor: colores.fondo
+            }
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        graficos: {
+            // Barras YoY de la métrica `clave` desde el agregado entidad × año ('agregado-general')
+            yoy: function (agregado, clave, registro) {
+                if (!agregado || !registro || !(clave in registro.metricas)) {
+                    return noUpdate();
+                }
+                var columnas = agregado.filas;
+                if (!columnas) {
+                    return figuraVacia('No hay datos para esta selección', registro);
+                }
+                var metrica = registro.metricas[clave];
+                if (!(metrica.numerador in columnas) || (metrica.denominador !== null && !(metrica.denominador in columnas))) {
+                    return figuraVacia('Datos de Canon Fijo no disponibles', registro);
+                }
+                var filas = [];
+                columnas.entidad.forEach(function (entidad, i) {
+                    var valor = evaluarMetrica(columnas, i, metrica, agregado.meses);
+                    if (!isNaN(valor)) {
+                        filas.push({serie: columnas.anio[i], categoria: entidad, valor: valor});
+                    }
+                });
+                if (!filas.length) {
+                    return figuraVacia('No hay datos para esta métrica', registro);
+                }
+                var paleta = registro.paleta;
+                return figuraBarras(series(filas), function (nombre, k) { return paleta[k % paleta.length]; },
+                    {textangle: 0, textfont: {family: 'Arial', size: 12}},
+                    '<b>' + agregado.entidad + ':</b> %{x}<br><b>Año:</b> %{fullData.name}<br>',
+                    {title: {}, gridcolor: '#e9ecef', tickangle: -45}, 'Año',
+                    metrica.label_periodo, metrica.formatter, registro);
+            },
+            // Barras por marca de las dos selecciones ('agregado-comparativo'); el Canon va sin prorratear
+            comparativo: function (agregado, clave, registro) {
+                if (!agregado || !registro || !(clave in registro.metricas)) {
+                    return noUpdate();
+                }
+                if (!agregado.selecciones) {
+                    return figuraVacia('Una o ambas selecciones no tienen datos.', registro);
+                }
+                var metrica = registro.metricas[clave];
+                var filas = [];
+                agregado.selecciones.forEach(function (columnas, s) {
+                    if (!(metrica.numerador in columnas) || (metrica.denominador !== null && !(metrica.denominador in columnas))) {
+                        return;
+                    }
+                    columnas.MARCA.forEach(function (marca, i) {
+                        var valor = evaluarMetrica(columnas, i, metrica, null);
+                        if (!isNaN(valor)) {
+                            filas.push({serie: 'Selección ' + (s + 1), categoria: marca, valor: valor});
+                        }
+                    });
+                });
+                if (!filas.length) {
+                    return figuraVacia('No hay datos para esta métrica con las selecciones actuales.', registro);
+                }
+                var colores = {'Selección 1': registro.colores.seleccion1, 'Selección 2': registro.colores.seleccion2};
+                return figuraBarras(series(filas), function (nombre) { return colores[nombre]; }, {},
+                    '<b>Marca:</b> %{x}<br><b>%{fullData.name}</b><br>',
+                    {title: {text: 'Marca'}}, 'Comparación',
+                    metrica.label_fijo, metrica.formatter, registro);
+            }
+        }
+    });
+})();
@@ -0,0 +1,243 @@
+"""Benchmark de callbacks del dashboard sobre datos sintéticos de tamaño creciente.
+
+Llama directamente a las funciones de los callbacks (sin navegador) y reporta, por callback y
+combinación de filtros: latencia p50/p95, pico de memoria asignada y tamaño del JSON de la figura o del agregado (como se envía).
+También compara las agregaciones de cada vista con el núcleo de códigos enteros (`agregar_cubo`)
+contra la ruta con `groupby` de pandas (`agregar_cubo_pandas`).
+
+Uso:
+    python benchmarks/bench_callbacks.py                        # 100k, 1M y 10M filas
+    python benchmarks/bench_callbacks.py --filas 100000 1000000 --repeticiones 7
+    python benchmarks/bench_callbacks.py --salida benchmarks/linea_base.json
+    python benchmarks/bench_callbacks.py --comparar benchmarks/linea_base.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Importar la app desde una carpeta vacía: así arranca con los datos de ejemplo pequeños
+# y no toca los Excel reales ni su cache; luego se le publican los datos del benchmark.
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='bench_dashboard_'))
+# Se mide la construcción de las figuras, no la cache de figuras en disco
+os.environ['DASHBOARD_CACHE_FIGURAS_MB'] = '0'
+os.environ['DASHBOARD_PRECALENTAR'] = '0'
+import app  # noqa: E402
+app.iniciar_carga()  # la carga corre en segundo plano y lee desde el directorio temporal
+app.datos_cargados.wait()
+os.chdir(_cwd)
+
+import plotly.utils  # noqa: E402
+import figuras_compactas  # noqa: E402
+
+from cubo_ventas import agregar_cubo, agregar_cubo_pandas  # noqa: E402
+from datos_sinteticos import generar_datos_sinteticos  # noqa: E402
+from version_datos import VersionDatos  # noqa: E402
+
+FILAS_POR_DEFECTO = [100_000, 1_000_000, 10_000_000]
+N_ANIOS = 5
+N_CIUDADES = 12
+# Filas esperadas por ubicación: ~4 marcas × días × 70% de días con venta
+FILAS_POR_UBICACION = 4 * 365.25 * N_ANIOS * 0.7
+UMBRAL_REGRESION = 1.25
+
+
+def generar_dataset(filas_objetivo, seed=7):
+    n_tiendas = max(N_CIUDADES, math.ceil(filas_objetivo / FILAS_POR_UBICACION))
+    df_ventas, df_arrendamientos = generar_datos_sinteticos(n_ciudades=N_CIUDADES, n_tiendas=n_tiendas, n_anios=N_ANIOS, seed=seed)
+    return df_ventas, df_arrendamientos
+
+
+def escenarios_filtros(df, tiendas):
+    """Combinaciones representativas: todo, una marca, una tienda, rango angosto y rango amplio."""
+    fecha_min, fecha_max = df['FECHA_DATETIME'].min(), df['FECHA_DATETIME'].max()
+    # Filas de cada tienda del cubo, sumadas por marca y por ubicación desde la dimensión
+    filas = tiendas.assign(FILAS=np.bincount(df['TIENDA_ID'].to_numpy(), minlength=len(tiendas)))
+    marca = str(filas.groupby('MARCA', observed=True)['FILAS'].sum().idxmax())
+    ubicacion = str(filas.groupby('UBICACION', observed=True)['FILAS'].sum().idxmax())
+    mitad = fecha_min + (fecha_max - fecha_min) / 2
+    return {
+        'todo': (None, None, str(fecha_min.date()), str(fecha_max.date())),
+        'una_marca': (None, [marca], str(fecha_min.date()), str(fecha_max.date())),
+        'una_tienda': ([ubicacion], None, str(fecha_min.date()), str(fecha_max.date())),
+        'rango_angosto': (None, None, str(mitad.date()), str((mitad + np.timedelta64(6, 'D')).date())),
+        'rango_amplio': (None, None, str((fecha_min + np.timedelta64(45, 'D')).date()), str((fecha_max - np.timedelta64(45, 'D')).date())),
+    }
+
+
+def callbacks_a_medir():
+    """Nombre -> función(u, m, s, e) que invoca el callback con esa selección."""
+    def kpis(u, m, s, e):
+        return app.update_kpis('tab-general', u, m, s, e)
+
+    def comparativo(u, m, s, e):
+        # Selección 2: el mismo filtro sobre todo el histórico
+        df = app.df_global_completo
+        s2, e2 = str(df['FECHA_DATETIME'].iloc[0].date()), str(df['FECHA_DATETIME'].iloc[-1].date())
+        return app.agregado_comparativo_cliente(app.totales_tiendas(u, m, s, e), app.totales_tiendas(u, m, s2, e2))
+
+    def yoy(u, m, s, e):
+        # Lo que envía el servidor para los gráficos YoY; la métrica la calcula el navegador
+        df_filtrado = app.filtrar_cubo(u, m, s, e)
+        if df_filtrado.empty:
+            return app.agregado_yoy_cliente(None)
+        df_agg, grouping_col, title_entity, num_months = app.agregar_entidad_anio(df_filtrado, m)
+        return app.agregado_yoy_cliente({'yoy': df_agg, 'grouping_col': grouping_col, 'title_entity': title_entity, 'num_months': num_months})
+
+    return {
+        'filter_dataframe': lambda u, m, s, e: app.filter_dataframe(app.df_global_completo, u, m, s, e),
+        'update_kpis': kpis,
+        'update_map_chart': app.update_map_chart,
+        'agregado_yoy_cliente': yoy,
+        'agregado_comparativo_cliente': comparativo,
+        'update_exploratory_chart': lambda u, m, s, e: app.update_exploratory_chart(u, m, s, e, 'Ventas_por_MT2', 'Tickets_por_MT2'),
+    }
+
+
+def agregaciones_a_medir():
+    """Nombre -> (cubo, claves, agregaciones) de las agregaciones de cada vista, sobre todo el histórico."""
+    datos = app.datos_actuales
+    medidas = {col: (col, 'sum') for col in ['VENTAS', 'UNIDADES', 'TICKETS']}
+    atributos = dict(Metros_Cuadrados=('Metros_Cuadrados', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum'))
+    por_tienda = datos.totales_por_tienda(None, None, datos.cubo_diario['FECHA_DATETIME'].iloc[0], datos.cubo_diario['FECHA_DATETIME'].iloc[-1])
+    return {
+        'mapa_ciudad': (por_tienda, 'CIUDAD', dict(Total_Ventas=('VENTAS', 'sum'), Total_Unidades=('UNIDADES', 'sum'))),
+        'yoy_entidad_anio': (datos.cubo_mensual, ['MARCA', 'AÑO'], {**medidas, 'Metros_Cuadrados': ('Metros_Cuadrados', 'sum')}),
+        'comparativo_marca': (datos.cubo_diario, 'MARCA', {**medidas, **atributos}),
+        'segmentacion_ubicacion': (datos.cubo_diario, 'UBICACION', {**medidas, 'Metros_Cuadrados': ('Metros_Cuadrados', 'sum')}),
+        'exploratorio_marca': (datos.cubo_mensual, 'MARCA', {**medidas, **atributos}),
+    }
+
+
+def medir_agregaciones(repeticiones):
+    """p50 del núcleo de códigos contra groupby de pandas en cada agregación; antes verifica que den el mismo resultado."""
+    tiendas = app.datos_actuales.tiendas
+    resultados = {}
+    print(f"\n{'agregación':<30}{'filas':>12}{'núcleo ms':>12}{'pandas ms':>12}{'aceleración':>13}")
+    for nombre, (df, claves, agregaciones) in agregaciones_a_medir().items():
+        # Antes de medir: las dos rutas deben dar el mismo resultado (las sumas decimales, con tolerancia)
+        pd.testing.assert_frame_equal(agregar_cubo(df, claves, tiendas=tiendas, **agregaciones),
+                                      agregar_cubo_pandas(df, claves, tiendas=tiendas, **agregaciones),
+                                      check_dtype=False, check_categorical=False, rtol=1e-9, obj=nombre)
+        p50 = {}
+        for ruta, funcion in [('nucleo', agregar_cubo), ('pandas', agregar_cubo_pandas)]:
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion(df, claves, tiendas=tiendas, **agregaciones)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            p50[ruta] = round(float(np.percentile(tiempos, 50)), 3)
+        resultados[nombre] = {'filas': len(df), 'nucleo_p50_ms': p50['nucleo'], 'pandas_p50_ms': p50['pandas']}
+        print(f"{nombre:<30}{len(df):>12,}{p50['nucleo']:>12.1f}{p50['pandas']:>12.1f}{p50['pandas'] / max(p50['nucleo'], 1e-3):>12.1f}×")
+    return resultados
+
+
+def tamano_json(resultado):
+    if resultado is None or hasattr(resultado, 'columns'):
+        return 0  # filter_dataframe devuelve un DataFrame, no una figura
+    # Tamaño de lo que viaja al navegador (las figuras ya compactas), sin comprimir
+    if hasattr(resultado, 'to_dict'):
+        resultado = figuras_compactas.compactar_figura(resultado)
+    return len(json.dumps(resultado, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def medir(funcion, args, repeticiones):
+    """Latencias en frío (cache de filtros vacía), pico de memoria y tamaño del resultado."""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        app.cache_filtros.limpiar()
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Pico de memoria en una corrida aparte: tracemalloc distorsiona los tiempos
+    app.cache_filtros.limpiar()
+    tracemalloc.start()
+    funcion(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(float(np.percentile(tiempos, 50)), 3),
+        'p95_ms': round(float(np.percentile(tiempos, 95)), 3),
+        'pico_memoria_mb': round(pico / 1024 / 1024, 3),
+        'json_bytes': tamano_json(resultado),
+    }
+
+
+def ejecutar(filas_lista, repeticiones):
+    resultados = {'entorno': {'python': platform.python_version(), 'plataforma': platform.platform(), 'repeticiones': repeticiones}, 'tamanos': {}}
+    for filas in filas_lista:
+        inicio = time.perf_counter()
+        app.publicar_datos(VersionDatos(*app.preparar_datos(*generar_dataset(filas)), version=f'bench-{filas}'))
+        print(f"\n=== {filas:,} filas objetivo -> {len(app.df_global_completo):,} filas en el cubo diario "
+              f"(preparado en {time.perf_counter() - inicio:.1f}s) ===")
+        print(f"{'callback':<30}{'escenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'pico MB':>10}{'JSON KB':>10}")
+
+        por_callback = {}
+        escenarios = escenarios_filtros(app.df_global_completo, app.datos_actuales.tiendas)
+        for nombre, funcion in callbacks_a_medir().items():
+            por_callback[nombre] = {}
+            for escenario, args in escenarios.items():
+                r = medir(funcion, args, repeticiones)
+                por_callback[nombre][escenario] = r
+                print(f"{nombre:<30}{escenario:<16}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['pico_memoria_mb']:>10.1f}{r['json_bytes'] / 1024:>10.1f}")
+        resultados['tamanos'][str(filas)] = {'filas_cubo': len(app.df_global_completo), 'callbacks': por_callback,
+                                             'agregaciones': medir_agregaciones(repeticiones)}
+    return resultados
+
+
+def comparar(actual, ruta_base):
+    """Imprime la razón p50 actual/base y devuelve True si alguna supera el umbral de regresión."""
+    with open(ruta_base, encoding='utf-8') as f:
+        base = json.load(f)
+    hay_regresion = False
+    print(f"\n=== Comparación contra {ruta_base} (regresión si p50 > {UMBRAL_REGRESION:.2f}× la base) ===")
+    for filas, datos in actual['tamanos'].items():
+        datos_base = base['tamanos'].get(filas)
+        if not datos_base:
+            continue
+        for nombre, escenarios in datos['callbacks'].items():
+            for escenario, r in escenarios.items():
+                r_base = datos_base['callbacks'].get(nombre, {}).get(escenario)
+                if not r_base or r_base['p50_ms'] <= 0:
+                    continue
+                razon = r['p50_ms'] / r_base['p50_ms']
+                marca = ''
+                if razon > UMBRAL_REGRESION:
+                    marca, hay_regresion = '  <-- REGRESIÓN', True
+                print(f"{filas:>10} {nombre:<30}{escenario:<16}{r_base['p50_ms']:>10.1f} -> {r['p50_ms']:>8.1f} ms ({razon:.2f}×){marca}")
+    return hay_regresion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=FILAS_POR_DEFECTO, help='Tamaños de dataset a generar')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Corridas por callback y escenario')
+    parser.add_argument('--salida', default=None, help='Ruta del JSON con los resultados (línea base)')
+    parser.add_argument('--comparar', default=None, help='JSON de una corrida anterior para detectar regresiones')
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.filas, args.repeticiones)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    if args.comparar and comparar(resultados, args.comparar):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import plotly.io as pio
+
+
+# --- CACHE DE FIGURAS EN DISCO, COMPARTIDA ENTRE WORKERS ---
+# Guarda el JSON de cada figura ya construida en un SQLite local: todos los workers de gunicorn
+# (y los reinicios) reutilizan lo que cualquiera haya calculado. Acotada por bytes con expulsión
+# LRU; las figuras de una versión de datos anterior se borran al ver la primera de la nueva.
+
+class CacheFiguras:
+    """Cache LRU en disco de figuras serializadas, acotada por bytes y particionada por versión de datos."""
+
+    def __init__(self, ruta, max_bytes=256 * 1024 * 1024):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conexion = None
+        self._pid = None
+        self._version_vista = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def _conectar(self):
+        # Una conexión por proceso: los workers se crean con fork y no deben heredarla
+        if self._conexion is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=10, check_same_thread=False, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute('CREATE TABLE IF NOT EXISTS figuras (clave TEXT PRIMARY KEY, version TEXT NOT NULL, '
+                             'datos BLOB NOT NULL, bytes INTEGER NOT NULL, ultimo_uso REAL NOT NULL)')
+            conexion.execute('CREATE INDEX IF NOT EXISTS figuras_uso ON figuras (ultimo_uso)')
+            self._conexion, self._pid = conexion, os.getpid()
+        return self._conexion
+
+    def obtener(self, clave):
+        """Figura (como dict) guardada para `clave`, o None."""
+        with self._lock:
+            conexion = self._conectar()
+            fila = conexion.execute('SELECT datos FROM figuras WHERE clave = ?', (clave,)).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            conexion.execute('UPDATE figuras SET ultimo_uso = ? WHERE clave = ?', (time.time(), clave))
+            self.aciertos += 1
+        return json.loads(zlib.decompress(fila[0]))
+
+    def guardar(self, clave, version, figura):
+        datos = zlib.compress(pio.to_json(figura, validate=False).encode('utf-8'), 1)
+        if len(datos) > self.max_bytes:
+            return  # No cabe ni sola: no se cachea
+        with self._lock:
+            conexion = self._conectar()
+            with conexion:
+                if version != self._version_vista:
+                    # Primera figura de una versión nueva: las de otras versiones ya no sirven
+                    conexion.execute('DELETE FROM figuras WHERE version != ?', (version,))
+                    self._version_vista = version
+                conexion.execute('INSERT OR REPLACE INTO figuras VALUES (?, ?, ?, ?, ?)', (clave, version, datos, len(datos), time.time()))
+                total = conexion.execute('SELECT COALESCE(SUM(bytes), 0) FROM figuras').fetchone()[0]
+                while total > self.max_bytes:
+                    fila = conexion.execute('SELECT clave, bytes FROM figuras ORDER BY ultimo_uso LIMIT 1').fetchone()
+                    conexion.execute('DELETE FROM figuras WHERE clave = ?', (fila[0],))
+                    total -= fila[1]
+                    self.expulsiones += 1
+
+    def obtener_o_calcular(self, clave, version, funcion):
+        """Devuelve la figura de `clave` desde el disco o la construye con `funcion` y la guarda.
+
+        Si el disco falla, la figura se construye igual: la cache nunca rompe un callback.
+        """
+        try:
+            figura = self.obtener(clave)
+            if figura is not None:
+                return figura
+        except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+            print(f"ADVERTENCIA: Cache de figuras no disponible: {e}")
+            return funcion()
+
+        figura = funcion()
+        if not (hasattr(figura, 'to_plotly_json') or isinstance(figura, dict)):
+            return figura  # p. ej. dash.no_update: no es una figura
+        try:
+            self.guardar(clave, version, figura)
+        except (sqlite3.Error, OSError, ValueError, TypeError) as e:
+            print(f"ADVERTENCIA: No se pudo guardar la figura en cache: {e}")
+        return figura
+
+    def limpiar(self):
+        with self._lock:
+            self._conectar().execute('DELETE FROM figuras')
+
+    def estadisticas(self):
+        with self._lock:
+            entradas, total = self._conectar().execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM figuras').fetchone()
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': entradas, 'bytes': total,
+                'aciertos': self.aciertos, 'fallos': self.fallos, 'expulsiones': self.expulsiones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
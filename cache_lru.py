@@ -0,0 +1,93 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# --- CACHE LRU ACOTADO EN MEMORIA ---
+# Compartido por los callbacks de un mismo proceso. Expulsa por número de entradas y por
+# bytes estimados, y agrupa las peticiones concurrentes de una misma clave en un solo cálculo.
+
+def estimar_bytes(valor):
+    """Tamaño aproximado en memoria de un resultado cacheado."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(estimar_bytes(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """Cache LRU con límite de entradas y de bytes, y contadores de aciertos/fallos."""
+
+    def __init__(self, max_entradas=64, max_bytes=256 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()  # clave -> (valor, bytes)
+        self._bytes = 0
+        self._en_curso = {}  # clave -> threading.Event de un cálculo en progreso
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener_o_calcular(self, clave, funcion):
+        """Devuelve el valor de `clave`; si no está, lo calcula una sola vez aunque lo pidan varios hilos."""
+        while True:
+            with self._lock:
+                if clave in self._datos:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return self._datos[clave][0]
+                evento = self._en_curso.get(clave)
+                if evento is None:
+                    self.fallos += 1
+                    evento = self._en_curso[clave] = threading.Event()
+                    break
+            # Otro hilo ya lo está calculando: esperar y volver a mirar
+            evento.wait()
+
+        try:
+            valor = funcion()
+            self.guardar(clave, valor)
+            return valor
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            evento.set()
+
+    def guardar(self, clave, valor):
+        tamano = estimar_bytes(valor)
+        with self._lock:
+            if clave in self._datos:
+                self._bytes -= self._datos.pop(clave)[1]
+            if tamano > self.max_bytes:
+                return  # No cabe ni solo: no se cachea
+            self._datos[clave] = (valor, tamano)
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamano_expulsado) = self._datos.popitem(last=False)
+                self._bytes -= tamano_expulsado
+                self.expulsiones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos), 'bytes': self._bytes,
+                'aciertos': self.aciertos, 'fallos': self.fallos, 'expulsiones': self.expulsiones,
+                'tasa_aciertos': (self.aciertos / total) if total else 0.0,
+            }
@@ -0,0 +1,397 @@
+import glob
+import hashlib
+import itertools
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from almacen_columnar import VERSION_FORMATO, bloqueo, huella_archivos, existe_version, cargar_tablas, guardar_tablas
+from cubo_ventas import MEDIDAS, asignar_tiendas, construir_cubo_diario, construir_cubo_mensual
+from datos_sinteticos import generar_datos_sinteticos
+from memoria_datos import compactar_tipos, verificar_presupuesto
+from version_datos import VersionDatos
+
+
+# --- CARGA Y PREPARACIÓN DE DATOS ---
+# Lectura de los Excel (o de los datos de ejemplo), limpieza y cubos. No depende de Dash: con
+# gunicorn, el primer worker que carga prepara el almacén compartido y los demás lo abren.
+
+# Ventas: un archivo, una carpeta (todos sus .xlsx/.csv) o un patrón glob como 'ventas/2024-*.xlsx'
+RUTA_VENTAS = os.environ.get('DASHBOARD_VENTAS', 'VENTAS_ALL_BRANDS.xlsx')
+RUTA_ARRENDAMIENTOS = 'ARRENDAMIENTOS.xlsx'
+# Cache columnar de los datos ya limpios, indexada por la huella de los Excel de origen
+DIR_CACHE_DATOS = os.environ.get('DASHBOARD_CACHE_DIR', '.cache_datos')
+# Cache por archivo de ventas ya limpio: al arrancar solo se leen los archivos nuevos o modificados
+DIR_CACHE_ARCHIVOS = os.environ.get('DASHBOARD_CACHE_ARCHIVOS_DIR', '.cache_archivos')
+# Procesos que leen archivos de ventas en paralelo (por defecto, uno por núcleo)
+PROCESOS_INGESTA = int(os.environ.get('DASHBOARD_PROCESOS_INGESTA', os.cpu_count() or 1))
+# Modo servidor (gunicorn.conf.py): cada worker abre el almacén mapeado en memoria y de solo lectura
+DATOS_COMPARTIDOS = os.environ.get('DASHBOARD_DATOS_COMPARTIDOS') == '1'
+HUELLA_DEMO = f"demo-v{VERSION_FORMATO}"
+# Tope de memoria de los cubos en MB (0 = sin límite): si se supera, el arranque falla con MemoryError
+PRESUPUESTO_MEMORIA_MB = float(os.environ.get('DASHBOARD_PRESUPUESTO_MB', 0))
+# Filas del Excel de ventas que se leen y limpian por bloque en la ingesta
+FILAS_POR_BLOQUE = int(os.environ.get('DASHBOARD_FILAS_POR_BLOQUE', 100_000))
+# Formatos de fecha en texto que se prueban (día primero, como dayfirst=True)
+FORMATOS_FECHA = ['%d/%m/%Y', '%d-%m-%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%y',
+                  '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d', '%d.%m.%Y']
+
+
+def limpiar_texto(serie, mayusculas=False):
+    """`astype(str).str.strip()` (y `.str.upper()`) hecho una vez por valor distinto; devuelve una categoría.
+
+    Los faltantes (NaN, None, celdas vacías) siguen faltantes, como con `astype(str)` de pandas 3
+    (pandas 2 los convertía en el texto 'nan'): `limpiar_ventas` descarta esas filas por incompletas.
+    """
+    codigos, valores = pd.factorize(serie)
+    limpios = pd.Series(valores).astype(str).str.strip()
+    if mayusculas:
+        limpios = limpios.str.upper()
+    categorias = pd.Index(np.sort(limpios.dropna().unique()))
+    # El código -1 (faltante) cae en la última posición agregada, que también es -1
+    mapa = np.append(categorias.get_indexer(limpios), -1)
+    return pd.Categorical.from_codes(mapa[codigos], categorias)
+
+
+def detectar_formato_fecha(valores, muestra=1000):
+    """Primer formato de FORMATOS_FECHA que lee todas las fechas en texto de la muestra; None si no hay texto o ninguno sirve."""
+    textos = [valor.strip() for valor in itertools.islice(valores, 20 * muestra) if isinstance(valor, str) and valor.strip()][:muestra]
+    if not textos:
+        return None
+    for formato in FORMATOS_FECHA:
+        if pd.to_datetime(pd.Series(textos), format=formato, errors='coerce').notna().all():
+            return formato
+    return None
+
+
+def convertir_fechas(valores, formato=None):
+    """Fechas (objetos datetime o texto) a datetime64; con `formato` usa el parser rápido, si no infiere con dayfirst."""
+    if formato:
+        return pd.to_datetime(valores, format=formato, errors='coerce')
+    return pd.to_datetime(valores, dayfirst=True, errors='coerce')
+
+
+def limpiar_ventas(df_ventas_full):
+    """Normaliza columnas y tipos de un archivo de ventas (el completo o un delta)."""
+    df_ventas = df_ventas_full.copy()
+    df_ventas.columns = [str(col).strip().upper() for col in df_ventas.columns]
+    df_ventas.rename(columns={'VENTA': 'VENTAS', 'UNIDADES': 'UNIDADES', 'TICKETS': 'TICKETS'}, inplace=True, errors='ignore')
+    if 'FECHA' in df_ventas.columns: df_ventas.rename(columns={'FECHA': 'FECHA_DATETIME'}, inplace=True)
+    
+    # ... 
+   
+    
+    df_ventas['MARCA'] = limpiar_texto(df_ventas['MARCA'])
+    df_ventas['UBICACION'] = limpiar_texto(df_ventas['UBICACION'])
+    df_ventas['CIUDAD'] = limpiar_texto(df_ventas['CIUDAD'], mayusculas=True)
+    for col in ['VENTAS', 'UNIDADES', 'TICKETS']: df_ventas[col] = pd.to_numeric(df_ventas[col], errors='coerce')
+    df_ventas.dropna(subset=['VENTAS', 'UNIDADES', 'TICKETS', 'FECHA_DATETIME', 'MARCA', 'UBICACION', 'CIUDAD'], inplace=True)
+    fechas = df_ventas['FECHA_DATETIME']
+    df_ventas['FECHA_DATETIME'] = convertir_fechas(fechas, None if pd.api.types.is_datetime64_any_dtype(fechas) else detectar_formato_fecha(fechas))
+    df_ventas.dropna(subset=['FECHA_DATETIME'], inplace=True)
+    df_ventas['AÑO'] = df_ventas['FECHA_DATETIME'].dt.year
+    return df_ventas
+
+
+def limpiar_arrendamientos(df_arrendamientos_full):
+    """Normaliza el archivo de arrendamientos: una fila por UBICACION × MARCA con Mt2 y Canon."""
+    df_arrendamientos = df_arrendamientos_full.copy()
+    df_arrendamientos.columns = [str(col).strip().lower().replace(" ", "_") for col in df_arrendamientos.columns]
+    arrend_rename_map = {'canon_fijo': 'Canon_Fijo', 'mt2': 'Metros_Cuadrados', 'marca': 'MARCA', 'ubicacion': 'UBICACION'}
+    df_arrendamientos.rename(columns=arrend_rename_map, inplace=True)
+    df_arrendamientos['MARCA'] = df_arrendamientos['MARCA'].astype(str).str.strip().str.upper()
+    df_arrendamientos['UBICACION'] = df_arrendamientos['UBICACION'].astype(str).str.strip().str.upper()
+    if 'Metros_Cuadrados' in df_arrendamientos.columns: df_arrendamientos['Metros_Cuadrados'] = pd.to_numeric(df_arrendamientos['Metros_Cuadrados'], errors='coerce')
+    if 'Canon_Fijo' in df_arrendamientos.columns: df_arrendamientos['Canon_Fijo'] = pd.to_numeric(df_arrendamientos['Canon_Fijo'], errors='coerce')
+    df_arrendamientos.dropna(subset=['UBICACION', 'MARCA', 'Metros_Cuadrados', 'Canon_Fijo'], inplace=True)
+    return df_arrendamientos.drop_duplicates(subset=['UBICACION', 'MARCA'], keep='first')
+
+
+# --- INGESTA DEL EXCEL DE VENTAS POR BLOQUES ---
+# openpyxl en modo solo lectura entrega las filas de a una; cada bloque se limpia y se agrega a
+# las columnas finales (texto como códigos enteros, medidas numéricas, fechas datetime64), así
+# nunca conviven el libro completo, su copia y el resultado como con `pd.read_excel`.
+
+COLUMNAS_VENTAS = ['UBICACION', 'MARCA', 'CIUDAD', 'FECHA_DATETIME', 'VENTAS', 'UNIDADES', 'TICKETS']
+_TEXTO_VENTAS = {'UBICACION': False, 'MARCA': False, 'CIUDAD': True}  # columna -> a mayúsculas
+
+
+def leer_ventas_por_bloques(ruta, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Lee y limpia el Excel de ventas por bloques; mismo resultado que `limpiar_ventas(pd.read_excel(ruta).drop_duplicates())`.
+
+    El formato de las fechas en texto se detecta una sola vez, en el primer bloque que las trae.
+    Informa las filas por segundo de la lectura.
+    """
+    inicio = time.perf_counter()
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = [str(col).strip().upper() for col in next(filas, ())]
+        encabezado = [{'VENTA': 'VENTAS', 'FECHA': 'FECHA_DATETIME'}.get(col, col) for col in encabezado]
+        faltantes = [col for col in COLUMNAS_VENTAS if col not in encabezado]
+        if faltantes:
+            raise KeyError(f"{ruta} no tiene las columnas {faltantes}")
+        posiciones = [encabezado.index(col) for col in COLUMNAS_VENTAS]
+        ancho = max(posiciones) + 1
+
+        # Texto: código de cada valor crudo distinto (se limpia una vez por valor, al final)
+        crudos = {col: {} for col in _TEXTO_VENTAS}
+        partes = {col: [] for col in COLUMNAS_VENTAS}
+        formato, formato_detectado, leidas = None, False, 0
+        for n_bloque in itertools.count(1):
+            bloque = [fila[:ancho] if len(fila) >= ancho else fila + (None,) * (ancho - len(fila))
+                      for fila in itertools.islice(filas, filas_por_bloque)]
+            if not bloque:
+                break
+            leidas += len(bloque)
+            columnas = list(zip(*bloque))
+            for col, pos in zip(COLUMNAS_VENTAS, posiciones):
+                valores = np.array(columnas[pos], dtype=object)
+                if col in _TEXTO_VENTAS:
+                    codigos, unicos = pd.factorize(valores)
+                    mapa = np.array([crudos[col].setdefault(valor, len(crudos[col])) for valor in unicos] + [-1], dtype=np.int32)
+                    partes[col].append(mapa[codigos])
+                elif col == 'FECHA_DATETIME':
+                    if not formato_detectado:
+                        formato = detectar_formato_fecha(valores)
+                        formato_detectado = formato is not None or any(isinstance(valor, str) for valor in valores)
+                    partes[col].append(convertir_fechas(valores, formato).to_numpy())
+                else:
+                    partes[col].append(pd.to_numeric(valores, errors='coerce'))
+            del bloque, columnas
+            if n_bloque % 10 == 0:
+                print(f"  ... {leidas:,} filas leídas ({leidas / (time.perf_counter() - inicio):,.0f} filas/s)")
+    finally:
+        libro.close()
+
+    # Duplicados exactos fuera (como el drop_duplicates de la carga completa) y filas incompletas
+    df_ventas = pd.DataFrame({col: np.concatenate(partes[col]) if partes[col] else np.array([]) for col in COLUMNAS_VENTAS}, copy=False)
+    del partes
+    df_ventas = df_ventas.drop_duplicates()
+    completas = df_ventas[list(_TEXTO_VENTAS)].ge(0).all(axis=1) & df_ventas[['VENTAS', 'UNIDADES', 'TICKETS', 'FECHA_DATETIME']].notna().all(axis=1)
+    df_ventas = df_ventas[completas].reset_index(drop=True)
+    for col, mayusculas in _TEXTO_VENTAS.items():
+        limpios = limpiar_texto(pd.Series(list(crudos[col]), dtype=object), mayusculas=mayusculas)
+        df_ventas[col] = pd.Categorical.from_codes(np.append(limpios.codes, -1)[df_ventas[col].to_numpy()], limpios.categories)
+    df_ventas['AÑO'] = df_ventas['FECHA_DATETIME'].dt.year
+
+    segundos = time.perf_counter() - inicio
+    print(f"Ingesta de {ruta}: {leidas:,} filas en {segundos:,.1f} s ({leidas / max(segundos, 1e-9):,.0f} filas/s), "
+          f"{len(df_ventas):,} válidas (fechas: {formato or 'objetos fecha / inferidas'}).")
+    return df_ventas
+
+
+def preparar_datos(df_ventas_full, df_arrendamientos_full):
+    """Limpia ventas y arrendamientos; devuelve (cubo_diario, cubo_mensual, tiendas) en esquema estrella."""
+    return preparar_ventas_limpias(limpiar_ventas(df_ventas_full), df_arrendamientos_full)
+
+
+def preparar_ventas_limpias(df_ventas, df_arrendamientos_full):
+    """Como `preparar_datos`, con las ventas ya limpias (`limpiar_ventas` o `leer_ventas_por_bloques`)."""
+    # --- Procesamiento de datos 
+    df_arrendamientos_unicos = limpiar_arrendamientos(df_arrendamientos_full)
+
+    # Dimensión de tiendas (UBICACION × MARCA × CIUDAD con Mt2 y Canon): los hechos solo guardan su TIENDA_ID
+    ids_tiendas, tiendas = asignar_tiendas(df_ventas, df_arrendamientos=df_arrendamientos_unicos)
+    df_hechos = df_ventas[['FECHA_DATETIME'] + MEDIDAS + ['AÑO']].assign(TIENDA_ID=ids_tiendas)
+
+    # Cubo diario (tienda × día) y su enrollado mensual: los callbacks responden desde aquí.
+    # Medidas con el entero más chico que las conserva y texto como categoría (memoria_datos.py)
+    cubo_diario = compactar_tipos(construir_cubo_diario(df_hechos))
+    cubo_mensual = compactar_tipos(construir_cubo_mensual(cubo_diario))
+    tiendas = compactar_tipos(tiendas)
+    print(f"Cubo de ventas: {len(df_hechos):,} filas originales -> {len(cubo_diario):,} diarias / {len(cubo_mensual):,} mensuales, {len(tiendas):,} tiendas.")
+    return cubo_diario, cubo_mensual, tiendas
+
+
+# --- VENTAS EN VARIOS ARCHIVOS ---
+# Cada marca o mes puede venir en su propio archivo: se leen en paralelo (un proceso por archivo),
+# cada uno se guarda limpio en su cache y se concatenan. Al arrancar de nuevo solo se vuelven a
+# leer los archivos cuya huella cambió.
+
+EXTENSIONES_VENTAS = ('.xlsx', '.xlsm', '.csv')
+
+
+def archivos_ventas(origen=RUTA_VENTAS):
+    """Archivos de ventas de `origen` (archivo, carpeta o patrón glob), ordenados por nombre."""
+    if os.path.isdir(origen):
+        rutas = [os.path.join(origen, nombre) for nombre in os.listdir(origen)]
+    elif glob.has_magic(origen):
+        rutas = glob.glob(origen)
+    else:
+        rutas = [origen]
+    # Sin los archivos de bloqueo que deja Excel abierto (~$...)
+    return sorted(ruta for ruta in rutas if os.path.isfile(ruta) and ruta.lower().endswith(EXTENSIONES_VENTAS)
+                  and not os.path.basename(ruta).startswith('~$'))
+
+
+def huella_fuentes(origen=RUTA_VENTAS):
+    """Huella de los archivos de ventas de `origen` y de arrendamientos; None si falta alguno."""
+    rutas = archivos_ventas(origen)
+    return huella_archivos(rutas + [RUTA_ARRENDAMIENTOS]) if rutas else None
+
+
+def _estado_fuentes(origen=RUTA_VENTAS):
+    # (ruta, tamaño, mtime) de las fuentes: detecta un cambio sin volver a leer los archivos
+    estados = []
+    for ruta in archivos_ventas(origen) + [RUTA_ARRENDAMIENTOS]:
+        if os.path.isfile(ruta):
+            estado = os.stat(ruta)
+            estados.append((ruta, estado.st_size, estado.st_mtime_ns))
+    return estados
+
+
+def leer_archivo_ventas(ruta):
+    """Ventas limpias de un archivo: los Excel por bloques, los CSV de una vez."""
+    if ruta.lower().endswith('.csv'):
+        return limpiar_ventas(pd.read_csv(ruta).drop_duplicates())
+    return leer_ventas_por_bloques(ruta)
+
+
+def _carpeta_cache_archivo(ruta):
+    # Una carpeta por archivo (su nombre + hash de la ruta): guardar una versión nueva borra solo la vieja de ese archivo
+    return os.path.join(DIR_CACHE_ARCHIVOS, f"{os.path.basename(ruta)}-{hashlib.sha256(os.path.abspath(ruta).encode()).hexdigest()[:12]}")
+
+
+def _leer_y_cachear(ruta, huella=None):
+    # Se ejecuta en los procesos del pool: lee, guarda la cache del archivo (si tiene huella) y devuelve las ventas
+    df_ventas = leer_archivo_ventas(ruta)
+    if huella is not None:
+        try:
+            guardar_tablas(_carpeta_cache_archivo(ruta), huella, {'ventas': df_ventas})
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo escribir la cache de {ruta}: {e}")
+    return df_ventas
+
+
+def concatenar_ventas(partes):
+    """Une las ventas limpias de varios archivos (categorías unificadas) y quita duplicados entre archivos."""
+    if len(partes) == 1:
+        return partes[0]
+    texto = [col for col in partes[0].columns if isinstance(partes[0][col].dtype, pd.CategoricalDtype)]
+    unidas = {col: pd.api.types.union_categoricals([df[col].array for df in partes], sort_categories=True) for col in texto}
+    df_ventas = pd.concat([df.drop(columns=texto) for df in partes], ignore_index=True)
+    df_ventas = df_ventas.assign(**unidas)[partes[0].columns]
+    return df_ventas.drop_duplicates(ignore_index=True)
+
+
+def leer_ventas(origen=RUTA_VENTAS):
+    """Ventas limpias de todos los archivos de `origen`; los que no cambiaron salen de su cache."""
+    rutas = archivos_ventas(origen)
+    if not rutas:
+        raise FileNotFoundError(f"No hay archivos de ventas en {origen}")
+    inicio = time.perf_counter()
+    # Con un solo archivo la cache de la versión completa ya cubre el caso sin cambios
+    por_archivo = len(rutas) > 1
+    partes, pendientes = {}, {}
+    for ruta in rutas:
+        huella = huella_archivos([ruta]) if por_archivo else None
+        tablas = cargar_tablas(_carpeta_cache_archivo(ruta), huella) if huella else None
+        if tablas is not None:
+            partes[ruta] = tablas['ventas']
+        else:
+            pendientes[ruta] = huella
+
+    if len(pendientes) > 1 and PROCESOS_INGESTA > 1:
+        with ProcessPoolExecutor(max_workers=min(PROCESOS_INGESTA, len(pendientes))) as pool:
+            partes.update(zip(pendientes, pool.map(_leer_y_cachear, pendientes, pendientes.values())))
+    else:
+        partes.update((ruta, _leer_y_cachear(ruta, huella)) for ruta, huella in pendientes.items())
+
+    # Caches de archivos que ya no están en el origen
+    if por_archivo and os.path.isdir(DIR_CACHE_ARCHIVOS):
+        vigentes = {os.path.basename(_carpeta_cache_archivo(ruta)) for ruta in rutas}
+        for entrada in set(os.listdir(DIR_CACHE_ARCHIVOS)) - vigentes:
+            shutil.rmtree(os.path.join(DIR_CACHE_ARCHIVOS, entrada), ignore_errors=True)
+
+    df_ventas = concatenar_ventas([partes[ruta] for ruta in rutas])
+    print(f"Ventas de {len(rutas)} archivo(s) ({len(pendientes)} leídos, {len(rutas) - len(pendientes)} desde su cache) "
+          f"en {time.perf_counter() - inicio:,.1f} s: {len(df_ventas):,} filas.")
+    return df_ventas
+
+
+def leer_fuentes(origen=RUTA_VENTAS):
+    """Devuelve (df_ventas limpio, df_arrendamientos_full) de los archivos reales o, si no existen, de ejemplo."""
+    try:
+        # Intenta cargar los archivos reales: las ventas por archivo (en paralelo), los arrendamientos (chicos) de una vez
+        df_arrendamientos_full = pd.read_excel(RUTA_ARRENDAMIENTOS)
+        df_ventas = leer_ventas(origen)
+        print("✅ Archivos de datos reales cargados correctamente.")
+        
+        # Eliminar duplicados de los archivos reales (los de ventas ya salen sin duplicados)
+        df_arrendamientos_full.drop_duplicates(inplace=True)
+
+    except FileNotFoundError:
+        # Si los archivos no se encuentran, genera datos de ejemplo avanzados
+        print("ADVERTENCIA: Archivos Excel no encontrados. Generando datos de ejemplo para demostración pública.")
+        
+        df_ventas_full, df_arrendamientos_full = generar_datos_sinteticos(seed=42) # Para que los datos aleatorios sean siempre los mismos
+        df_ventas = limpiar_ventas(df_ventas_full)
+    return df_ventas, df_arrendamientos_full
+
+
+def construir_almacen(origen=RUTA_VENTAS):
+    """Deja en el almacén columnar los cubos e índices de los datos fuente (si faltan) y devuelve su huella.
+
+    Un solo proceso a la vez prepara una versión: los que llegan mientras tanto esperan el bloqueo y
+    encuentran la versión ya guardada.
+    """
+    huella = huella_fuentes(origen) or HUELLA_DEMO
+    if not existe_version(DIR_CACHE_DATOS, huella):
+        with bloqueo(DIR_CACHE_DATOS):
+            if not existe_version(DIR_CACHE_DATOS, huella):
+                guardar_tablas(DIR_CACHE_DATOS, huella, VersionDatos(*preparar_ventas_limpias(*leer_fuentes(origen)), version=huella).tablas())
+    return huella
+
+
+def cargar_y_preparar_datos(origen=RUTA_VENTAS):
+    """Versión de los datos lista para servir; informa su memoria por columna y respeta el presupuesto.
+
+    `origen` es el archivo de ventas, una carpeta con varios o un patrón glob.
+    """
+    datos = _cargar_version(origen)
+    tablas = {'diario': datos.cubo_diario, 'mensual': datos.cubo_mensual, 'tiendas': datos.tiendas}
+    if datos.indice_rangos is not None:
+        tablas['rangos'] = datos.indice_rangos.tabla()
+    verificar_presupuesto(tablas, PRESUPUESTO_MEMORIA_MB)
+    return datos
+
+
+def _cargar_version(origen):
+    if DATOS_COMPARTIDOS:
+        # El primer worker prepara el almacén y los demás lo abren. DASHBOARD_HUELLA_DATOS (la huella
+        # de un almacén preparado de antemano) solo ahorra recalcular la huella de los archivos
+        huella = os.environ.get('DASHBOARD_HUELLA_DATOS')
+        if not huella or not existe_version(DIR_CACHE_DATOS, huella):
+            huella = construir_almacen(origen)
+        tablas = cargar_tablas(DIR_CACHE_DATOS, huella, mmap_mode='r')
+        if tablas is not None:
+            print(f"✅ Datos compartidos abiertos desde el almacén columnar ({huella}).")
+            return VersionDatos.desde_tablas(tablas, version=huella)
+        print("ADVERTENCIA: No se pudo abrir el almacén columnar compartido; se cargan los datos en este proceso.")
+        # Con la huella que ya se calculó: no se vuelven a leer los archivos para recalcularla
+        return VersionDatos(*preparar_ventas_limpias(*leer_fuentes(origen)), version=huella)
+
+    estado = _estado_fuentes(origen)
+    huella = huella_fuentes(origen)
+    if huella is not None:
+        tablas = cargar_tablas(DIR_CACHE_DATOS, huella)
+        if tablas is not None:
+            print(f"✅ Datos cargados desde la cache columnar ({huella}).")
+            return VersionDatos.desde_tablas(tablas, version=huella)
+
+    datos = VersionDatos(*preparar_ventas_limpias(*leer_fuentes(origen)), version=huella or 'demo')
+
+    # Solo se cachean los datos reales (los de ejemplo se generan en el momento) y solo si los
+    # archivos no cambiaron mientras se leían
+    if huella is not None and _estado_fuentes(origen) == estado:
+        try:
+            guardar_tablas(DIR_CACHE_DATOS, huella, datos.tablas())
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo escribir la cache columnar de datos: {e}")
+    return datos
@@ -0,0 +1,51 @@
+import gzip
+import importlib.util
+import os
+
+
+# --- COMPRESIÓN DE LAS RESPUESTAS ---
+# Las respuestas JSON de Dash (callbacks, layout, dependencias) y la página inicial se comprimen
+# antes de salir: brotli si el navegador lo acepta y el paquete está instalado (`pip install
+# brotli`), si no gzip de la biblioteca estándar. Las descargas en bloques (exportación) no se
+# tocan: se comprimirían enteras en memoria antes de enviar el primer byte.
+
+ACTIVA = os.environ.get('DASHBOARD_COMPRIMIR', '1') == '1'
+# Por debajo de este tamaño los encabezados de la compresión no compensan
+MIN_BYTES = 500
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+TIPOS = ('application/json', 'text/html')
+# brotli es opcional: comprime más que gzip a igual costo
+BROTLI_DISPONIBLE = importlib.util.find_spec('brotli') is not None
+
+
+def elegir_codificacion(aceptadas):
+    """'br', 'gzip' o None según el Accept-Encoding del navegador (un `Accept` de werkzeug)."""
+    if BROTLI_DISPONIBLE and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        import brotli
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def comprimir_respuesta(respuesta, aceptadas):
+    """Comprime en el lugar una respuesta de Flask si corresponde; devuelve los bytes que se envían."""
+    if (not ACTIVA or respuesta.mimetype not in TIPOS or respuesta.status_code != 200
+            or respuesta.direct_passthrough or respuesta.is_streamed or 'Content-Encoding' in respuesta.headers):
+        return respuesta.content_length
+    respuesta.vary.add('Accept-Encoding')
+    datos = respuesta.get_data()
+    codificacion = elegir_codificacion(aceptadas)
+    if codificacion is None or len(datos) < MIN_BYTES:
+        return len(datos)
+    comprimidos = comprimir(datos, codificacion)
+    respuesta.set_data(comprimidos)
+    respuesta.headers['Content-Encoding'] = codificacion
+    return len(comprimidos)
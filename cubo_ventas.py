@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+from agregacion import FUNCIONES, agregar
+
+
+# --- ESQUEMA ESTRELLA: DIMENSIÓN DE TIENDAS Y CUBOS DE HECHOS ---
+# Dimensión: una fila por UBICACION × MARCA × CIUDAD con sus atributos fijos (Mt2, Canon); su
+# TIENDA_ID es la posición de la fila y las tiendas nuevas siempre se agregan al final.
+# Grano diario: una fila por TIENDA_ID × día con VENTAS/UNIDADES/TICKETS sumados.
+# Grano mensual: el mismo cubo enrollado por mes, con DIAS = número de filas diarias agregadas.
+
+CLAVES_TIENDA = ['UBICACION', 'MARCA', 'CIUDAD']
+MEDIDAS = ['VENTAS', 'UNIDADES', 'TICKETS']
+# Atributos fijos de la tienda: sumarlos "por fila diaria" equivale a ponderarlos por días con venta
+ATRIBUTOS_TIENDA = ['Metros_Cuadrados', 'Canon_Fijo']
+
+
+def _ids_tiendas(claves, tiendas):
+    # TIENDA_ID de cada combinación de `claves` (-1 si no está en la dimensión)
+    indice = pd.MultiIndex.from_frame(tiendas[CLAVES_TIENDA].astype(object))
+    return indice.get_indexer(pd.MultiIndex.from_frame(claves.astype(object)))
+
+
+def asignar_tiendas(df_ventas, tiendas=None, df_arrendamientos=None):
+    """Devuelve (TIENDA_ID de cada fila de `df_ventas`, dimensión de tiendas ampliada).
+
+    Las combinaciones UBICACION × MARCA × CIUDAD que no están en `tiendas` se agregan al final con
+    ids nuevos; su Mt2 y Canon salen de `df_arrendamientos` o, si no se pasa, de otra tienda de la
+    dimensión con la misma UBICACION y MARCA.
+    """
+    claves = df_ventas[CLAVES_TIENDA]
+    ids = _ids_tiendas(claves, tiendas) if tiendas is not None else np.full(len(claves), -1)
+    if not (ids < 0).any():
+        return ids, tiendas
+
+    nuevas = claves[ids < 0].astype(object).drop_duplicates().sort_values(CLAVES_TIENDA, kind='mergesort')
+    if df_arrendamientos is not None:
+        fuente = df_arrendamientos[['UBICACION', 'MARCA'] + ATRIBUTOS_TIENDA]
+    else:
+        fuente = tiendas[['UBICACION', 'MARCA'] + ATRIBUTOS_TIENDA].drop_duplicates(subset=['UBICACION', 'MARCA'])
+    nuevas = nuevas.merge(fuente.astype({'UBICACION': object, 'MARCA': object}), on=['UBICACION', 'MARCA'], how='left')
+    inicio = 0 if tiendas is None else len(tiendas)
+    nuevas.insert(0, 'TIENDA_ID', np.arange(inicio, inicio + len(nuevas)))
+
+    # La dimensión es chica: se rearma completa, con categorías ordenadas
+    partes = [nuevas] if tiendas is None else [tiendas.astype({col: object for col in CLAVES_TIENDA}), nuevas]
+    tiendas = pd.concat(partes, ignore_index=True)
+    tiendas = tiendas.astype({**{col: 'category' for col in CLAVES_TIENDA}, **{col: np.float64 for col in ATRIBUTOS_TIENDA}})
+    return _ids_tiendas(claves, tiendas), tiendas
+
+
+def construir_cubo_diario(df):
+    """Colapsa la tabla de hechos (con TIENDA_ID) a una fila por tienda-día."""
+    if df.empty:
+        return df
+    agregaciones = {col: (col, 'sum') for col in MEDIDAS}
+    if 'AÑO' in df.columns:
+        agregaciones['AÑO'] = ('AÑO', 'first')
+    cubo = df.groupby(['TIENDA_ID', 'FECHA_DATETIME'], as_index=False, sort=False).agg(**agregaciones)
+    return cubo.sort_values('FECHA_DATETIME', kind='mergesort').reset_index(drop=True)
+
+
+def construir_cubo_mensual(cubo_diario):
+    """Enrolla el cubo diario por mes; FECHA_DATETIME queda en el primer día del mes."""
+    if cubo_diario.empty:
+        return cubo_diario
+    mes = cubo_diario['FECHA_DATETIME'].dt.to_period('M').dt.to_timestamp()
+    agregaciones = {col: (col, 'sum') for col in MEDIDAS}
+    agregaciones['DIAS'] = ('VENTAS', 'size')
+    if 'AÑO' in cubo_diario.columns:
+        agregaciones['AÑO'] = ('AÑO', 'first')
+    cubo = cubo_diario.assign(FECHA_DATETIME=mes).groupby(['TIENDA_ID', 'FECHA_DATETIME'], as_index=False, sort=False).agg(**agregaciones)
+    return cubo.sort_values('FECHA_DATETIME', kind='mergesort').reset_index(drop=True)
+
+
+def rango_alineado_a_meses(start_date, end_date, fecha_min, fecha_max):
+    """Indica si [start_date, end_date] cubre meses completos de los datos disponibles."""
+    inicio_ok = start_date.day == 1 or start_date <= fecha_min
+    fin_ok = end_date == end_date + pd.offsets.MonthEnd(0) or end_date >= fecha_max
+    return inicio_ok and fin_ok and start_date <= end_date
+
+
+def tiendas_presentes(df, tiendas):
+    """Filas de la dimensión de las tiendas con al menos una fila en `df`."""
+    if df.empty:
+        return tiendas.iloc[:0]
+    presentes = np.bincount(df['TIENDA_ID'].to_numpy(), minlength=len(tiendas)) > 0
+    return tiendas.iloc[np.flatnonzero(presentes)]
+
+
+def sumar_atributo_tiendas(df, claves, tiendas, atributo):
+    """Suma de `atributo` de la dimensión sobre las tiendas distintas con filas en cada grupo de `claves`.
+
+    A diferencia de `agregar_cubo`, que pondera los atributos por días, cada tienda cuenta una sola
+    vez por grupo: es el Canon mensual (o los Mt2) del conjunto de tiendas, sin depender del orden
+    ni de la cantidad de filas.
+    """
+    claves = [claves] if isinstance(claves, str) else list(claves)
+    otras = [col for col in claves if col not in tiendas.columns]
+    celdas = agregar({col: df[col].array for col in ['TIENDA_ID'] + otras}, {}, {})
+    ids = celdas['TIENDA_ID'].to_numpy()
+    valores = {col: tiendas[col].array.take(ids) if col in tiendas.columns else celdas[col].array for col in claves}
+    return agregar(valores, {atributo: tiendas[atributo].to_numpy().take(ids)}, {atributo: (atributo, 'sum')})
+
+
+# Cómo se combinan, en el segundo paso, los resultados parciales por tienda
+_COMBINAR = {'sum': 'sum', 'size': 'sum', 'first': 'first', 'min': 'min', 'max': 'max'}
+
+
+def agregar_cubo(df, claves, tiendas=None, **agregaciones):
+    """`groupby(claves, observed=True).agg(**agregaciones)` sobre cualquiera de los dos cubos (o los totales por tienda).
+
+    Usa el núcleo de `agregacion` (códigos enteros y bincount, sin groupby de pandas). Las claves y
+    columnas de la dimensión (UBICACION, MARCA, CIUDAD, Mt2, Canon) se toman de `tiendas`: primero
+    se agrega por TIENDA_ID y luego cada tienda aporta sus atributos. Las sumas de Metros_Cuadrados
+    y Canon_Fijo se ponderan por las filas diarias de cada tienda (DIAS en el cubo mensual), así
+    coinciden con sumarlas sobre la tabla de hechos con los atributos copiados en cada fila. Funciones admitidas: sum, size, first, min y max.
+    """
+    claves = [claves] if isinstance(claves, str) else list(claves)
+    for _, func in agregaciones.values():
+        if func not in FUNCIONES:
+            raise ValueError(f"agregar_cubo no admite la función '{func}'")
+    columnas = set(claves) | {col for col, _ in agregaciones.values()}
+    if tiendas is None or not columnas & (set(CLAVES_TIENDA) | set(ATRIBUTOS_TIENDA)):
+        return agregar({col: df[col].array for col in claves}, {col: df[col].array for col in columnas - set(claves)}, agregaciones)
+
+    # 1. Por tienda (y por las claves propias de los hechos): una pasada de bincount por medida
+    otras = [col for col in claves if col not in tiendas.columns]
+    parciales = {'_dias': ('DIAS', 'sum') if 'DIAS' in df.columns else ('VENTAS', 'size'), '_filas': ('VENTAS', 'size')}
+    for col, func in agregaciones.values():
+        if col not in tiendas.columns and func != 'size':
+            parciales[f'{col}|{func}'] = (col, func)
+    fuentes = {col: df[col].array for col, _ in parciales.values() if col in df.columns}
+    if any(func == 'first' for _, func in agregaciones.values()):
+        # Primera fila de cada celda: el paso 2 recorre las celdas en orden de aparición
+        parciales['_primera'] = ('_posicion', 'min')
+        fuentes['_posicion'] = np.arange(len(df))
+    celdas = agregar({col: df[col].array for col in ['TIENDA_ID'] + otras}, fuentes, parciales)
+    if '_primera' in celdas.columns:
+        celdas = celdas.iloc[np.argsort(celdas['_primera'].to_numpy(), kind='stable')]
+
+    # 2. Cada celda toma sus claves y atributos de la dimensión; los atributos se ponderan por días
+    ids = celdas['TIENDA_ID'].to_numpy()
+    def fila(col):
+        return tiendas[col].array.take(ids) if col in tiendas.columns else celdas[col].array
+
+    finales = {}
+    for nombre, (col, func) in agregaciones.items():
+        if func == 'size':
+            finales[nombre] = ('_filas', 'sum')
+        elif col in tiendas.columns:
+            finales[nombre] = (col, func)
+        else:
+            finales[nombre] = (f'{col}|{func}', _COMBINAR[func])
+    valores = {fuente: fila(fuente) for fuente, _ in finales.values()}
+    pesos = {col: celdas['_dias'].to_numpy() for col in valores if col in tiendas.columns}
+    return agregar({col: fila(col) for col in claves}, valores, finales, pesos)
+
+
+# --- RUTA DE REFERENCIA CON PANDAS (solo para benchmarks) ---
+
+def agregar_cubo_pandas(df, claves, tiendas=None, **agregaciones):
+    """Versión de `agregar_cubo` con `groupby` de pandas (mismo resultado), para comparar en los benchmarks.
+
+    Agrega primero por TIENDA_ID, une la dimensión (una fila por tienda) y vuelve a agrupar.
+    """
+    claves = [claves] if isinstance(claves, str) else list(claves)
+    columnas = set(claves) | {col for col, _ in agregaciones.values()}
+    if tiendas is None or not columnas & (set(CLAVES_TIENDA) | set(ATRIBUTOS_TIENDA)):
+        return df.groupby(claves, as_index=False, observed=True).agg(**agregaciones)
+
+    # 1. Por tienda (y por las claves propias de los hechos), en orden de aparición
+    otras = [col for col in claves if col not in tiendas.columns]
+    parciales = {'_dias': ('DIAS', 'sum') if 'DIAS' in df.columns else ('VENTAS', 'size'),
+                 '_filas': ('VENTAS', 'size')}
+    for col, func in agregaciones.values():
+        if func not in _COMBINAR:
+            raise ValueError(f"agregar_cubo no admite la función '{func}'")
+        if col not in tiendas.columns and func != 'size':
+            parciales[f'{col}|{func}'] = (col, func)
+    por_tienda = df.groupby(['TIENDA_ID'] + otras, as_index=False, sort=False, observed=True).agg(**parciales)
+
+    # 2. Se une la dimensión y se combinan los parciales
+    dimension = tiendas.iloc[por_tienda['TIENDA_ID'].to_numpy()]
+    dias = por_tienda['_dias'].to_numpy()
+    paso2 = {col: (dimension[col].array if col in tiendas.columns else por_tienda[col].to_numpy()) for col in claves}
+    finales = {}
+    for nombre, (col, func) in agregaciones.items():
+        if func == 'size':
+            fuente = '_filas'
+            paso2[fuente] = por_tienda['_filas'].to_numpy()
+        elif col not in tiendas.columns:
+            fuente = f'{col}|{func}'
+            paso2[fuente] = por_tienda[fuente].to_numpy()
+        elif func == 'sum':
+            fuente = f'{col}|ponderado'
+            valores = dimension[col].to_numpy()
+            paso2[fuente] = valores.astype(np.result_type(valores.dtype, np.int64)) * dias
+        else:
+            fuente = col
+            paso2[fuente] = dimension[col].to_numpy()
+        finales[nombre] = (fuente, _COMBINAR[func])
+    return pd.DataFrame(paso2).groupby(claves, as_index=False, observed=True).agg(**finales)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+
+# --- GENERADOR VECTORIZADO DE DATOS DE EJEMPLO ---
+# Produce los mismos dos insumos que los Excel reales (ventas diarias y arrendamientos)
+# sin bucles por fila, para la demo pública y para pruebas de carga con millones de filas.
+
+# --- Perfiles de Marcas para Segmentación ---
+PERFILES_MARCAS = [
+    {'MARCA': 'AURA', 'tipo': 'Lujo', 'precio_promedio': 250, 'factor_volumen': 0.6},
+    {'MARCA': 'LUMIN', 'tipo': 'Fast Fashion', 'precio_promedio': 40, 'factor_volumen': 1.8},
+    {'MARCA': 'ZIRCON', 'tipo': 'Equilibrado', 'precio_promedio': 90, 'factor_volumen': 1.1},
+    {'MARCA': 'ONYX', 'tipo': 'Bajo Rendimiento', 'precio_promedio': 35, 'factor_volumen': 0.5},
+    {'MARCA': 'SOLARA', 'tipo': 'Premium', 'precio_promedio': 180, 'factor_volumen': 0.8},
+    {'MARCA': 'NOCTIS', 'tipo': 'Alto Tráfico', 'precio_promedio': 50, 'factor_volumen': 1.5},
+]
+
+# Ubicaciones de la demo original; ciudades y tiendas adicionales se nombran de forma correlativa
+UBICACIONES_POR_CIUDAD = {
+    'CARACAS': ['SAMBIL LA CANDELARIA', 'TOLON', 'LIDER', 'SAMBIL CHACAO'],
+    'VALENCIA': ['SAMBIL VALENCIA'],
+    'MARACAIBO': ['SAMBIL MARACAIBO'],
+    'BARQUISIMETO': ['SAMBIL BARQUISIMETO'],
+}
+CIUDADES_ADICIONALES = ['MARACAY', 'SAN CRISTOBAL', 'PUERTO CABELLO', 'CIUDAD GUAYANA', 'MARGARITA', 'LOS TEQUES', 'LA GUAIRA', 'MAIQUETIA']
+
+PROBABILIDAD_VENTA = 0.7  # 70% de probabilidad de tener ventas en un día
+
+
+def _perfiles(n_marcas, rng):
+    perfiles = PERFILES_MARCAS[:n_marcas]
+    for i in range(len(perfiles), n_marcas):
+        perfiles.append({'MARCA': f'MARCA {i + 1}', 'tipo': 'Sintético',
+                         'precio_promedio': int(rng.integers(30, 260)), 'factor_volumen': round(float(rng.uniform(0.5, 1.8)), 2)})
+    return perfiles
+
+
+def _ubicaciones(n_ciudades, n_tiendas):
+    ciudades = list(UBICACIONES_POR_CIUDAD) + CIUDADES_ADICIONALES
+    ciudades = (ciudades + [f'CIUDAD {i + 1}' for i in range(len(ciudades), n_ciudades)])[:n_ciudades]
+    # Primero las ubicaciones de la demo (de las ciudades elegidas), luego tiendas numeradas en turno rotativo
+    tiendas = [(u, c) for c in ciudades for u in UBICACIONES_POR_CIUDAD.get(c, [])][:n_tiendas]
+    for i in range(len(tiendas), n_tiendas):
+        ciudad = ciudades[i % n_ciudades]
+        tiendas.append((f'TIENDA {ciudad} {i // n_ciudades + 1}', ciudad))
+    return tiendas
+
+
+def generar_datos_sinteticos(n_ciudades=4, n_tiendas=7, n_marcas=6, n_anios=3, anio_inicio=2023, seed=42):
+    """Genera (df_ventas, df_arrendamientos) con el formato de los Excel de origen.
+
+    Cada ubicación recibe entre 3 y n_marcas-1 marcas al azar; cada tienda-marca vende el 70% de los
+    días, con tickets, unidades y ventas derivados del precio promedio y factor de volumen de su marca.
+    """
+    rng = np.random.default_rng(seed)
+    perfiles = _perfiles(n_marcas, rng)
+    tiendas = _ubicaciones(n_ciudades, n_tiendas)
+
+    # --- Arrendamientos: marcas aleatorias por ubicación ---
+    minimo = min(3, n_marcas)
+    marcas_por_tienda = rng.integers(minimo, max(minimo + 1, n_marcas), size=len(tiendas))
+    rango_marca = rng.random((len(tiendas), n_marcas)).argsort(axis=1).argsort(axis=1)
+    idx_tienda, idx_marca = np.nonzero(rango_marca < marcas_por_tienda[:, None])
+    ciudades_tienda = np.array([c for _, c in tiendas], dtype=object)[idx_tienda]
+    df_arrendamientos = pd.DataFrame({
+        'UBICACION': np.array([u for u, _ in tiendas], dtype=object)[idx_tienda],
+        'MARCA': np.array([p['MARCA'] for p in perfiles], dtype=object)[idx_marca],
+        'CIUDAD': ciudades_tienda,
+        'Mt2': rng.integers(80, 250, size=len(idx_tienda)),
+        'CANON FIJO': rng.integers(1500, 8000, size=len(idx_tienda)) * np.where(ciudades_tienda == 'CARACAS', 1.5, 1.0),  # Canon más caro en Caracas
+    })
+
+    # --- Ventas: producto cartesiano tienda-marca × día, filtrado por la probabilidad de venta ---
+    fechas = pd.date_range(start=f'{anio_inicio}-01-01', end=f'{anio_inicio + n_anios - 1}-12-31', freq='D')
+    n_combinaciones = len(df_arrendamientos)
+    vende = rng.random(n_combinaciones * len(fechas)) < PROBABILIDAD_VENTA
+    filas = np.flatnonzero(vende)
+    combinacion = filas // len(fechas)
+    n = len(filas)
+
+    precio = np.array([p['precio_promedio'] for p in perfiles], dtype=np.float64)[idx_marca][combinacion]
+    factor = np.array([p['factor_volumen'] for p in perfiles], dtype=np.float64)[idx_marca][combinacion]
+    tickets = np.maximum(1, (rng.integers(5, 50, size=n) * factor).astype(np.int64))
+    unidades = np.maximum(tickets, (tickets * rng.uniform(1.1, 2.5, size=n)).astype(np.int64))
+    venta = unidades * precio * rng.uniform(0.85, 1.15, size=n)  # Pequeña variación de precio
+
+    def categorias(columna):
+        codigos, valores = pd.factorize(df_arrendamientos[columna])
+        return pd.Categorical.from_codes(codigos[combinacion], valores)
+
+    df_ventas = pd.DataFrame({
+        'FECHA': fechas.values[filas % len(fechas)],
+        'MARCA': categorias('MARCA'), 'UBICACION': categorias('UBICACION'), 'CIUDAD': categorias('CIUDAD'),
+        'VENTA': venta, 'UNIDADES': unidades, 'TICKETS': tickets,
+    })
+    return df_ventas, df_arrendamientos
@@ -0,0 +1,109 @@
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_ventas import ATRIBUTOS_TIENDA, CLAVES_TIENDA, MEDIDAS, agregar_cubo
+
+
+# --- EXPORTACIÓN POR BLOQUES (CSV Y PARQUET) ---
+# Los datos de la selección salen del motor de filtros de a bloques de filas y se serializan a
+# medida que el navegador los descarga: la memoria del servidor no depende del tamaño del archivo
+# y la descarga no arma el resultado completo como `dcc.send_data_frame`.
+
+FILAS_POR_BLOQUE_EXPORTACION = int(os.environ.get('DASHBOARD_EXPORTAR_FILAS_POR_BLOQUE', 50_000))
+GRANOS = {
+    'diario': 'Ventas diarias por tienda',
+    'tienda_marca': 'Totales por tienda y marca',
+    'marca_anio': 'Totales por marca y año',
+}
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'parquet': 'application/vnd.apache.parquet'}
+# Parquet es opcional: requiere pyarrow
+PARQUET_DISPONIBLE = importlib.util.find_spec('pyarrow') is not None
+
+
+def _con_tiendas(df, textos, atributos=None):
+    # Reemplaza TIENDA_ID por UBICACION, MARCA y CIUDAD (y `atributos`) de la dimensión
+    ids = df['TIENDA_ID'].to_numpy()
+    columnas = {col: valores[ids] for col, valores in textos.items()}
+    columnas.update({col: df[col].to_numpy() for col in df.columns if col != 'TIENDA_ID'})
+    columnas.update({col: valores[ids] for col, valores in (atributos or {}).items()})
+    return pd.DataFrame(columnas)
+
+
+def bloques_exportacion(datos, grano, ubicaciones, marcas, start_date_dt, end_date_dt, filas_por_bloque=FILAS_POR_BLOQUE_EXPORTACION):
+    """DataFrames sucesivos con los datos de la selección al `grano` pedido (ver GRANOS); al menos uno, aunque vacío."""
+    tiendas = datos.tiendas
+    textos = {col: tiendas[col].astype(str).to_numpy() for col in CLAVES_TIENDA}
+    if grano == 'diario':
+        # Solo las posiciones de las filas (8 bytes por fila); cada bloque se toma del cubo al serializarlo
+        cubo = datos.cubo_diario[['TIENDA_ID', 'FECHA_DATETIME'] + MEDIDAS]
+        posiciones = datos.motor_diario.posiciones({'TIENDA_ID': datos.ids_tiendas(ubicaciones, marcas)}, start_date_dt, end_date_dt)
+        if isinstance(posiciones, slice):
+            posiciones = range(posiciones.start, posiciones.stop)
+        for inicio in range(0, max(len(posiciones), 1), filas_por_bloque):
+            bloque = posiciones[inicio:inicio + filas_por_bloque]
+            filas = cubo.iloc[bloque.start:bloque.stop] if isinstance(bloque, range) else cubo.take(bloque)
+            yield _con_tiendas(filas, textos)
+    elif grano == 'tienda_marca':
+        por_tienda = datos.totales_por_tienda(ubicaciones, marcas, start_date_dt, end_date_dt)
+        atributos = {col: tiendas[col].to_numpy(np.float64) for col in ATRIBUTOS_TIENDA if col in tiendas.columns}
+        yield _con_tiendas(por_tienda.rename(columns={'DIAS': 'DIAS_CON_VENTA'}), textos, atributos)
+    elif grano == 'marca_anio':
+        df = datos.filtrar(ubicaciones, marcas, start_date_dt, end_date_dt)
+        df_agg = agregar_cubo(df, ['MARCA', 'AÑO'], tiendas=tiendas, **{col: (col, 'sum') for col in MEDIDAS})
+        yield df_agg.astype({'MARCA': str})
+    else:
+        raise ValueError(f"Grano de exportación desconocido: '{grano}'")
+
+
+def csv_en_bloques(bloques):
+    """Bytes de un CSV (UTF-8 con BOM, así Excel lee bien los acentos), un fragmento por bloque."""
+    for i, bloque in enumerate(bloques):
+        texto = bloque.to_csv(index=False, header=i == 0, date_format='%Y-%m-%d')
+        yield (('\ufeff' + texto) if i == 0 else texto).encode('utf-8')
+
+
+class _Sumidero:
+    """Archivo de solo escritura que guarda lo escrito hasta que se retira (destino del ParquetWriter)."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        datos, self._partes = b''.join(self._partes), []
+        return datos
+
+
+def parquet_en_bloques(bloques):
+    """Bytes de un Parquet con un row group por bloque, entregados a medida que se escriben."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sumidero, escritor = _Sumidero(), None
+    for bloque in bloques:
+        tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+        if escritor is None:
+            escritor = pq.ParquetWriter(sumidero, tabla.schema)
+        escritor.write_table(tabla)
+        yield sumidero.retirar()
+    if escritor is not None:
+        escritor.close()
+    yield sumidero.retirar()
@@ -0,0 +1,166 @@
+import base64
+import os
+import re
+
+import numpy as np
+import plotly.io as pio
+
+
+# --- FIGURAS COMPACTAS PARA EL NAVEGADOR ---
+# Cada figura viaja como JSON de Plotly en la respuesta del callback. Antes de enviarla (y de
+# guardarla en cache_figuras) se achica sin cambiar lo que se ve:
+#   * la plantilla conserva solo los tipos de traza, subgráficos y escalas de color que usa;
+#   * el arreglo `text` se quita de las trazas cuyas etiquetas y hover no lo leen (las etiquetas
+#     de las barras se arman con `texttemplate` sobre `y`), y de `customdata` quedan solo las
+#     columnas que leen las plantillas (plotly express agrega ahí las columnas ocultas del hover);
+#   * los números pierden los dígitos que nadie lee (DIGITOS_SIGNIFICATIVOS) y los arreglos se
+#     envían como arreglos binarios en base64 ({dtype, bdata}, que plotly.js decodifica desde la
+#     2.28) cuando así ocupan menos: enteros en el tipo más chico que los contiene y decimales
+#     en float32 si los representa exactos.
+
+ACTIVO = os.environ.get('DASHBOARD_FIGURAS_COMPACTAS', '1') == '1'
+# Diez dígitos: sumas de hasta cien millones conservan los centavos
+DIGITOS_SIGNIFICATIVOS = 10
+# Con menos valores el encabezado del arreglo binario no compensa
+MIN_VALORES_BINARIO = 8
+
+_ENTEROS = [('u1', np.uint8), ('i1', np.int8), ('u2', np.uint16), ('i2', np.int16), ('u4', np.uint32), ('i4', np.int32)]
+
+# Partes de la plantilla que solo aplican si la figura tiene trazas de cierto tipo
+_SUBGRAFICOS = {
+    'mapbox': ('scattermapbox', 'choroplethmapbox', 'densitymapbox'),
+    'geo': ('scattergeo', 'choropleth'),
+    'polar': ('scatterpolar', 'scatterpolargl', 'barpolar'),
+    'ternary': ('scatterternary',),
+    'scene': ('scatter3d', 'surface', 'mesh3d', 'cone', 'streamtube', 'volume', 'isosurface'),
+}
+_CUSTOMDATA = re.compile(r'%\{customdata(?:\[(\d+)\])?')
+_TIPOS_CON_ESCALA = ('heatmap', 'heatmapgl', 'contour', 'histogram2d', 'histogram2dcontour', 'surface',
+                     'choropleth', 'choroplethmapbox', 'densitymapbox', 'mesh3d', 'cone', 'streamtube', 'volume', 'isosurface')
+
+
+def compactar_figura(figura):
+    """Versión compacta (dict) de una figura de Plotly; cualquier otro valor (no_update) pasa igual."""
+    if not ACTIVO:
+        return figura
+    if hasattr(figura, 'to_dict'):
+        figura = figura.to_dict()
+    if not isinstance(figura, dict):
+        return figura
+    trazas = [_compactar_traza(traza) for traza in figura.get('data', [])]
+    compacta = {**figura, 'data': trazas}
+    if 'layout' in figura:
+        compacta['layout'] = _podar_plantilla(figura['layout'], trazas)
+    return compacta
+
+
+def plantilla(tipos):
+    """Plantilla por defecto de plotly, podada para figuras con trazas de `tipos` (las que arma el navegador)."""
+    layout = {'template': pio.templates[pio.templates.default].to_plotly_json()}
+    return _podar_plantilla(layout, [{'type': tipo} for tipo in tipos])['template']
+
+
+def _compactar_traza(traza):
+    plantillas = [traza.get('texttemplate'), traza.get('hovertemplate')]
+    # Sin alguna de las dos plantillas, plotly muestra `text` tal cual en la etiqueta o el hover
+    texto_sin_uso = all(plantilla is not None and '%{text' not in str(plantilla) for plantilla in plantillas)
+    compacta = {clave: valor for clave, valor in traza.items() if not (clave == 'text' and texto_sin_uso)}
+    if 'customdata' in compacta and traza.get('hovertemplate') is not None:
+        columnas = _columnas_customdata(plantillas)
+        if columnas == 0:
+            del compacta['customdata']
+        elif columnas is not None:
+            compacta['customdata'] = [fila[:columnas] for fila in compacta['customdata']]
+    return {clave: _compactar_valor(valor) for clave, valor in compacta.items()}
+
+
+def _columnas_customdata(plantillas):
+    # Columnas de customdata que leen las plantillas; None si alguna lo usa entero
+    indices = [indice for plantilla in plantillas if plantilla is not None for indice in _CUSTOMDATA.findall(str(plantilla))]
+    if any(indice == '' for indice in indices):
+        return None
+    return max((int(indice) + 1 for indice in indices), default=0)
+
+
+def _compactar_valor(valor):
+    if isinstance(valor, dict):
+        return {clave: _compactar_valor(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple, np.ndarray)):
+        numeros = _arreglo_numerico(valor)
+        if numeros is not None:
+            return _codificar(numeros)
+        if isinstance(valor, np.ndarray) and valor.dtype.kind not in 'OUSb':
+            return valor  # fechas: las serializa plotly
+        return [_compactar_valor(v) for v in (valor.tolist() if isinstance(valor, np.ndarray) else valor)]
+    if isinstance(valor, (float, np.floating)):
+        return _recortar(float(valor))
+    return valor
+
+
+def _arreglo_numerico(valor):
+    # Arreglo (1D o 2D rectangular) solo de números finitos; None si tiene textos, nulos o booleanos
+    try:
+        numeros = np.asarray(valor)
+    except ValueError:
+        return None  # listas anidadas de distinto largo
+    if numeros.dtype.kind not in 'iuf' or numeros.ndim not in (1, 2) or numeros.size == 0:
+        return None
+    if numeros.dtype.kind == 'f' and not np.isfinite(numeros).all():
+        return None
+    return numeros
+
+
+def _recortar(numero):
+    return float(f'{numero:.{DIGITOS_SIGNIFICATIVOS}g}')
+
+
+def _codificar(numeros):
+    if numeros.dtype.kind == 'f':
+        numeros = np.array([_recortar(numero) for numero in numeros.ravel().tolist()]).reshape(numeros.shape)
+    enteros = numeros.dtype.kind in 'iu' or ((numeros == np.round(numeros)).all() and np.abs(numeros).max() < 2 ** 53)
+    if enteros:
+        numeros = numeros.astype(np.int64)  # 3582 en lugar de 3582.0
+    lista = numeros.tolist()
+    if numeros.size < MIN_VALORES_BINARIO:
+        return lista
+    binario = None
+    if enteros:
+        for dtype, tipo in _ENTEROS:
+            informacion = np.iinfo(tipo)
+            if numeros.min() >= informacion.min and numeros.max() <= informacion.max:
+                binario = (dtype, numeros.astype(tipo))
+                break
+    elif (numeros.astype(np.float32) == numeros).all():
+        binario = ('f4', numeros.astype(np.float32))
+    if binario is None:
+        return lista
+    dtype, arreglo = binario
+    especificacion = {'dtype': dtype, 'bdata': base64.b64encode(arreglo.astype(arreglo.dtype.newbyteorder('<')).tobytes()).decode('ascii')}
+    if arreglo.ndim == 2:
+        especificacion['shape'] = f'{arreglo.shape[0]},{arreglo.shape[1]}'
+    # Solo si el binario efectivamente ocupa menos que el texto
+    return especificacion if len(especificacion['bdata']) < len(str(lista)) else lista
+
+
+def _usa_escala_de_color(traza):
+    marcador = traza.get('marker') or {}
+    color = marcador.get('color')
+    return (traza.get('type') in _TIPOS_CON_ESCALA or 'coloraxis' in traza or 'coloraxis' in marcador
+            or (isinstance(color, dict) and 'bdata' in color)
+            or (isinstance(color, (list, np.ndarray)) and any(isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in color)))
+
+
+def _podar_plantilla(layout, trazas):
+    plantilla = layout.get('template')
+    if not isinstance(plantilla, dict):
+        return layout
+    tipos = {traza.get('type', 'scatter') for traza in trazas}
+    podada = {}
+    if 'data' in plantilla:
+        podada['data'] = {tipo: valor for tipo, valor in plantilla['data'].items() if tipo in tipos}
+    if 'layout' in plantilla:
+        sin_uso = {subgrafico for subgrafico, tipos_subgrafico in _SUBGRAFICOS.items() if not tipos.intersection(tipos_subgrafico)}
+        if 'coloraxis' not in layout and not any(_usa_escala_de_color(traza) for traza in trazas):
+            sin_uso.add('colorscale')
+        podada['layout'] = {clave: valor for clave, valor in plantilla['layout'].items() if clave not in sin_uso}
+    return {**layout, 'template': podada}
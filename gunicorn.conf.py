@@ -0,0 +1,26 @@
+# --- CONFIGURACIÓN DE PRODUCCIÓN ---
+# Uso: gunicorn -c gunicorn.conf.py app:server
+#
+# Los datos se preparan una sola vez (Excel -> cubos + índices) en el almacén columnar: el primer
+# worker que carga lo prepara, en segundo plano y con un bloqueo de archivo, y los demás esperan
+# su turno y lo abren. Cada worker lo abre mapeado en memoria y de solo lectura: las páginas de
+# los arreglos las comparte el sistema operativo, así la memoria casi no crece al sumar workers.
+# El maestro no carga nada: abre el puerto y crea los workers enseguida, y estos responden
+# /healthz y /readyz ("cargando") mientras se prepara el almacén.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Hilos por worker: una exportación larga ocupa un hilo, no el worker entero
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+# La app no se importa en el maestro: cada worker la importa y abre el almacén compartido
+preload_app = False
+raw_env = ['DASHBOARD_DATOS_COMPARTIDOS=1', 'DASHBOARD_DEBUG=0']
+
+
+def post_fork(server, worker):
+    # Cada worker empieza a cargar (desde el almacén) apenas nace, sin esperar a la primera petición.
+    # Tras `kill -HUP` al maestro los workers nuevos preparan la versión de los Excel actuales.
+    import app
+    app.iniciar_carga()
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_ventas import MEDIDAS
+
+
+# --- ÍNDICE DE RANGOS POR SUMAS ACUMULADAS ---
+# Por cada tienda, sumas acumuladas de VENTAS, UNIDADES, TICKETS y días con venta sobre un eje
+# diario denso (un casillero por día entre la primera y la última fecha del cubo). El total de
+# cualquier rango es acumulado[fin] - acumulado[inicio]: dos lecturas por tienda, sin importar
+# cuán ancho sea el rango ni cuántas filas tenga.
+
+COLUMNAS = MEDIDAS + ['DIAS']
+# Medidas que se acumulan como int64 (sumas exactas) cuando todos sus valores son enteros, y si no como float64
+ENTERAS = ['UNIDADES', 'TICKETS']
+# Tope de memoria del índice en MB (0 lo desactiva): ocupa tiendas × días × 28 bytes
+MAX_MB_INDICE_RANGOS = float(os.environ.get('DASHBOARD_INDICE_RANGOS_MB', 512))
+
+
+class IndiceRangos:
+    """Sumas acumuladas por tienda y día; responde totales por tienda de cualquier rango de fechas."""
+
+    def __init__(self, acumulados, fecha_inicio, n_tiendas):
+        """`acumulados` = {columna: arreglo plano de n_tiendas × (n_dias + 1)}, como lo deja `tabla()`."""
+        self.fecha_inicio = np.datetime64(fecha_inicio, 'D')
+        self.n_tiendas = n_tiendas
+        self.n_dias = len(acumulados['DIAS']) // n_tiendas - 1
+        # Vistas 2D sin copia (funciona también con arreglos mapeados en memoria)
+        self._acumulados = {col: np.asarray(arreglo).reshape(n_tiendas, self.n_dias + 1) for col, arreglo in acumulados.items()}
+
+    @classmethod
+    def desde_cubo(cls, cubo_diario, n_tiendas, max_mb=None):
+        """Construye el índice desde el cubo diario; None si está vacío o superaría `max_mb`."""
+        max_mb = MAX_MB_INDICE_RANGOS if max_mb is None else max_mb
+        if cubo_diario.empty or n_tiendas == 0 or max_mb <= 0:
+            return None
+        fecha_inicio = np.datetime64(cubo_diario['FECHA_DATETIME'].iloc[0], 'D')
+        dias = (cubo_diario['FECHA_DATETIME'].to_numpy().astype('datetime64[D]') - fecha_inicio).astype(np.int64)
+        n_dias = int(dias.max()) + 1
+        celdas = n_tiendas * (n_dias + 1)
+        if celdas * 28 > max_mb * 2**20:
+            print(f"ADVERTENCIA: El índice de rangos ocuparía {celdas * 28 / 2**20:,.0f} MB (tope DASHBOARD_INDICE_RANGOS_MB={max_mb:g}); se filtra el cubo.")
+            return None
+
+        # Casillero de cada fila: su tienda y el día siguiente (la columna 0 queda en cero)
+        casillero = cubo_diario['TIENDA_ID'].to_numpy().astype(np.int64) * (n_dias + 1) + dias + 1
+        acumulados = {}
+        for col in COLUMNAS:
+            if col == 'DIAS':
+                por_dia = np.bincount(casillero, minlength=celdas).astype(np.int32)
+            else:
+                por_dia = np.bincount(casillero, weights=cubo_diario[col].to_numpy(np.float64), minlength=celdas)
+                if col in ENTERAS and np.array_equal(por_dia, np.round(por_dia)):
+                    por_dia = por_dia.astype(np.int64)
+            matriz = por_dia.reshape(n_tiendas, n_dias + 1)
+            np.cumsum(matriz, axis=1, out=matriz)
+            acumulados[col] = matriz.reshape(-1)
+        return cls(acumulados, fecha_inicio, n_tiendas)
+
+    def actualizado(self, cubo_diario, desde, n_tiendas, max_mb=None):
+        """Índice de `cubo_diario` (ordenado por fecha) cuando solo cambiaron sus días desde `desde`.
+
+        Los acumulados hasta el día anterior a `desde` se copian; desde ahí se recalculan con las
+        filas de esos días, así el costo depende de cuántos días cubre el cambio y no del histórico.
+        `n_tiendas` puede haber crecido (tiendas nuevas, al final). Este índice no se modifica.
+        """
+        max_mb = MAX_MB_INDICE_RANGOS if max_mb is None else max_mb
+        desde = np.datetime64(desde, 'D')
+        if desde < self.fecha_inicio:
+            # Días anteriores al eje del índice (poco frecuente): cambia el origen, se reconstruye
+            return IndiceRangos.desde_cubo(cubo_diario, n_tiendas, max_mb)
+        fechas = cubo_diario['FECHA_DATETIME'].to_numpy()
+        cola = cubo_diario.iloc[int(np.searchsorted(fechas, desde, side='left')):]
+        corte = int((desde - self.fecha_inicio).astype(np.int64))
+        n_dias = max(self.n_dias, int((fechas[-1].astype('datetime64[D]') - self.fecha_inicio).astype(np.int64)) + 1)
+        if n_tiendas * (n_dias + 1) * 28 > max_mb * 2**20:
+            print(f"ADVERTENCIA: El índice de rangos ocuparía {n_tiendas * (n_dias + 1) * 28 / 2**20:,.0f} MB (tope DASHBOARD_INDICE_RANGOS_MB={max_mb:g}); se filtra el cubo.")
+            return None
+
+        # Casillero de cada fila de la cola relativo al corte; la columna 0 lleva el acumulado previo
+        ancho = n_dias - corte + 1
+        dias = (cola['FECHA_DATETIME'].to_numpy().astype('datetime64[D]') - self.fecha_inicio).astype(np.int64)
+        casillero = cola['TIENDA_ID'].to_numpy().astype(np.int64) * ancho + dias - corte + 1
+        acumulados = {}
+        for col, anterior in self._acumulados.items():
+            if col == 'DIAS':
+                por_dia = np.bincount(casillero, minlength=n_tiendas * ancho)
+            else:
+                por_dia = np.bincount(casillero, weights=cola[col].to_numpy(np.float64), minlength=n_tiendas * ancho)
+            # Una medida entera que recibe valores fraccionarios pasa a float64
+            tipo = anterior.dtype if col == 'DIAS' or np.array_equal(por_dia, np.round(por_dia)) else np.dtype(np.float64)
+            matriz = np.zeros((n_tiendas, n_dias + 1), dtype=tipo)
+            # Si el cambio empieza después del último día indexado, los días intermedios no suman nada
+            copia = min(corte, self.n_dias)
+            matriz[:self.n_tiendas, :copia + 1] = anterior[:, :copia + 1]
+            matriz[:self.n_tiendas, copia + 1:corte + 1] = anterior[:, copia:copia + 1]
+            tramo = por_dia.astype(tipo).reshape(n_tiendas, ancho)
+            tramo[:, 0] = matriz[:, corte]
+            # Mismo orden de sumas que desde_cubo: el resultado es idéntico a reconstruir
+            np.cumsum(tramo, axis=1, out=tramo)
+            matriz[:, corte:] = tramo
+            if col in ENTERAS and matriz.dtype.kind == 'f' and np.array_equal(matriz, np.round(matriz)):
+                # Ya no queda ningún valor fraccionario: vuelve a int64, como al reconstruir
+                matriz = matriz.astype(np.int64)
+            acumulados[col] = matriz.reshape(-1)
+        return IndiceRangos(acumulados, self.fecha_inicio, n_tiendas)
+
+    def tabla(self):
+        """Los acumulados como tabla plana, para persistirlos en el almacén columnar."""
+        return pd.DataFrame({col: matriz.reshape(-1) for col, matriz in self._acumulados.items()}, copy=False)
+
+    def totales(self, ids, start_date, end_date):
+        """DataFrame TIENDA_ID, VENTAS, UNIDADES, TICKETS, DIAS de [start_date, end_date] para `ids` (None = todas).
+
+        Solo incluye tiendas con al menos un día con venta en el rango.
+        """
+        inicio = int(np.clip((np.datetime64(start_date, 'D') - self.fecha_inicio).astype(np.int64), 0, self.n_dias))
+        fin = int(np.clip((np.datetime64(end_date, 'D') - self.fecha_inicio).astype(np.int64) + 1, 0, self.n_dias))
+        filas = np.arange(self.n_tiendas) if ids is None else np.asarray(ids, dtype=np.int64)
+        if fin <= inicio or len(filas) == 0:
+            filas = filas[:0]
+        totales = {col: matriz[filas, fin] - matriz[filas, inicio] for col, matriz in self._acumulados.items()}
+        con_ventas = totales['DIAS'] > 0
+        return pd.DataFrame({'TIENDA_ID': filas[con_ventas], **{col: valores[con_ventas] for col, valores in totales.items()}})
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+# --- TIPOS COMPACTOS Y PRESUPUESTO DE MEMORIA ---
+# Las dimensiones de texto se guardan como categorías y las medidas con el entero más chico que
+# conserva sus valores. Los decimales quedan en float64: float32 redondearía las sumas.
+
+DIMENSIONES = ['UBICACION', 'MARCA', 'CIUDAD']
+
+
+def compactar_tipos(df, dimensiones=DIMENSIONES):
+    """Copia liviana de `df` con dimensiones categóricas y enteros del ancho mínimo que conserva los valores."""
+    columnas = {}
+    for col in df.columns:
+        serie = df[col]
+        if col in dimensiones:
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                columnas[col] = serie.astype('category')
+        elif pd.api.types.is_bool_dtype(serie.dtype):
+            continue
+        elif pd.api.types.is_integer_dtype(serie.dtype):
+            columnas[col] = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie.dtype):
+            valores = serie.to_numpy()
+            # Decimales que en realidad son enteros (p. ej. Mt2 leídos del Excel) y sin faltantes
+            if len(valores) and np.isfinite(valores).all() and (valores == np.round(valores)).all():
+                columnas[col] = pd.to_numeric(serie.astype(np.int64), downcast='integer')
+    return df.assign(**columnas) if columnas else df
+
+
+def reporte_memoria(tablas):
+    """DataFrame con tabla, columna, tipo y bytes (incluye categorías y texto) de cada columna."""
+    filas = []
+    for nombre, df in tablas.items():
+        for col, bytes_col in df.memory_usage(deep=True, index=False).items():
+            filas.append((nombre, col, str(df[col].dtype), int(bytes_col)))
+    return pd.DataFrame(filas, columns=['tabla', 'columna', 'tipo', 'bytes'])
+
+
+def verificar_presupuesto(tablas, presupuesto_mb=0):
+    """Imprime el uso de memoria por columna y lanza MemoryError si el total supera `presupuesto_mb` (0 = sin límite)."""
+    reporte = reporte_memoria(tablas)
+    total = int(reporte['bytes'].sum())
+    print("Memoria de los datos por columna:")
+    for nombre, filas in reporte.groupby('tabla', sort=False):
+        print(f"  {nombre} ({filas['bytes'].sum() / 2**20:,.1f} MB)")
+        for fila in filas.itertuples():
+            print(f"    {fila.columna:<18}{fila.tipo:<16}{fila.bytes / 2**20:>10,.2f} MB")
+    limite = f" de un presupuesto de {presupuesto_mb:,g} MB" if presupuesto_mb else ""
+    print(f"  Total: {total / 2**20:,.1f} MB{limite}")
+    if presupuesto_mb and total > presupuesto_mb * 2**20:
+        raise MemoryError(f"Los datos ocupan {total / 2**20:,.1f} MB y superan el presupuesto de {presupuesto_mb:,g} MB "
+                          f"(DASHBOARD_PRESUPUESTO_MB). Reduce el período cargado o sube el presupuesto.")
+    return reporte
+
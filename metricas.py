@@ -0,0 +1,85 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# --- REGISTRO DE MÉTRICAS ---
+# Cada KPI se define una sola vez: numerador, denominador (None = la medida tal cual), si el
+# denominador es el Canon (que se puede prorratear por los meses del período) y formato.
+# El agregado debe traer las columnas base con los nombres del cubo: VENTAS, UNIDADES,
+# TICKETS, Metros_Cuadrados y Canon_Fijo.
+
+METRICAS = {
+    'VENTAS': {'label': 'Ventas Totales', 'numerador': 'VENTAS', 'denominador': None, 'formatter': '$%{text:,.0f}'},
+    'UNIDADES': {'label': 'Unidades Totales', 'numerador': 'UNIDADES', 'denominador': None, 'formatter': '%{text:,.0f}'},
+    'TICKETS': {'label': 'Tickets Totales', 'numerador': 'TICKETS', 'denominador': None, 'formatter': '%{text:,.0f}'},
+    'Metros_Cuadrados': {'label': 'Metros Cuadrados', 'numerador': 'Metros_Cuadrados', 'denominador': None, 'formatter': '%{text:,.0f}'},
+    'Canon_Fijo': {'label': 'Canon Fijo Mensual', 'numerador': 'Canon_Fijo', 'denominador': None, 'formatter': '$%{text:,.2f}'},
+    'Ventas_por_MT2': {'label': 'Ventas / Mt2', 'numerador': 'VENTAS', 'denominador': 'Metros_Cuadrados', 'formatter': '$%{text:,.2f}'},
+    'Unidades_por_MT2': {'label': 'Unidades / Mt2', 'numerador': 'UNIDADES', 'denominador': 'Metros_Cuadrados', 'formatter': '%{text:,.2f}'},
+    'Tickets_por_MT2': {'label': 'Tickets / Mt2', 'numerador': 'TICKETS', 'denominador': 'Metros_Cuadrados', 'formatter': '%{text:,.2f}'},
+    'Relacion_Ventas_Canon': {'label': 'Ventas / Canon', 'numerador': 'VENTAS', 'denominador': 'Canon_Fijo', 'canon': True, 'formatter': '%{text:,.2f}x'},
+    'Ventas_por_Canon': {'label': 'Ventas / Canon', 'numerador': 'VENTAS', 'denominador': 'Canon_Fijo', 'canon': True, 'formatter': '%{text:,.2f}'},
+    'Unidades_por_Canon': {'label': 'Unidades / Canon', 'numerador': 'UNIDADES', 'denominador': 'Canon_Fijo', 'canon': True, 'formatter': '%{text:,.2f}'},
+    'Tickets_por_Canon': {'label': 'Tickets / Canon', 'numerador': 'TICKETS', 'denominador': 'Canon_Fijo', 'canon': True, 'formatter': '%{text:,.2f}'},
+    'ATV': {'label': 'Ventas / Ticket (ATV)', 'numerador': 'VENTAS', 'denominador': 'TICKETS', 'formatter': '$%{text:,.2f}'},
+    'ASP': {'label': 'Ventas / Unidad (ASP)', 'numerador': 'VENTAS', 'denominador': 'UNIDADES', 'formatter': '$%{text:,.2f}'},
+    'UPT': {'label': 'Unidades / Ticket (UPT)', 'numerador': 'UNIDADES', 'denominador': 'TICKETS', 'formatter': '%{text:,.2f}'},
+}
+
+
+def detalle_metrica(clave, prorrateado=True):
+    """{'label', 'value', 'formatter'} de la métrica, como lo usan los gráficos.
+
+    Las métricas sobre el Canon dicen "Canon Periodo" si se prorratea por meses y "Canon Fijo" si no.
+    """
+    metrica = METRICAS[clave]
+    label = metrica['label']
+    if metrica.get('canon'):
+        label += ' Periodo' if prorrateado else ' Fijo'
+    return {'label': label, 'value': clave, 'formatter': metrica['formatter']}
+
+
+def evaluar_metricas(df_agg, claves, meses=None):
+    """Agrega a `df_agg` una columna por métrica pedida, calculada con operaciones de columna.
+
+    Con `meses`, el Canon (mensual) se prorratea al período: denominador = Canon_Fijo × meses.
+    Las divisiones por cero o sin dato quedan NaN.
+    """
+    columnas = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for clave in dict.fromkeys(claves):
+            metrica = METRICAS[clave]
+            valores = df_agg[metrica['numerador']].to_numpy(dtype=np.float64)
+            if metrica['denominador'] is not None:
+                denominador = df_agg[metrica['denominador']].to_numpy(dtype=np.float64)
+                if metrica.get('canon') and meses is not None:
+                    denominador = denominador * meses
+                valores = valores / denominador
+                valores[~np.isfinite(valores)] = np.nan
+            columnas[clave] = valores
+    return df_agg.assign(**columnas)
+
+
+def evaluar_totales(totales, claves, meses=None):
+    """Métricas de un solo registro de totales (tarjetas KPI); sin dato cuenta como 0."""
+    fila = evaluar_metricas(pd.DataFrame([totales]), claves, meses).iloc[0]
+    return {clave: float(np.nan_to_num(fila[clave])) for clave in claves}
+
+
+def formatear_valor(clave, valor):
+    """Texto del valor con el formato de la métrica (el mismo de los gráficos)."""
+    formatter = METRICAS[clave]['formatter']
+    prefijo, especificacion, sufijo = re.fullmatch(r'(.*)%\{text:([^}]*)\}(.*)', formatter).groups()
+    return f"{prefijo}{format(valor, especificacion)}{sufijo}"
+
+
+def clasificar_cuadrantes(df_agg, col_y, col_x, segmentos):
+    """Segmento de cada fila según su posición respecto de las medianas de `col_y` y `col_x`.
+
+    `segmentos` = (alto Y y alto X, alto Y y bajo X, bajo Y y alto X, bajo Y y bajo X).
+    """
+    alto_y = (df_agg[col_y] >= df_agg[col_y].median()).to_numpy()
+    alto_x = (df_agg[col_x] >= df_agg[col_x].median()).to_numpy()
+    return np.select([alto_y & alto_x, alto_y & ~alto_x, ~alto_y & alto_x], segmentos[:3], default=segmentos[3]).astype(object)
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+import telemetria
+
+
+# --- MOTOR DE FILTRADO INDEXADO ---
+# La tabla de hechos se ordena una sola vez por fecha. El rango de fechas se resuelve
+# con búsqueda binaria y las selecciones (de tiendas, por TIENDA_ID) con índices de posiciones
+# precalculados, así que filtrar ya no copia ni recorre toda la tabla.
+
+# Con más valores seleccionados que esto, se marca el rango con una máscara en vez de unir listas
+MAX_VALORES_POR_LISTA = 32
+
+class MotorFiltros:
+    """Índices de posiciones sobre una tabla de hechos ordenada por fecha."""
+
+    def __init__(self, df, columna_fecha='FECHA_DATETIME', columnas_indice=('TIENDA_ID',), ordenes=None):
+        if not df.empty and not df[columna_fecha].is_monotonic_increasing:
+            df = df.sort_values(columna_fecha, kind='mergesort').reset_index(drop=True)
+            ordenes = None  # Calculados para otro orden de filas
+        self.df = df
+        self.columna_fecha = columna_fecha
+        # Se conserva la unidad de la columna (ns, us...) para no copiarla
+        self._fechas = df[columna_fecha].to_numpy() if not df.empty else np.array([], dtype='datetime64[ns]')
+
+        # Por cada dimensión: posiciones ordenadas de cada valor y códigos enteros por fila
+        self._posiciones = {}
+        self._codigos = {}
+        self._categorias = {}
+        for col in columnas_indice:
+            if col not in df.columns:
+                continue
+            serie = df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype) and not serie.hasnans:
+                # Los códigos de la categoría sirven tal cual (sin copiar si vienen mapeados en memoria)
+                codigos, categorias = serie.array.codes, serie.cat.categories
+            elif pd.api.types.is_integer_dtype(serie.dtype) and len(serie) and serie.min() >= 0:
+                # Ids enteros (TIENDA_ID): el valor es su propio código
+                codigos = serie.to_numpy()
+                categorias = pd.RangeIndex(int(codigos.max()) + 1)
+            else:
+                codigos, categorias = pd.factorize(serie, sort=True)
+            if ordenes is not None and col in ordenes:
+                orden = np.asarray(ordenes[col])
+            else:
+                orden = np.argsort(codigos, kind='stable')
+            limites = np.searchsorted(codigos[orden], np.arange(len(categorias) + 1))
+            self._codigos[col] = codigos
+            self._categorias[col] = pd.Index(categorias)
+            self._posiciones[col] = {valor: orden[limites[i]:limites[i + 1]] for i, valor in enumerate(categorias)}
+
+    def ordenes(self):
+        """Orden estable de las filas por código de cada dimensión; permite reconstruir el motor sin ordenar."""
+        ordenes = {}
+        for col, posiciones in self._posiciones.items():
+            partes = [posiciones[valor] for valor in self._categorias[col]]
+            ordenes[col] = np.concatenate(partes) if partes else np.array([], dtype=np.intp)
+        return ordenes
+
+    def rango_fechas(self, start_date, end_date):
+        """Devuelve (inicio, fin) de las filas con fecha dentro de [start_date, end_date]."""
+        inicio = np.searchsorted(self._fechas, pd.Timestamp(start_date).to_datetime64().astype(self._fechas.dtype), side='left')
+        fin = np.searchsorted(self._fechas, pd.Timestamp(end_date).to_datetime64().astype(self._fechas.dtype), side='right')
+        return int(inicio), int(max(inicio, fin))
+
+    def _posiciones_dimension(self, col, valores, inicio, fin):
+        """Posiciones (ordenadas) de las filas cuyo valor en `col` está en `valores`, recortadas al rango."""
+        if len(valores) > MAX_VALORES_POR_LISTA:
+            return inicio + np.flatnonzero(self._mascara(col, valores)[self._codigos[col][inicio:fin]])
+        partes = []
+        for valor in set(valores):
+            pos = self._posiciones[col].get(valor)
+            if pos is None or len(pos) == 0:
+                continue
+            a, b = np.searchsorted(pos, [inicio, fin])
+            if b > a:
+                partes.append(pos[a:b])
+        if not partes:
+            return np.array([], dtype=np.intp)
+        return partes[0] if len(partes) == 1 else np.sort(np.concatenate(partes))
+
+    def posiciones(self, selecciones, start_date, end_date):
+        """Devuelve un `slice` o un arreglo de posiciones con las filas que cumplen los filtros.
+
+        `selecciones` = {columna indexada: valores}; None (o una columna ausente) no filtra y una
+        lista vacía no deja pasar ninguna fila.
+        """
+        inicio, fin = self.rango_fechas(start_date, end_date)
+        telemetria.filas_leidas.observar(fin - inicio)
+        selecciones = [(col, list(valores)) for col, valores in selecciones.items() if valores is not None]
+        if not selecciones:
+            telemetria.filas_devueltas.observar(fin - inicio)
+            return slice(inicio, fin)
+
+        # Partir de la dimensión más selectiva y validar las demás con sus códigos enteros
+        candidatas = [(col, valores, self._posiciones_dimension(col, valores, inicio, fin)) for col, valores in selecciones]
+        candidatas.sort(key=lambda c: len(c[2]))
+        _, _, pos = candidatas[0]
+        for col, valores, _ in candidatas[1:]:
+            if len(pos) == 0:
+                break
+            pos = pos[self._mascara(col, valores)[self._codigos[col][pos]]]
+        telemetria.filas_devueltas.observar(len(pos))
+        return pos
+
+    def _mascara(self, col, valores):
+        # Arreglo booleano indexado por código: True en los valores seleccionados
+        codigos_sel = self._categorias[col].get_indexer(list(valores))
+        mascara = np.zeros(len(self._categorias[col]), dtype=bool)
+        mascara[codigos_sel[codigos_sel >= 0]] = True
+        return mascara
+
+    def filtrar(self, selecciones, start_date, end_date):
+        """Devuelve las filas filtradas como vista (rango contiguo) o con `take` sobre las posiciones."""
+        pos = self.posiciones(selecciones, start_date, end_date)
+        if isinstance(pos, slice):
+            return self.df.iloc[pos]
+        return self.df.take(pos)
+
+    def con_valores(self, df):
+        """Motor para `df`, que tiene las mismas filas en el mismo orden que `self.df` (solo cambian medidas)."""
+        nuevo = object.__new__(MotorFiltros)
+        nuevo.__dict__.update(self.__dict__)
+        nuevo.df = df
+        return nuevo
+
+    def extender(self, df_nuevo):
+        """Motor nuevo con `df_nuevo` agregado al final, sin reindexar las filas existentes.
+
+        Las fechas de `df_nuevo` deben ser >= a la última fecha indexada; el motor actual no se modifica.
+        """
+        df_nuevo = df_nuevo.sort_values(self.columna_fecha, kind='mergesort')
+        fechas_nuevas = df_nuevo[self.columna_fecha].to_numpy().astype(self._fechas.dtype)
+        if len(self._fechas) and len(fechas_nuevas) and fechas_nuevas[0] < self._fechas[-1]:
+            raise ValueError("Las filas a extender son anteriores a la última fecha indexada")
+
+        n_actual = len(self.df)
+        nuevo = object.__new__(MotorFiltros)
+        nuevo.columna_fecha = self.columna_fecha
+        nuevo.df = pd.concat([self.df, df_nuevo], ignore_index=True)
+        nuevo._fechas = np.concatenate([self._fechas, fechas_nuevas])
+        nuevo._posiciones, nuevo._codigos, nuevo._categorias = {}, {}, {}
+        for col, categorias in self._categorias.items():
+            valores = df_nuevo[col].to_numpy()
+            codigos = categorias.get_indexer(valores)
+            if (codigos < 0).any():
+                # Valores nuevos: se agregan al final, así los códigos existentes no cambian
+                categorias = categorias.append(pd.Index(np.sort(pd.unique(valores[codigos < 0]))))
+                codigos = categorias.get_indexer(valores)
+            posiciones = dict(self._posiciones[col])
+            for codigo in np.unique(codigos):
+                valor = categorias[codigo]
+                agregadas = n_actual + np.flatnonzero(codigos == codigo)
+                previas = posiciones.get(valor)
+                posiciones[valor] = agregadas if previas is None else np.concatenate([previas, agregadas])
+            nuevo._categorias[col] = categorias
+            nuevo._codigos[col] = np.concatenate([self._codigos[col], codigos])
+            nuevo._posiciones[col] = posiciones
+        return nuevo
@@ -0,0 +1,139 @@
+import collections
+import hmac
+import linecache
+import os
+import secrets
+import threading
+import time
+import tracemalloc
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+
+# --- PERFILADO DE MEMORIA POR CALLBACK (OPCIONAL) ---
+# Con el modo activo, cada callback perfilado corre con tracemalloc encendido: se registra el pico
+# de memoria que alcanzó, lo que quedó retenido al terminar y los sitios (archivo:línea) que más
+# memoria retienen. tracemalloc mide todo el proceso, así que los callbacks perfilados se atienden
+# de a uno por worker para que cada perfil sea solo suyo. Apagado, el costo es una comparación.
+
+PERFILAR_TODO = os.environ.get('DASHBOARD_PERFILAR_MEMORIA', '0') == '1'
+# Sin token de administración no se aceptan pedidos de perfilado ni se ven las rutas admin. El
+# token solo viaja en el encabezado X-Dashboard-Admin; la cookie de perfilado lleva una sesión
+# aleatoria firmada con él (nunca el token), que vence a las DASHBOARD_PERFILAR_SESION_SEG
+TOKEN_ADMIN = os.environ.get('DASHBOARD_ADMIN_TOKEN', '')
+ENCABEZADO_ADMIN = 'X-Dashboard-Admin'
+ENCABEZADO = 'X-Dashboard-Perfilar'
+COOKIE = 'dashboard_perfilar'
+DURACION_SESION_SEG = int(os.environ.get('DASHBOARD_PERFILAR_SESION_SEG', 8 * 3600))
+MARCOS = int(os.environ.get('DASHBOARD_PERFIL_MARCOS', 10))
+SITIOS_POR_PERFIL = 10
+
+_perfiles = collections.deque(maxlen=int(os.environ.get('DASHBOARD_PERFILES_MAX', 200)))
+_lock_medicion = threading.Lock()
+
+
+def es_admin(token):
+    """True si `token` es el token de administración (comparación en tiempo constante)."""
+    return bool(TOKEN_ADMIN) and bool(token) and hmac.compare_digest(str(token), TOKEN_ADMIN)
+
+
+def _firmante():
+    return URLSafeTimedSerializer(TOKEN_ADMIN, salt='dashboard-perfilar')
+
+
+def nueva_sesion():
+    """Valor para la cookie de perfilado: un identificador aleatorio firmado con el token admin."""
+    return _firmante().dumps(secrets.token_urlsafe(16))
+
+
+def sesion_valida(valor):
+    """True si `valor` es una sesión de `nueva_sesion` con firma correcta y sin vencer."""
+    if not TOKEN_ADMIN or not valor:
+        return False
+    try:
+        _firmante().loads(valor, max_age=DURACION_SESION_SEG)
+    except BadSignature:
+        return False
+    return True
+
+
+def solicitado(encabezados, cookies):
+    """¿Hay que perfilar esta petición? Siempre con el modo global; si no, solo si la pide un admin.
+
+    Un admin la pide con el encabezado X-Dashboard-Perfilar junto al token en X-Dashboard-Admin,
+    o con la cookie de sesión que entrega /admin/perfilar.
+    """
+    if PERFILAR_TODO:
+        return True
+    if not TOKEN_ADMIN:
+        return False
+    if encabezados.get(ENCABEZADO) and es_admin(encabezados.get(ENCABEZADO_ADMIN)):
+        return True
+    return sesion_valida(cookies.get(COOKIE))
+
+
+class Medicion:
+    """Perfil de memoria de una invocación, entre `Medicion()` y `terminar()` (o `cancelar()`)."""
+
+    def __init__(self):
+        _lock_medicion.acquire()
+        self.activa = True
+        self.inicio = time.perf_counter()
+        self._propio = not tracemalloc.is_tracing()
+        if self._propio:
+            tracemalloc.start(MARCOS)
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+        # Con tracemalloc ya encendido por otro (p. ej. -X tracemalloc), se descuenta lo previo
+        self._antes = None if self._propio else tracemalloc.take_snapshot()
+
+    def terminar(self, callback, detalle=None):
+        """Detiene la medición, guarda el perfil y lo devuelve."""
+        if not self.activa:
+            return None
+        try:
+            actual, pico = tracemalloc.get_traced_memory()
+            despues = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            estadisticas = despues.compare_to(self._antes, 'lineno') if self._antes is not None else despues.statistics('lineno')
+            sitios = [{
+                'sitio': f"{estadistica.traceback[0].filename}:{estadistica.traceback[0].lineno}",
+                'codigo': linecache.getline(estadistica.traceback[0].filename, estadistica.traceback[0].lineno).strip(),
+                'bytes': getattr(estadistica, 'size_diff', estadistica.size),
+                'bloques': getattr(estadistica, 'count_diff', estadistica.count),
+            } for estadistica in estadisticas[:SITIOS_POR_PERFIL]]
+            perfil = {
+                'callback': callback, 'momento': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'ms': round((time.perf_counter() - self.inicio) * 1000, 1),
+                'pico_bytes': pico - self._base, 'retenido_bytes': actual - self._base,
+                'sitios': sitios, **(detalle or {}),
+            }
+            _perfiles.append(perfil)
+            return perfil
+        finally:
+            self.cancelar()
+
+    def cancelar(self):
+        """Libera la medición sin guardar nada (idempotente)."""
+        if not self.activa:
+            return
+        self.activa = False
+        if self._propio:
+            tracemalloc.stop()
+        _lock_medicion.release()
+
+
+def perfiles(callback=None, limite=None):
+    """Perfiles guardados, del más reciente al más antiguo (opcionalmente de un solo callback)."""
+    resultado = [perfil for perfil in reversed(_perfiles) if callback is None or perfil['callback'] == callback]
+    return resultado[:limite] if limite else resultado
+
+
+def resumen():
+    """Por callback: invocaciones perfiladas y pico y retenido máximos, de mayor a menor pico."""
+    por_callback = {}
+    for perfil in list(_perfiles):
+        fila = por_callback.setdefault(perfil['callback'], {'callback': perfil['callback'], 'invocaciones': 0, 'pico_max_bytes': 0, 'retenido_max_bytes': 0})
+        fila['invocaciones'] += 1
+        fila['pico_max_bytes'] = max(fila['pico_max_bytes'], perfil['pico_bytes'])
+        fila['retenido_max_bytes'] = max(fila['retenido_max_bytes'], perfil['retenido_bytes'])
+    return sorted(por_callback.values(), key=lambda fila: fila['pico_max_bytes'], reverse=True)
@@ -0,0 +1,139 @@
+import bisect
+import contextvars
+import functools
+import math
+import threading
+import time
+
+
+# --- TELEMETRÍA EN FORMATO PROMETHEUS ---
+# Histogramas y contadores en memoria del proceso, expuestos como texto de Prometheus (formato
+# 0.0.4) sin dependencias. Cada métrica lleva la etiqueta `callback`: el callback de Dash que se
+# está atendiendo en el hilo (ver `callback_actual`), así los filtrados y agregaciones internos
+# quedan atribuidos a la vista que los pidió.
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LIMITES_FILAS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+LIMITES_GRUPOS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+LIMITES_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Callback en curso en este hilo ('' fuera de un callback: precalentamiento, exportación, scripts)
+callback_actual = contextvars.ContextVar('callback_actual', default='')
+FUERA_DE_CALLBACK = 'fuera_de_callback'
+
+_lock = threading.Lock()
+_metricas = []
+_colectores = []
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    texto = ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares)
+    return '{' + texto + '}' if texto else ''
+
+
+def _numero(valor):
+    if math.isinf(valor):
+        return '+Inf' if valor > 0 else '-Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """Histograma acumulativo por valor de etiqueta (por defecto, el callback en curso)."""
+
+    def __init__(self, nombre, ayuda, limites, etiqueta='callback'):
+        self.nombre, self.ayuda, self.limites, self.etiqueta = nombre, ayuda, tuple(limites), etiqueta
+        self._series = {}  # valor de etiqueta -> [conteos por límite (+Inf al final), suma]
+        _metricas.append(self)
+
+    def observar(self, valor, etiqueta=None):
+        etiqueta = etiqueta or callback_actual.get() or FUERA_DE_CALLBACK
+        with _lock:
+            serie = self._series.get(etiqueta)
+            if serie is None:
+                serie = self._series[etiqueta] = [[0] * (len(self.limites) + 1), 0]
+            serie[0][bisect.bisect_left(self.limites, valor)] += 1
+            serie[1] += valor
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with _lock:
+            series = {etiqueta: (list(conteos), suma) for etiqueta, (conteos, suma) in self._series.items()}
+        for etiqueta, (conteos, suma) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (math.inf,), conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{_etiquetas([(self.etiqueta, etiqueta), ("le", _numero(limite))])} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{_etiquetas([(self.etiqueta, etiqueta)])} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{_etiquetas([(self.etiqueta, etiqueta)])} {acumulado}')
+        return lineas
+
+
+class Contador:
+    """Contador monótono por valor de etiqueta (por defecto, el callback en curso)."""
+
+    def __init__(self, nombre, ayuda, etiqueta='callback'):
+        self.nombre, self.ayuda, self.etiqueta = nombre, ayuda, etiqueta
+        self._valores = {}
+        _metricas.append(self)
+
+    def incrementar(self, cantidad=1, etiqueta=None):
+        etiqueta = etiqueta or callback_actual.get() or FUERA_DE_CALLBACK
+        with _lock:
+            self._valores[etiqueta] = self._valores.get(etiqueta, 0) + cantidad
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        with _lock:
+            valores = sorted(self._valores.items())
+        lineas += [f'{self.nombre}{_etiquetas([(self.etiqueta, etiqueta)])} {_numero(valor)}' for etiqueta, valor in valores]
+        return lineas
+
+
+def medir(histograma, etiqueta):
+    """Decora una función para observar en `histograma` (con `etiqueta`) cuánto tarda cada llamada."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                histograma.observar(time.perf_counter() - inicio, etiqueta)
+        return envoltura
+    return decorador
+
+
+def registrar_colector(colector):
+    """Agrega una función que, al exponer, devuelve [(nombre, tipo, ayuda, [(etiquetas, valor)])].
+
+    Sirve para contadores que ya lleva otro objeto (por ejemplo, los aciertos de una cache).
+    """
+    _colectores.append(colector)
+
+
+def exponer():
+    """Todas las métricas del proceso en formato de texto de Prometheus."""
+    lineas = []
+    for metrica in _metricas:
+        lineas += metrica.exponer()
+    for colector in _colectores:
+        for nombre, tipo, ayuda, muestras in colector():
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+            lineas += [f'{nombre}{_etiquetas(sorted(etiquetas.items()))} {_numero(valor)}' for etiquetas, valor in muestras]
+    return '\n'.join(lineas) + '\n'
+
+
+# --- MÉTRICAS DEL DASHBOARD ---
+duracion_callbacks = Histograma('dashboard_callback_duracion_segundos', 'Tiempo de pared de cada callback de Dash (petición al servidor).', LIMITES_SEGUNDOS)
+bytes_respuesta = Histograma('dashboard_callback_respuesta_bytes', 'Tamaño de la respuesta de cada callback (figuras incluidas).', LIMITES_BYTES)
+bytes_enviados = Histograma('dashboard_callback_respuesta_enviada_bytes', 'Tamaño enviado de cada respuesta de callback, ya comprimida (consultas de trabajos incluidas).', LIMITES_BYTES)
+errores_callbacks = Contador('dashboard_callback_errores_total', 'Callbacks que respondieron con error.')
+sondeos_trabajos = Contador('dashboard_trabajo_sondeos_total', 'Consultas del navegador por el resultado de un trabajo en segundo plano.')
+duracion_filtrado = Histograma('dashboard_filtrado_duracion_segundos', 'Tiempo de filter_dataframe, filtrar_cubo y totales_tiendas (con sus caches).', LIMITES_SEGUNDOS, etiqueta='funcion')
+filas_leidas = Histograma('dashboard_filtrado_filas_leidas', 'Filas del rango de fechas que recorre el motor de filtros.', LIMITES_FILAS)
+filas_devueltas = Histograma('dashboard_filtrado_filas_devueltas', 'Filas que devuelve el motor de filtros.', LIMITES_FILAS)
+grupos_agregados = Histograma('dashboard_agregacion_grupos', 'Grupos que produce cada agregación del núcleo de códigos enteros.', LIMITES_GRUPOS)
@@ -0,0 +1,48 @@
+import importlib
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Los módulos viven en la raíz del repositorio (sin paquete instalable)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carga_datos import preparar_datos  # noqa: E402
+from datos_sinteticos import generar_datos_sinteticos  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def fuentes():
+    """(ventas, arrendamientos) sintéticos con el formato de los Excel, FECHA ya como fecha."""
+    ventas, arrendamientos = generar_datos_sinteticos(n_ciudades=5, n_tiendas=8, seed=7)
+    ventas = ventas.assign(FECHA=pd.to_datetime(ventas['FECHA'])).astype({col: str for col in ['UBICACION', 'MARCA', 'CIUDAD']})
+    return ventas, arrendamientos
+
+
+@pytest.fixture(scope='session')
+def cubos(fuentes):
+    """(cubo_diario, cubo_mensual, tiendas) de los datos sintéticos."""
+    return preparar_datos(*fuentes)
+
+
+@pytest.fixture(scope='session')
+def modulo_app(cubos, tmp_path_factory):
+    """Módulo `app` con sus carpetas en un directorio temporal y los datos sintéticos publicados.
+
+    La carga en segundo plano queda marcada como hecha para que ninguna petición la dispare.
+    """
+    carpeta = tmp_path_factory.mktemp('app')
+    (carpeta / 'deltas').mkdir()
+    entorno = {'DASHBOARD_CACHE_FIGURAS_DIR': carpeta / 'figuras', 'DASHBOARD_TRABAJOS_DIR': carpeta / 'trabajos',
+               'DASHBOARD_DIR_DELTAS': carpeta / 'deltas', 'DASHBOARD_DELTAS_INTERVALO_SEG': 0, 'DASHBOARD_PRECALENTAR': 0}
+    with pytest.MonkeyPatch.context() as parche:
+        for variable, valor in entorno.items():
+            parche.setenv(variable, str(valor))
+        app = importlib.import_module('app')
+    from version_datos import VersionDatos
+    app._carga_iniciada = True
+    app.publicar_datos(VersionDatos(*cubos, version='v0'))
+    app.datos_cargados.set()
+    app.precalentamiento_listo.set()
+    return app
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregacion import agregar, reducir
+from cubo_ventas import agregar_cubo, agregar_cubo_pandas, sumar_atributo_tiendas
+
+AGREGACIONES = {
+    'marca': (['MARCA'], dict(VENTAS=('VENTAS', 'sum'), UNIDADES=('UNIDADES', 'sum'), Metros_Cuadrados=('Metros_Cuadrados', 'sum'))),
+    'ubicacion_anio': (['UBICACION', 'AÑO'], dict(VENTAS=('VENTAS', 'sum'), TICKETS=('TICKETS', 'sum'), Canon_Fijo=('Canon_Fijo', 'sum'),
+                                                  FILAS=('VENTAS', 'size'))),
+    'tienda': (['TIENDA_ID'], dict(VENTAS=('VENTAS', 'sum'), MAXIMO=('VENTAS', 'max'), MINIMO=('UNIDADES', 'min'))),
+    'fecha': (['FECHA_DATETIME'], dict(VENTAS=('VENTAS', 'sum'), PRIMERA=('TICKETS', 'first'))),
+    'ciudad_marca': (['CIUDAD', 'MARCA'], dict(UNIDADES=('UNIDADES', 'sum'), Mt2=('Metros_Cuadrados', 'max'))),
+}
+
+
+@pytest.mark.parametrize('cubo', ['diario', 'mensual'])
+@pytest.mark.parametrize('nombre', list(AGREGACIONES))
+def test_agregar_cubo_igual_que_pandas(cubos, cubo, nombre):
+    cubo_diario, cubo_mensual, tiendas = cubos
+    df = cubo_diario if cubo == 'diario' else cubo_mensual
+    # Un filtro cualquiera, para que no estén todas las tiendas ni todas las fechas
+    df = df[(df['TIENDA_ID'] % 3 != 0) & (df['FECHA_DATETIME'] >= '2024-01-01')]
+    claves, agregaciones = AGREGACIONES[nombre]
+    pd.testing.assert_frame_equal(agregar_cubo(df, claves, tiendas, **agregaciones), agregar_cubo_pandas(df, claves, tiendas, **agregaciones),
+                                  check_dtype=False, check_categorical=False, rtol=1e-9)
+
+
+def test_agregar_igual_que_groupby_con_nan():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'A': rng.integers(0, 5, 500), 'B': rng.choice(['x', 'y', None], 500), 'V': rng.normal(size=500)})
+    df.loc[df.index % 7 == 0, 'V'] = np.nan
+    esperado = df.groupby(['A', 'B'], as_index=False).agg(S=('V', 'sum'), N=('V', 'size'), P=('V', 'first'), M=('V', 'min'))
+    resultado = agregar({'A': df['A'].to_numpy(), 'B': df['B']}, {'V': df['V'].to_numpy()},
+                        {'S': ('V', 'sum'), 'N': ('V', 'size'), 'P': ('V', 'first'), 'M': ('V', 'min')})
+    pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False, check_index_type=False)
+
+
+def test_muchas_combinaciones_se_compactan():
+    # Claves de alta cardinalidad: el código combinado supera el tope y se numeran solo las presentes
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'A': rng.integers(0, 10**6, 300), 'B': rng.integers(0, 10**6, 300), 'V': rng.integers(0, 100, 300)})
+    esperado = df.groupby(['A', 'B'], as_index=False).agg(S=('V', 'sum'))
+    resultado = agregar({'A': df['A'].to_numpy(), 'B': df['B'].to_numpy()}, {'V': df['V'].to_numpy()}, {'S': ('V', 'sum')})
+    pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False, check_index_type=False)
+
+
+def test_sumas_enteras_exactas_sobre_2_53():
+    grupo = np.array([0, 0, 1, 1, 1])
+    valores = np.array([2**53, 1, 2**60, 3, -2**60 + 5], dtype=np.int64)
+    assert reducir(grupo, 2, valores, 'sum').tolist() == [2**53 + 1, 8]
+    # Bajo la cota se usa bincount (float64) y el resultado sigue siendo entero y exacto
+    suma = reducir(grupo, 2, np.array([5, 7, 1, 2, 3]), 'sum')
+    assert suma.dtype == np.int64 and suma.tolist() == [12, 6]
+
+
+def test_funcion_no_admitida():
+    with pytest.raises(ValueError):
+        agregar_cubo(pd.DataFrame({'A': [1], 'V': [1.0]}), 'A', V=('V', 'median'))
+
+
+def test_canon_por_entidad_anio_no_depende_del_orden(cubos):
+    cubo_diario, _, tiendas = cubos
+    # Referencia: suma del canon de las tiendas distintas con ventas en cada marca y año
+    distintas = cubo_diario[['AÑO', 'TIENDA_ID']].drop_duplicates()
+    distintas = distintas.assign(MARCA=tiendas['MARCA'].to_numpy()[distintas['TIENDA_ID'].to_numpy()],
+                                 Canon_Fijo=tiendas['Canon_Fijo'].to_numpy()[distintas['TIENDA_ID'].to_numpy()])
+    esperado = distintas.groupby(['MARCA', 'AÑO'], as_index=False, observed=True)['Canon_Fijo'].sum()
+    for semilla in [None, 1, 2]:
+        mezclado = cubo_diario if semilla is None else cubo_diario.sample(frac=1, random_state=semilla)
+        resultado = sumar_atributo_tiendas(mezclado, ['MARCA', 'AÑO'], tiendas, 'Canon_Fijo')
+        pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False, check_categorical=False)
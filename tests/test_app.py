@@ -0,0 +1,145 @@
+import functools
+import gzip
+import io
+import math
+import os
+
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from cubo_ventas import MEDIDAS
+from exportacion import GRANOS, bloques_exportacion
+
+FILAS_POR_BLOQUE = 1000
+TOKEN = 'token-de-prueba'
+
+
+@pytest.fixture
+def admin(modulo_app, monkeypatch):
+    """Encabezados de un admin, con DASHBOARD_ADMIN_TOKEN configurado."""
+    monkeypatch.setattr(modulo_app.perfil_memoria, 'TOKEN_ADMIN', TOKEN)
+    return {modulo_app.perfil_memoria.ENCABEZADO_ADMIN: TOKEN}
+
+
+class CacheRegistro:
+    """Sustituto de `cache_figuras` que anota cada clave y versión consultadas y siempre calcula."""
+
+    def __init__(self):
+        self.consultas = []
+
+    def obtener_o_calcular(self, clave, version, calcular):
+        self.consultas.append((clave, version))
+        return calcular()
+
+
+def test_delta_modificado_cambia_la_clave_de_las_figuras(modulo_app, fuentes, monkeypatch):
+    ventas, _ = fuentes
+    cache = CacheRegistro()
+    monkeypatch.setattr(modulo_app, 'cache_figuras', cache)
+    monkeypatch.setattr(modulo_app, '_deltas_aplicados', {})
+    figura = modulo_app.figura_cacheada('prueba')(lambda ubicaciones, marcas, inicio, fin: go.Figure())
+    publicados = modulo_app.datos_actuales
+    delta = ventas[ventas['FECHA'] == '2025-11-03']
+    # El mismo archivo corregido dos veces, otro archivo y la vuelta al contenido del primero
+    pasos = [('a', delta), ('a', delta.assign(VENTA=delta['VENTA'] * 2)), ('b', delta.assign(VENTA=delta['VENTA'] * 3)), ('a', delta)]
+    try:
+        figura(None, None, '2025-01-01', '2025-12-31')
+        for n, (nombre, df) in enumerate(pasos, start=1):
+            ruta = os.path.join(modulo_app.DIR_DELTAS, f'{nombre}.csv')
+            df.to_csv(ruta, index=False)
+            os.utime(ruta, ns=(n * 10**9, n * 10**9))
+            modulo_app.revisar_deltas()
+            figura(None, None, '2025-01-01', '2025-12-31')
+        assert modulo_app.datos_actuales.version.startswith(f'v0+{len(pasos)}-')
+        claves, versiones = zip(*cache.consultas)
+        assert len(set(claves)) == len(set(versiones)) == len(pasos) + 1
+    finally:
+        modulo_app.publicar_datos(publicados)
+        for nombre in os.listdir(modulo_app.DIR_DELTAS):
+            os.remove(os.path.join(modulo_app.DIR_DELTAS, nombre))
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+@pytest.mark.parametrize('grano', list(GRANOS))
+def test_exportar_igual_que_filtrar(modulo_app, monkeypatch, grano, formato):
+    pq = pytest.importorskip('pyarrow.parquet') if formato == 'parquet' else None
+    # Bloques chicos: la exportación diaria sale en varios
+    monkeypatch.setattr(modulo_app, 'bloques_exportacion', functools.partial(bloques_exportacion, filas_por_bloque=FILAS_POR_BLOQUE))
+    datos = modulo_app.datos_actuales
+    marcas = sorted(datos.tiendas['MARCA'].astype(str).unique())[:2]
+    respuesta = modulo_app.server.test_client().get(f'/exportar/{grano}.{formato}',
+                                                     query_string={'marca': marcas, 'desde': '2024-03-05', 'hasta': '2025-06-20'})
+    assert respuesta.status_code == 200
+    if formato == 'csv':
+        exportado = pd.read_csv(io.BytesIO(respuesta.data), encoding='utf-8-sig')
+    else:
+        archivo = pq.ParquetFile(io.BytesIO(respuesta.data))
+        exportado = archivo.read().to_pandas()
+
+    # Rango no alineado a meses: `filtrar` devuelve filas del cubo diario
+    filtrado = datos.filtrar([], marcas, pd.Timestamp('2024-03-05'), pd.Timestamp('2025-06-20'))
+    filas = {'diario': len(filtrado), 'tienda_marca': filtrado['TIENDA_ID'].nunique(),
+             'marca_anio': len(filtrado.assign(MARCA=datos.tiendas['MARCA'].to_numpy()[filtrado['TIENDA_ID'].to_numpy()],
+                                               AÑO=filtrado['FECHA_DATETIME'].dt.year).drop_duplicates(['MARCA', 'AÑO']))}[grano]
+    assert len(exportado) == filas > FILAS_POR_BLOQUE * (grano == 'diario')
+    for col in MEDIDAS:
+        assert exportado[col].sum() == pytest.approx(filtrado[col].sum(), rel=1e-9)
+    if formato == 'parquet':
+        # Un row group por bloque
+        assert archivo.num_row_groups == (math.ceil(filas / FILAS_POR_BLOQUE) if grano == 'diario' else 1)
+
+
+def test_metrics_requiere_el_encabezado_admin(modulo_app, admin, monkeypatch):
+    cliente = modulo_app.server.test_client()
+    assert cliente.get('/metrics').status_code == 404
+    assert cliente.get('/metrics', headers={'X-Dashboard-Admin': 'otro'}).status_code == 404
+    assert cliente.get('/metrics', query_string={'token': TOKEN}).status_code == 404
+    respuesta = cliente.get('/metrics', headers=admin)
+    assert respuesta.status_code == 200 and 'dashboard_cache_aciertos_total' in respuesta.get_data(as_text=True)
+    # Sin token configurado no hay encabezado que sirva
+    monkeypatch.setattr(modulo_app.perfil_memoria, 'TOKEN_ADMIN', '')
+    assert cliente.get('/metrics', headers={'X-Dashboard-Admin': ''}).status_code == 404
+
+
+@pytest.mark.parametrize('ruta', ['/admin/perfiles', '/admin/perfilar'])
+def test_rutas_admin_requieren_el_encabezado(modulo_app, admin, ruta):
+    cliente = modulo_app.server.test_client()
+    assert cliente.get(ruta).status_code == 404
+    assert cliente.get(ruta, headers={'X-Dashboard-Admin': 'otro'}).status_code == 404
+    assert cliente.get(ruta, query_string={'token': TOKEN}).status_code == 404
+    assert cliente.get_cookie(modulo_app.perfil_memoria.COOKIE) is None
+    respuesta = cliente.get(ruta, headers=admin)
+    assert respuesta.status_code == 200 and respuesta.is_json
+
+
+def test_cookie_de_perfilado_alterada_se_rechaza(modulo_app, admin, monkeypatch):
+    perfil_memoria = modulo_app.perfil_memoria
+    cliente = modulo_app.server.test_client()
+    cliente.get('/admin/perfilar', headers=admin)
+    sesion = cliente.get_cookie(perfil_memoria.COOKIE).value
+    assert TOKEN not in sesion and perfil_memoria.solicitado({}, {perfil_memoria.COOKIE: sesion})
+
+    datos, _, firma = sesion.rpartition('.')
+    # Se cambia el primer carácter: el último de un base64 puede llevar solo bits de relleno
+    alteradas = [f"{datos}.{'A' if firma[0] != 'A' else 'B'}{firma[1:]}", f"{'A' if datos[0] != 'A' else 'B'}{datos[1:]}.{firma}", TOKEN]
+    monkeypatch.setattr(perfil_memoria, 'TOKEN_ADMIN', 'otro-token')
+    alteradas.append(perfil_memoria.nueva_sesion())  # firmada con otro token
+    monkeypatch.setattr(perfil_memoria, 'TOKEN_ADMIN', TOKEN)
+    for valor in alteradas:
+        assert not perfil_memoria.solicitado({}, {perfil_memoria.COOKIE: valor})
+    # Una sesión vencida tampoco sirve
+    monkeypatch.setattr(perfil_memoria, 'DURACION_SESION_SEG', -1)
+    assert not perfil_memoria.solicitado({}, {perfil_memoria.COOKIE: sesion})
+
+
+@pytest.mark.parametrize('codificacion', ['gzip', 'br'])
+def test_respuesta_comprimida_igual_que_sin_comprimir(modulo_app, codificacion):
+    brotli = pytest.importorskip('brotli') if codificacion == 'br' else None
+    cliente = modulo_app.server.test_client()
+    plana = cliente.get('/_dash-dependencies', headers={'Accept-Encoding': 'identity'})
+    assert plana.status_code == 200 and 'Content-Encoding' not in plana.headers
+    respuesta = cliente.get('/_dash-dependencies', headers={'Accept-Encoding': codificacion})
+    assert respuesta.headers['Content-Encoding'] == codificacion and 'Accept-Encoding' in respuesta.headers['Vary']
+    descomprimir = gzip.decompress if codificacion == 'gzip' else brotli.decompress
+    assert descomprimir(respuesta.data) == plana.data and len(respuesta.data) < len(plana.data)
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import carga_datos
+from carga_datos import concatenar_ventas, leer_archivo_ventas, leer_ventas, leer_ventas_por_bloques, limpiar_ventas
+
+
+def como_texto(df):
+    """`df` con las categorías como texto (los archivos leídos por separado unen sus categorías en otro orden)."""
+    return df.astype({col: str for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}).reset_index(drop=True)
+
+
+@pytest.fixture
+def carpeta_ventas(fuentes, tmp_path, monkeypatch):
+    """Carpeta con seis meses de ventas sintéticas en un CSV por marca (y un archivo que no es de ventas); caches en tmp_path."""
+    ventas, _ = fuentes
+    ventas = ventas[ventas['FECHA'] >= '2025-07-01']
+    carpeta = tmp_path / 'ventas'
+    carpeta.mkdir()
+    for marca, df in ventas.groupby('MARCA'):
+        df.to_csv(carpeta / f'ventas_{marca.lower()}.csv', index=False)
+    (carpeta / 'notas.txt').write_text('no es un archivo de ventas')
+    monkeypatch.setattr(carga_datos, 'DIR_CACHE_ARCHIVOS', str(tmp_path / 'cache_archivos'))
+    return carpeta
+
+
+@pytest.mark.parametrize('procesos', [1, 2])
+def test_carpeta_y_glob_igual_que_leer_cada_archivo(carpeta_ventas, monkeypatch, procesos):
+    monkeypatch.setattr(carga_datos, 'PROCESOS_INGESTA', procesos)
+    rutas = sorted(str(ruta) for ruta in carpeta_ventas.glob('*.csv'))
+    esperado = concatenar_ventas([leer_archivo_ventas(ruta) for ruta in rutas])
+    todo_junto = como_texto(limpiar_ventas(pd.concat([pd.read_csv(ruta) for ruta in rutas]).drop_duplicates()))
+    for origen in [str(carpeta_ventas), str(carpeta_ventas / 'ventas_*.csv')]:
+        # La segunda lectura de cada origen sale de las caches por archivo
+        for _ in range(2):
+            df_ventas = leer_ventas(origen)
+            pd.testing.assert_frame_equal(df_ventas, esperado)
+            pd.testing.assert_frame_equal(como_texto(df_ventas), todo_junto)
+
+
+def test_editar_un_archivo_solo_invalida_su_cache(carpeta_ventas, monkeypatch):
+    monkeypatch.setattr(carga_datos, 'PROCESOS_INGESTA', 1)
+    leidos = []
+    monkeypatch.setattr(carga_datos, 'leer_archivo_ventas', lambda ruta: leidos.append(os.path.basename(ruta)) or leer_archivo_ventas(ruta))
+    rutas = sorted(carpeta_ventas.glob('*.csv'))
+    leer_ventas(str(carpeta_ventas))
+    assert leidos == [ruta.name for ruta in rutas]
+    del leidos[:]
+    leer_ventas(str(carpeta_ventas))
+    assert leidos == []
+
+    editado = rutas[1]
+    df = pd.read_csv(editado)
+    df.assign(VENTA=df['VENTA'] * 2).to_csv(editado, index=False)
+    df_ventas = leer_ventas(str(carpeta_ventas))
+    assert leidos == [editado.name]
+    pd.testing.assert_frame_equal(df_ventas, concatenar_ventas([leer_archivo_ventas(str(ruta)) for ruta in rutas]))
+
+
+def test_texto_faltante_descarta_la_fila(tmp_path):
+    ventas = pd.DataFrame({'UBICACION': ['CENTRO', None, ' NORTE ', 'SUR', 'ESTE'], 'MARCA': ['AURA', 'AURA', np.nan, ' ONYX', 'AURA'],
+                           'CIUDAD': ['quito', 'quito', 'quito', 'quito', np.nan], 'FECHA': ['01/02/2024'] * 5,
+                           'VENTA': [1.5, 2, 3, 4, 5], 'UNIDADES': [1, 1, 1, 1, 1], 'TICKETS': [1, 1, 1, 1, 1]})
+    limpias = limpiar_ventas(ventas)
+    assert limpias['UBICACION'].tolist() == ['CENTRO', 'SUR'] and limpias['MARCA'].tolist() == ['AURA', 'ONYX']
+    assert limpias['CIUDAD'].tolist() == ['QUITO', 'QUITO'] and 'nan' not in limpias['CIUDAD'].cat.categories
+    # La lectura por bloques del Excel (celdas vacías) descarta las mismas filas
+    ventas.to_excel(tmp_path / 'ventas.xlsx', index=False)
+    pd.testing.assert_frame_equal(leer_ventas_por_bloques(str(tmp_path / 'ventas.xlsx')).reset_index(drop=True),
+                                  limpias.reset_index(drop=True), check_dtype=False, check_categorical=False, check_like=True)
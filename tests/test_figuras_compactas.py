@@ -0,0 +1,39 @@
+import base64
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from figuras_compactas import compactar_figura
+
+
+def decodificar(valor):
+    """Arreglos binarios ({dtype, bdata, shape}) a numpy, como los lee plotly.js; el resto igual."""
+    if isinstance(valor, dict):
+        if 'bdata' in valor:
+            arreglo = np.frombuffer(base64.b64decode(valor['bdata']), dtype=np.dtype(valor['dtype']).newbyteorder('<'))
+            return arreglo.reshape([int(n) for n in valor['shape'].split(',')]) if 'shape' in valor else arreglo
+        return {clave: decodificar(v) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [decodificar(v) for v in valor]
+    return valor
+
+
+def test_arreglos_binarios_vuelven_a_los_originales():
+    rng = np.random.default_rng(3)
+    arreglos = {
+        'u1': rng.integers(0, 250, 40), 'i2': rng.integers(-30_000, 30_000, 40), 'i4': rng.integers(-10**9, 10**9, 40),
+        'f4': rng.integers(-400, 400, 40) / 4, 'enteros_float': rng.integers(0, 100, 40).astype(np.float64),
+        'decimales': np.round(rng.gamma(2.0, 1000.0, 40), 2), 'matriz': rng.integers(0, 60_000, (6, 9)),
+    }
+    figura = go.Figure([go.Bar(x=arreglos['u1'], y=arreglos['i2']), go.Scatter(x=arreglos['f4'], y=arreglos['i4']),
+                        go.Scatter(x=arreglos['enteros_float'], y=arreglos['decimales']), go.Heatmap(z=arreglos['matriz'])])
+    compacta = compactar_figura(figura)
+    trazas = json.loads(to_json_plotly(compacta))['data']
+    assert [trazas[0]['x']['dtype'], trazas[0]['y']['dtype'], trazas[1]['x']['dtype'], trazas[1]['y']['dtype']] == ['u1', 'i2', 'f4', 'i4']
+    assert trazas[2]['x']['dtype'] == 'u1' and isinstance(trazas[2]['y'], list) and trazas[3]['z']['shape'] == '6,9'
+    trazas = decodificar(trazas)
+    for decodificado, original in [(trazas[0]['x'], 'u1'), (trazas[0]['y'], 'i2'), (trazas[1]['x'], 'f4'), (trazas[1]['y'], 'i4'),
+                                   (trazas[2]['x'], 'enteros_float'), (trazas[2]['y'], 'decimales'), (trazas[3]['z'], 'matriz')]:
+        np.testing.assert_array_equal(np.asarray(decodificado, dtype=np.float64), arreglos[original].astype(np.float64))
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_filtros import MAX_VALORES_POR_LISTA, MotorFiltros
+
+MARCAS = ['AURA', 'LUMIN', 'NOCTIS', 'ONYX']
+N_TIENDAS = MAX_VALORES_POR_LISTA + 8
+
+
+@pytest.fixture(scope='module')
+def hechos():
+    """Tabla de hechos chica, desordenada, con fechas repetidas y una tienda sin ventas."""
+    rng = np.random.default_rng(11)
+    n = 5000
+    df = pd.DataFrame({
+        'FECHA_DATETIME': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 900, n), unit='D'),
+        'TIENDA_ID': rng.integers(0, N_TIENDAS, n),
+        'MARCA': pd.Categorical(rng.choice(MARCAS, n), categories=MARCAS),
+        'VENTAS': rng.gamma(2.0, 100.0, n),
+    })
+    return df[df['TIENDA_ID'] != 5].reset_index(drop=True)
+
+
+def filtrar_con_mascara(df, selecciones, start_date, end_date):
+    """Referencia: el filtrado de antes del motor, una máscara booleana sobre toda la tabla."""
+    mascara = (df['FECHA_DATETIME'] >= pd.Timestamp(start_date)) & (df['FECHA_DATETIME'] <= pd.Timestamp(end_date))
+    for col, valores in selecciones.items():
+        if valores is not None:
+            mascara &= df[col].isin(list(valores))
+    return df[mascara]
+
+
+def ordenar(df):
+    return df.sort_values(['FECHA_DATETIME', 'TIENDA_ID', 'VENTAS'], kind='mergesort').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('start_date, end_date', [('2023-01-01', '2025-12-31'), ('2024-02-10', '2024-02-10'),
+                                                  ('2023-03-15', '2024-01-20'), ('2026-01-01', '2026-02-01')])
+@pytest.mark.parametrize('ids', [None, [], [3], [5], [0, 5, 7, 11], list(range(MAX_VALORES_POR_LISTA + 1)), [10_000]])
+def test_filtrar_igual_que_mascara(hechos, ids, start_date, end_date):
+    # Más ids que MAX_VALORES_POR_LISTA: el motor marca el rango con una máscara por código
+    motor = MotorFiltros(hechos)
+    selecciones = {'TIENDA_ID': ids}
+    pd.testing.assert_frame_equal(ordenar(motor.filtrar(selecciones, start_date, end_date)),
+                                  ordenar(filtrar_con_mascara(hechos, selecciones, start_date, end_date)))
+
+
+@pytest.mark.parametrize('selecciones', [
+    {'TIENDA_ID': list(range(20)), 'MARCA': ['AURA', 'ONYX']}, {'TIENDA_ID': None, 'MARCA': ['LUMIN']},
+    {'TIENDA_ID': [1, 2], 'MARCA': ['NO EXISTE']}, {'MARCA': MARCAS},
+])
+def test_filtrar_varias_dimensiones(hechos, selecciones):
+    motor = MotorFiltros(hechos, columnas_indice=('TIENDA_ID', 'MARCA'))
+    pd.testing.assert_frame_equal(ordenar(motor.filtrar(selecciones, '2023-06-01', '2024-06-30')),
+                                  ordenar(filtrar_con_mascara(hechos, selecciones, '2023-06-01', '2024-06-30')))
+
+
+def test_solo_fechas_es_una_vista_contigua(hechos):
+    motor = MotorFiltros(hechos)
+    assert motor.df['FECHA_DATETIME'].is_monotonic_increasing
+    pos = motor.posiciones({'TIENDA_ID': None}, '2023-06-01', '2023-06-30')
+    assert isinstance(pos, slice)
+    assert (motor.df.iloc[pos]['FECHA_DATETIME'].dt.month == 6).all()
+
+
+def test_ordenes_reconstruyen_el_motor(hechos):
+    motor = MotorFiltros(hechos)
+    copia = MotorFiltros(motor.df, ordenes=motor.ordenes())
+    for ids in [[3], [0, 7, 9], list(range(N_TIENDAS))]:
+        assert np.array_equal(copia.posiciones({'TIENDA_ID': ids}, '2023-01-01', '2025-12-31'),
+                              motor.posiciones({'TIENDA_ID': ids}, '2023-01-01', '2025-12-31'))
+
+
+def test_extender_igual_que_reindexar(hechos):
+    corte = pd.Timestamp('2024-09-01')
+    viejos, nuevos = hechos[hechos['FECHA_DATETIME'] < corte], hechos[hechos['FECHA_DATETIME'] >= corte]
+    extendido = MotorFiltros(viejos).extender(nuevos)
+    completo = MotorFiltros(hechos)
+    for ids in [None, [4], list(range(MAX_VALORES_POR_LISTA + 2))]:
+        pd.testing.assert_frame_equal(ordenar(extendido.filtrar({'TIENDA_ID': ids}, '2024-06-01', '2025-03-31')),
+                                      ordenar(completo.filtrar({'TIENDA_ID': ids}, '2024-06-01', '2025-03-31')))
+    with pytest.raises(ValueError):
+        extendido.extender(viejos.iloc[:1])
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from carga_datos import limpiar_ventas, preparar_datos
+from cubo_ventas import MEDIDAS, asignar_tiendas, construir_cubo_diario
+from indice_rangos import IndiceRangos
+from memoria_datos import compactar_tipos
+from version_datos import VersionDatos
+
+CLAVES = ['UBICACION', 'MARCA', 'FECHA']
+
+
+def preparar(ventas, arrendamientos, version):
+    return VersionDatos(*preparar_datos(ventas, arrendamientos), version=version)
+
+
+def aplicar_delta(version, delta):
+    """Mismos pasos que `app.aplicar_delta` (sin publicar)."""
+    delta = limpiar_ventas(delta)
+    ids_tiendas, tiendas = asignar_tiendas(delta, version.tiendas)
+    cubo_delta = compactar_tipos(construir_cubo_diario(delta[['FECHA_DATETIME'] + MEDIDAS + ['AÑO']].assign(TIENDA_ID=ids_tiendas)))
+    return version.con_delta(cubo_delta, version=f'{version.version}+delta', tiendas=compactar_tipos(tiendas))
+
+
+def normalizar(df, version):
+    """`df` con las claves de la tienda en lugar de TIENDA_ID (los ids difieren entre versiones), en orden fijo."""
+    dimension = version.tiendas.iloc[df['TIENDA_ID'].to_numpy()]
+    df = df.drop(columns='TIENDA_ID').assign(**{col: dimension[col].astype(str).to_numpy() for col in ['UBICACION', 'MARCA', 'CIUDAD']})
+    orden = [col for col in ['FECHA_DATETIME', 'UBICACION', 'MARCA', 'CIUDAD'] if col in df.columns]
+    return df.sort_values(orden).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def versiones(fuentes):
+    """(versión base + delta aplicado con con_delta, versión reconstruida desde cero con el mismo resultado)."""
+    ventas, arrendamientos = fuentes
+    corte = pd.Timestamp('2025-12-10')
+    # Una tienda-día del pasado que la base no tiene y llega en el delta
+    pasado = ventas[ventas['FECHA'] == '2025-06-01'].iloc[:1]
+    base = ventas[(ventas['FECHA'] < corte) & ~ventas.index.isin(pasado.index)]
+    nuevos = ventas[ventas['FECHA'] >= corte]
+    # Correcciones de días publicados y una tienda nueva (sin arrendamiento)
+    correcciones = base[base['FECHA'] >= '2025-11-20'].sample(40, random_state=1).assign(VENTA=lambda df: df['VENTA'] * 2)
+    tienda_nueva = nuevos.drop_duplicates('MARCA').iloc[:3].assign(UBICACION='TIENDA NUEVA', FECHA=pd.Timestamp('2025-12-15'))
+    delta = pd.concat([nuevos, correcciones, tienda_nueva, pasado], ignore_index=True)
+
+    incremental = aplicar_delta(preparar(base, arrendamientos, 'v0'), delta)
+    base = base.set_index(CLAVES)
+    completo = pd.concat([base[~base.index.isin(delta.set_index(CLAVES).index)].reset_index(), delta], ignore_index=True)
+    return incremental, preparar(completo, arrendamientos, 'ref')
+
+
+def test_con_delta_igual_que_reconstruir(versiones):
+    incremental, completo = versiones
+    for cubo in ['cubo_diario', 'cubo_mensual']:
+        pd.testing.assert_frame_equal(normalizar(getattr(incremental, cubo), incremental),
+                                      normalizar(getattr(completo, cubo), completo), check_dtype=False)
+
+
+def test_con_delta_no_modifica_la_version(fuentes):
+    ventas, arrendamientos = fuentes
+    base = preparar(ventas[ventas['FECHA'] < '2025-12-01'], arrendamientos, 'v0')
+    filas = len(base.cubo_diario)
+    nueva = aplicar_delta(base, ventas[ventas['FECHA'] >= '2025-12-01'])
+    assert len(base.cubo_diario) == filas and base.version == 'v0'
+    assert len(nueva.cubo_diario) > filas and nueva.fecha_max == ventas['FECHA'].max()
+    assert aplicar_delta(base, ventas.iloc[:0]) is base
+
+
+@pytest.mark.parametrize('ubicaciones, marcas, inicio, fin', [
+    ([], [], '2025-01-01', '2025-12-31'), (['TIENDA NUEVA'], [], '2025-12-01', '2025-12-31'),
+    ([], ['AURA', 'ONYX'], '2025-05-15', '2025-12-25'), ([], [], '2020-01-01', '2030-01-01'),
+])
+def test_filtrar_tras_delta(versiones, ubicaciones, marcas, inicio, fin):
+    incremental, completo = versiones
+    inicio, fin = pd.Timestamp(inicio), pd.Timestamp(fin)
+    pd.testing.assert_frame_equal(normalizar(incremental.filtrar(ubicaciones, marcas, inicio, fin), incremental),
+                                  normalizar(completo.filtrar(ubicaciones, marcas, inicio, fin), completo), check_dtype=False)
+    pd.testing.assert_frame_equal(normalizar(incremental.totales_por_tienda(ubicaciones, marcas, inicio, fin), incremental),
+                                  normalizar(completo.totales_por_tienda(ubicaciones, marcas, inicio, fin), completo), check_dtype=False)
+
+
+@pytest.mark.parametrize('ids, inicio, fin', [(None, '2023-01-01', '2025-12-31'), ([2, 9, 30], '2024-02-29', '2024-11-03'),
+                                               ([4], '2024-05-05', '2024-05-05'), (None, '2026-01-01', '2026-12-31'), ([], '2023-01-01', '2025-12-31')])
+def test_totales_del_indice_igual_que_sumar_el_cubo(cubos, ids, inicio, fin):
+    cubo_diario, _, tiendas = cubos
+    indice = IndiceRangos.desde_cubo(cubo_diario, len(tiendas))
+    filtro = cubo_diario['FECHA_DATETIME'].between(pd.Timestamp(inicio), pd.Timestamp(fin))
+    if ids is not None:
+        filtro &= cubo_diario['TIENDA_ID'].isin(ids)
+    esperado = (cubo_diario[filtro].groupby('TIENDA_ID').agg(VENTAS=('VENTAS', 'sum'), UNIDADES=('UNIDADES', 'sum'),
+                                                             TICKETS=('TICKETS', 'sum'), DIAS=('VENTAS', 'size')).reset_index())
+    totales = indice.totales(ids, pd.Timestamp(inicio), pd.Timestamp(fin))
+    pd.testing.assert_frame_equal(totales, esperado, check_dtype=False, check_index_type=False)
+    assert np.array_equal(totales['UNIDADES'].to_numpy(), esperado['UNIDADES'].to_numpy())
+
+
+def test_indice_respeta_su_tope(cubos):
+    cubo_diario, _, tiendas = cubos
+    assert IndiceRangos.desde_cubo(cubo_diario, len(tiendas), max_mb=0.001) is None
+    assert IndiceRangos.desde_cubo(cubo_diario.iloc[:0], len(tiendas)) is None
+
+
+@pytest.mark.parametrize('desde', ['2024-03-01', '2025-12-31', '2026-01-20', '2022-06-01'])
+def test_indice_actualizado_igual_que_reconstruir(cubos, desde):
+    cubo_diario, _, tiendas = cubos
+    desde = pd.Timestamp(desde)
+    anterior = cubo_diario[cubo_diario['FECHA_DATETIME'] < desde]
+    if anterior.empty:
+        # Cambio anterior al eje del índice: se reconstruye
+        anterior = cubo_diario[cubo_diario['FECHA_DATETIME'] > desde + pd.Timedelta(days=400)]
+    # Días desde `desde` con otras medidas, días posteriores al eje y una tienda más al final
+    cola = pd.concat([cubo_diario[cubo_diario['FECHA_DATETIME'] >= desde].assign(VENTAS=lambda df: df['VENTAS'] * 1.5),
+                      cubo_diario.iloc[-5:].assign(FECHA_DATETIME=pd.Timestamp('2026-02-03'), TIENDA_ID=len(tiendas))])
+    nuevo = pd.concat([anterior, cola], ignore_index=True).sort_values('FECHA_DATETIME', kind='mergesort').reset_index(drop=True)
+
+    actualizado = IndiceRangos.desde_cubo(anterior, len(tiendas)).actualizado(nuevo, desde, len(tiendas) + 1)
+    reconstruido = IndiceRangos.desde_cubo(nuevo, len(tiendas) + 1)
+    assert actualizado.fecha_inicio == reconstruido.fecha_inicio and actualizado.n_dias == reconstruido.n_dias
+    pd.testing.assert_frame_equal(actualizado.tabla(), reconstruido.tabla(), check_exact=True)
+
+
+def test_indice_con_unidades_fraccionarias(cubos):
+    cubo_diario, _, tiendas = cubos
+    # Ventas a granel: una tienda-día con media unidad
+    fila = cubo_diario.index[len(cubo_diario) // 2]
+    fraccionario = cubo_diario.astype({'UNIDADES': np.float64})
+    fraccionario.loc[fila, 'UNIDADES'] += 0.5
+    indice = IndiceRangos.desde_cubo(fraccionario, len(tiendas))
+    esperado = fraccionario.groupby('TIENDA_ID')['UNIDADES'].sum().to_numpy()
+    totales = indice.totales(None, pd.Timestamp('2020-01-01'), pd.Timestamp('2030-01-01'))
+    np.testing.assert_allclose(totales['UNIDADES'].to_numpy(), esperado, rtol=0)
+    assert totales['UNIDADES'].sum() % 1 == 0.5
+    # Un delta que trae la fracción a un índice entero, y otro que la corrige
+    desde = fraccionario.loc[fila, 'FECHA_DATETIME']
+    entero = IndiceRangos.desde_cubo(cubo_diario, len(tiendas))
+    pd.testing.assert_frame_equal(entero.actualizado(fraccionario, desde, len(tiendas)).tabla(), indice.tabla(), check_exact=True)
+    pd.testing.assert_frame_equal(indice.actualizado(cubo_diario, desde, len(tiendas)).tabla(), entero.tabla(), check_exact=True)
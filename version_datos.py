@@ -0,0 +1,163 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from cubo_ventas import MEDIDAS, agregar_cubo, construir_cubo_mensual, rango_alineado_a_meses
+from indice_rangos import IndiceRangos
+from motor_filtros import MotorFiltros
+
+
+# --- VERSIÓN PUBLICADA DE LOS DATOS ---
+# Una instantánea inmutable con los cubos, sus índices, la dimensión de tiendas y un identificador
+# de versión. Publicar datos nuevos es reemplazar una sola referencia: un callback en curso sigue
+# viendo, de principio a fin, la versión con la que empezó.
+
+CLAVES_FILA = ['TIENDA_ID', 'FECHA_DATETIME']
+
+
+def version_con_delta(version, delta, etiqueta):
+    """Identificador de la versión que resulta de aplicar `delta` (cubo diario) sobre `version`.
+
+    Queda `<base>+<n>-<huella>`: `n` cuenta los deltas aplicados desde la carga y la huella resume
+    la versión anterior, la etiqueta y el contenido del delta. Así un delta corregido, o volver a
+    un archivo anterior, nunca repite la versión de otros datos (la cache de figuras se indexa por
+    versión), y los workers que aplican los mismos deltas en el mismo orden llegan a la misma.
+    """
+    base, _, cadena = version.partition('+')
+    n = int(cadena.split('-')[0]) + 1 if cadena else 1
+    huella = hashlib.sha1(f'{version}\0{etiqueta}\0'.encode())
+    huella.update(pd.util.hash_pandas_object(delta, index=False).to_numpy().tobytes())
+    return f'{base}+{n}-{huella.hexdigest()[:12]}'
+
+
+class VersionDatos:
+    """Instantánea de los datos que sirven los callbacks: cubos diario y mensual, índices y tiendas."""
+
+    def __init__(self, cubo_diario, cubo_mensual, tiendas, version, motor_diario=None, motor_mensual=None, indice_rangos=None):
+        # El motor ordena cada cubo por fecha una sola vez; a partir de aquí se usa su copia ordenada
+        self.motor_diario = motor_diario if motor_diario is not None else MotorFiltros(cubo_diario)
+        self.motor_mensual = motor_mensual if motor_mensual is not None else MotorFiltros(cubo_mensual)
+        self.cubo_diario = self.motor_diario.df
+        self.cubo_mensual = self.motor_mensual.df
+        self.version = version
+        self.tiendas = tiendas
+        self.vacio = self.cubo_diario.empty
+        self.fecha_min = None if self.vacio else self.cubo_diario['FECHA_DATETIME'].iloc[0]
+        self.fecha_max = None if self.vacio else self.cubo_diario['FECHA_DATETIME'].iloc[-1]
+        # Sumas acumuladas por tienda y día (None si el cubo está vacío o el índice no cabe en su tope)
+        self.indice_rangos = indice_rangos if indice_rangos is not None else IndiceRangos.desde_cubo(self.cubo_diario, len(tiendas))
+
+    def tablas(self):
+        """Cubos, índices y dimensión en forma de tablas, para persistirlos en el almacén columnar."""
+        tablas = {
+            'diario': self.cubo_diario, 'mensual': self.cubo_mensual, 'tiendas': self.tiendas,
+            'orden_diario': pd.DataFrame(self.motor_diario.ordenes()), 'orden_mensual': pd.DataFrame(self.motor_mensual.ordenes()),
+        }
+        if self.indice_rangos is not None:
+            tablas['rangos'] = self.indice_rangos.tabla()
+        return tablas
+
+    @classmethod
+    def desde_tablas(cls, tablas, version):
+        """Reconstruye la versión a partir de `tablas()` sin volver a ordenar ni indexar."""
+        motor_diario = MotorFiltros(tablas['diario'], ordenes=tablas.get('orden_diario'))
+        motor_mensual = MotorFiltros(tablas['mensual'], ordenes=tablas.get('orden_mensual'))
+        indice_rangos = None
+        if 'rangos' in tablas and not motor_diario.df.empty:
+            rangos = tablas['rangos']
+            indice_rangos = IndiceRangos({col: rangos[col].to_numpy() for col in rangos.columns},
+                                         motor_diario.df['FECHA_DATETIME'].iloc[0], len(tablas['tiendas']))
+        return cls(motor_diario.df, motor_mensual.df, tablas['tiendas'], version, motor_diario=motor_diario, motor_mensual=motor_mensual,
+                   indice_rangos=indice_rangos)
+
+    def ids_tiendas(self, ubicaciones, marcas):
+        """TIENDA_ID de las tiendas con UBICACION en `ubicaciones` y MARCA en `marcas` (vacía = todas); None si no hay selección."""
+        if not ubicaciones and not marcas:
+            return None
+        seleccion = np.ones(len(self.tiendas), dtype=bool)
+        if ubicaciones:
+            seleccion &= self.tiendas['UBICACION'].isin(list(ubicaciones)).to_numpy()
+        if marcas:
+            seleccion &= self.tiendas['MARCA'].isin(list(marcas)).to_numpy()
+        return np.flatnonzero(seleccion)
+
+    def filtrar(self, ubicaciones, marcas, start_date_dt, end_date_dt):
+        """Filtra el cubo mensual si el rango cubre meses completos; si no, el diario."""
+        selecciones = {'TIENDA_ID': self.ids_tiendas(ubicaciones, marcas)}
+        if rango_alineado_a_meses(start_date_dt, end_date_dt, self.fecha_min, self.fecha_max):
+            return self.motor_mensual.filtrar(selecciones, start_date_dt.to_period('M').to_timestamp(), end_date_dt.to_period('M').to_timestamp())
+        return self.motor_diario.filtrar(selecciones, start_date_dt, end_date_dt)
+
+    def totales_por_tienda(self, ubicaciones, marcas, start_date_dt, end_date_dt):
+        """TIENDA_ID, VENTAS, UNIDADES, TICKETS y DIAS (días con venta) de cada tienda seleccionada con ventas en el rango.
+
+        Sale del índice de sumas acumuladas; sin índice, del cubo filtrado.
+        """
+        ids = self.ids_tiendas(ubicaciones, marcas)
+        if self.indice_rangos is not None:
+            return self.indice_rangos.totales(ids, start_date_dt, end_date_dt)
+        df = self.filtrar(ubicaciones, marcas, start_date_dt, end_date_dt)
+        dias = ('DIAS', 'sum') if 'DIAS' in df.columns else ('VENTAS', 'size')
+        return agregar_cubo(df, 'TIENDA_ID', **{col: (col, 'sum') for col in MEDIDAS}, DIAS=dias)
+
+    def con_delta(self, delta, version, tiendas=None):
+        """Nueva versión con `delta` (cubo diario de días nuevos o corregidos) aplicado como upsert.
+
+        Cada fila del delta reemplaza la tienda-día que ya existía o se agrega si es nueva. Si el
+        delta trae tiendas nuevas, `tiendas` es la dimensión ampliada (ver `asignar_tiendas`).
+        El costo depende del tamaño del delta: las correcciones se buscan solo en su ventana de
+        fechas, los días nuevos se agregan al índice existente, del cubo mensual solo se
+        recalculan los meses tocados y el índice de rangos solo desde el primer día del delta.
+        Esta versión no se modifica.
+        """
+        tiendas = self.tiendas if tiendas is None else tiendas
+        if delta.empty:
+            return self
+        delta = delta.sort_values('FECHA_DATETIME', kind='mergesort').reset_index(drop=True)[list(self.cubo_diario.columns)]
+        fecha_ini, fecha_fin = delta['FECHA_DATETIME'].iloc[0], delta['FECHA_DATETIME'].iloc[-1]
+        motor, diario = self.motor_diario, self.cubo_diario
+
+        # 1. Correcciones: claves que ya existen dentro de la ventana de fechas del delta
+        inicio, fin = motor.rango_fechas(fecha_ini, fecha_fin)
+        ventana = diario.iloc[inicio:fin][CLAVES_FILA].assign(_pos=np.arange(inicio, fin))
+        cruce = delta[CLAVES_FILA].assign(_fila=np.arange(len(delta))).merge(ventana, on=CLAVES_FILA, how='left')
+        existe = cruce['_pos'].notna().to_numpy()
+        if existe.any():
+            posiciones = cruce['_pos'].to_numpy()[existe].astype(np.int64)
+            filas = cruce['_fila'].to_numpy()[existe]
+            columnas = {col: diario[col] for col in diario.columns}
+            for col in MEDIDAS:
+                # Si la corrección no cabe en el entero angosto del cubo, la columna se ensancha
+                reemplazos = delta[col].to_numpy()[filas]
+                valores = diario[col].to_numpy().astype(np.result_type(diario[col].dtype, reemplazos.dtype), copy=True)
+                valores[posiciones] = reemplazos
+                columnas[col] = valores
+            diario = pd.DataFrame(columnas, copy=False)
+            motor = motor.con_valores(diario)
+
+        # 2. Tienda-días nuevos: al final del índice si son posteriores a lo publicado
+        nuevas = delta.iloc[cruce['_fila'].to_numpy()[~existe]]
+        if not nuevas.empty:
+            if self.fecha_max is None or nuevas['FECHA_DATETIME'].iloc[0] >= self.fecha_max:
+                motor = motor.extender(nuevas)
+            else:
+                # Días nuevos en el pasado (poco frecuente): se reordena e indexa el cubo completo
+                motor = MotorFiltros(pd.concat([diario, nuevas], ignore_index=True))
+            diario = motor.df
+
+        # 3. Cubo mensual: solo se recalculan los meses tocados por el delta
+        mes_ini = fecha_ini.to_period('M').to_timestamp()
+        mes_fin = fecha_fin.to_period('M').to_timestamp()
+        a, b = motor.rango_fechas(mes_ini, mes_fin + pd.offsets.MonthEnd(0))
+        recalculado = construir_cubo_mensual(diario.iloc[a:b])
+        m_a, m_b = self.motor_mensual.rango_fechas(mes_ini, mes_fin)
+        mensual = pd.concat([self.cubo_mensual.iloc[:m_a], recalculado[list(self.cubo_mensual.columns)], self.cubo_mensual.iloc[m_b:]], ignore_index=True)
+
+        # 4. Índice de rangos: se copian los acumulados previos al delta y se recalcula desde ahí
+        indice_rangos = None
+        if self.indice_rangos is not None:
+            indice_rangos = self.indice_rangos.actualizado(diario, fecha_ini, len(tiendas))
+
+        return VersionDatos(diario, mensual, tiendas, version, motor_diario=motor, motor_mensual=MotorFiltros(mensual),
+                            indice_rangos=indice_rangos)